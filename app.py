@@ -1,30 +1,73 @@
-from flask import Flask, request, jsonify, send_from_directory, session, Response
+from flask import Flask, Request, request, jsonify, send_from_directory, session, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from datetime import datetime, timedelta
-import sqlite3
 import json
 import os
 import hashlib
+import base64
 import math
+import tempfile
+import threading
 import traceback
+import uuid
+
+from cache_respostas import obter_cache
+from cache_videos import ArquivoComHash, obter_cache_videos
+from coalescencia import obter_coalescedor
+from disjuntor import estados as estados_disjuntores
+from conexoes import conectar
+import consumo
+import estatisticas
+from fila_videos import obter_fila
+import geo
+from gravador import agora_sql, obter_gravador
+from limitador import Sobrecarga, obter_limitador
+import metricas
 
 # Obter o diretório atual do script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMP_DIR = os.path.join(BASE_DIR, 'temp')
+EXTENSOES_VIDEO = {'.mp4', '.mov', '.webm', '.3gp', '.mkv', '.avi'}
+
+class RequisicaoComUpload(Request):
+    """
+    Arquivos enviados vão em blocos direto para temp/ (um arquivo por upload), sem ficar
+    em memória nem ser copiados depois; são apagados no fim do request. O SHA-256 (chave
+    do cache de vídeos) é calculado enquanto os blocos são gravados.
+    """
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        os.makedirs(TEMP_DIR, exist_ok=True)
+        sufixo = os.path.splitext(filename or '')[1].lower()
+        arquivo = tempfile.NamedTemporaryFile(
+            dir=TEMP_DIR, prefix='upload_', delete=False,
+            suffix=sufixo if sufixo in EXTENSOES_VIDEO else '.mp4'
+        )
+        arquivo = ArquivoComHash(arquivo)
+        if not hasattr(self, 'arquivos_temporarios'):
+            self.arquivos_temporarios = []
+        self.arquivos_temporarios.append(arquivo)
+        return arquivo
 
 app = Flask(__name__, static_folder='static', template_folder='.')
+app.request_class = RequisicaoComUpload
 app.secret_key = os.environ.get('SECRET_KEY', 'storopack_secret_key_2025')
 CORS(app)
 
 # Configurações
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '826541')
-DB_PATH = os.path.join(BASE_DIR, "data", "storopack.db")
+DB_PATH = os.environ.get('DB_PATH') or os.path.join(BASE_DIR, "data", "storopack.db")
+# Aquecer o assistente em segundo plano ao subir (0 = só no primeiro uso)
+AQUECIMENTO = os.environ.get('AQUECIMENTO', '1') != '0'
+# Contar as buscas do File Search de cada run (uma chamada a mais à API, em segundo plano)
+CONSUMO_BUSCAS = os.environ.get('CONSUMO_BUSCAS', '1') != '0'
 STOROPACK_LAT = -23.67376
 STOROPACK_LNG = -46.69436
 
 # ============================ IMPORTAR ASSISTENTE ============================
 # Importação segura do assistente - não quebra se der erro
 try:
-    from assistente import responder_cliente
+    from assistente import responder_cliente, responder_cliente_stream, aquecer, estado_aquecimento, contar_buscas
     ASSISTENTE_OK = True
     print("[OK] Módulo assistente carregado")
 except Exception as e:
@@ -32,7 +75,7 @@ except Exception as e:
     print(f"[AVISO] Módulo assistente não carregou: {e}")
     print("[AVISO] O chat vai usar respostas offline")
     
-    def responder_cliente(pergunta="", modulo=None, video_bytes=None, video_path=None, nome_cliente=None, telefone_cliente=None):
+    def responder_cliente(pergunta="", modulo=None, video_bytes=None, video_path=None, nome_cliente=None, telefone_cliente=None, conversa=None, config=None, ao_concluir_tarde=None):
         """Fallback quando o assistente não está disponível"""
         return (
             "⚠️ O assistente está temporariamente indisponível.\n\n"
@@ -42,9 +85,135 @@ except Exception as e:
             "• Erro de conexão com a API\n\n"
             "Entre em contato: (11) 5677-4699"
         )
+    
+    def responder_cliente_stream(pergunta="", modulo=None, nome_cliente=None, telefone_cliente=None, conversa=None):
+        """Fallback em streaming: entrega a mensagem de indisponibilidade de uma vez"""
+        resposta = responder_cliente(pergunta, modulo)
+        yield "delta", resposta
+        yield "fim", resposta
+    
+    def aquecer():
+        """Sem assistente não há o que aquecer"""
+    
+    def estado_aquecimento():
+        return {'pronto': True, 'openai': 'offline', 'duracao_s': None, 'erro': None}
+    
+    def contar_buscas(thread_id, run_id):
+        return None
+
+# ============================ IMPORTAR ANALISADOR DE VÍDEO ============================
+try:
+    from video_analyzer import analisar_video_erro, MAX_VIDEO_BYTES
+    print("[OK] Módulo de vídeo carregado")
+except Exception as e:
+    MAX_VIDEO_BYTES = 100 * 1024 * 1024
+    print(f"[AVISO] Módulo de vídeo não carregou: {e}")
+    
+    def analisar_video_erro(video_bytes=None, video_path=None, modulo="airplus", descricao_cliente="", hash_video=None):
+        """Fallback quando o analisador não está disponível"""
+        raise RuntimeError("Analisador de vídeo indisponível")
+
+# Corpo do request limitado ao vídeo + campos do formulário; o Werkzeug recusa pelo
+# Content-Length antes de ler e, sem ele, interrompe a leitura ao passar do limite
+app.config['MAX_CONTENT_LENGTH'] = MAX_VIDEO_BYTES + 1024 * 1024
 
 # ============================ BANCO DE DADOS ============================
 
+def _garantir_coluna(c, tabela, coluna, tipo):
+    """Adiciona a coluna se a tabela foi criada por uma versão anterior"""
+    colunas = [row[1] for row in c.execute(f'PRAGMA table_info({tabela})')]
+    if coluna not in colunas:
+        c.execute(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}')
+        print(f"[INFO] Coluna {tabela}.{coluna} adicionada")
+        return True
+    return False
+
+# Trocas anteriores levadas para a primeira thread do chamado
+HISTORICO_SEM_THREAD = 10
+
+def _carregar_conversa(c, chamado_id, novo=False):
+    """
+    Thread do OpenAI associada ao chamado. Sem thread, traz em 'historico' as trocas já
+    respondidas sem run (cache, carona, fast path, offline): elas tiram o chamado do
+    cache e vão para a thread quando ela for criada
+    """
+    # Contador da pergunta anterior ainda na fila: grava antes de ler
+    _gravador().aguardar(('conversa', chamado_id), timeout=5)
+    row = c.execute('''SELECT thread_id, mensagens_thread FROM chamados WHERE id = ?''',
+                    (chamado_id,)).fetchone()
+    if not row:
+        return {}
+    conversa = {'thread_id': row[0], 'mensagens_thread': row[1] or 0}
+    if not row[0] and not novo:
+        # A troca anterior pode estar na fila deste processo: espera só as mensagens do chamado
+        _gravador().aguardar(('mensagens', chamado_id), timeout=5)
+        recentes = c.execute('''SELECT tipo, conteudo FROM mensagens
+                                WHERE chamado_id = ? AND tipo IN ('user', 'assistant')
+                                ORDER BY id DESC LIMIT ?''',
+                             (chamado_id, HISTORICO_SEM_THREAD)).fetchall()
+        if recentes:
+            conversa['historico'] = [(m['tipo'], m['conteudo']) for m in reversed(recentes)]
+    return conversa
+
+def _gravador():
+    """Fila de gravação em lote do banco atual"""
+    return obter_gravador(DB_PATH)
+
+def _registrar_mensagem(chamado_id, tipo, conteudo):
+    """Enfileira a mensagem (o horário é o do request, não o da gravação)"""
+    _gravador().executar('''INSERT INTO mensagens (chamado_id, tipo, conteudo, criado_em)
+                            VALUES (?, ?, ?, ?)''',
+                         (chamado_id, tipo, conteudo, agora_sql()),
+                         grupo=('mensagens', chamado_id))
+
+def _registrar_consumo(chamado_id, uso):
+    """
+    Enfileira tokens e tempos do run que respondeu (conversa['uso']); as buscas do
+    File Search vêm dos passos do run, consultados em segundo plano
+    """
+    if not uso:
+        return
+    _gravador().executar('''INSERT OR IGNORE INTO consumo_assistente
+                            (run_id, chamado_id, equipamento, thread_id, status, tokens_entrada,
+                             tokens_saida, duracao_s, fila_s, citacoes, criado_em)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (uso['run_id'], chamado_id, uso['equipamento'], uso['thread_id'], uso['status'],
+                          uso['tokens_entrada'], uso['tokens_saida'], uso['duracao_s'], uso['fila_s'],
+                          uso['citacoes'], agora_sql()))
+    if not (CONSUMO_BUSCAS and ASSISTENTE_OK):
+        return
+    
+    def contar():
+        buscas = contar_buscas(uso['thread_id'], uso['run_id'])
+        if buscas is not None:
+            _gravador().executar('''UPDATE consumo_assistente SET buscas_arquivo = ? WHERE run_id = ?''',
+                                 (buscas, uso['run_id']))
+    threading.Thread(target=contar, name='consumo-buscas', daemon=True).start()
+
+def _tocar_chamado(chamado_id):
+    """Enfileira a atualização de atualizado_em (só a última de cada lote é gravada)"""
+    _gravador().executar('''UPDATE chamados SET atualizado_em = ? WHERE id = ?''',
+                         (agora_sql(), chamado_id), chave=('atualizado_em', chamado_id))
+
+def _salvar_conversa(chamado_id, conversa, thread_anterior):
+    """
+    Persiste a thread do chamado. Thread nova (criada ou trocada na resposta) vai direto
+    para o banco, porque a próxima pergunta precisa dela; o contador vai pela fila.
+    """
+    thread_id = conversa.get('thread_id')
+    if not thread_id:
+        return
+    if thread_id != thread_anterior:
+        with conectar(DB_PATH) as conn:
+            conn.execute('''UPDATE chamados SET thread_id = ?, mensagens_thread = ?
+                            WHERE id = ?''',
+                         (thread_id, conversa.get('mensagens_thread', 0), chamado_id))
+    else:
+        _gravador().executar('''UPDATE chamados SET mensagens_thread = ?
+                                WHERE id = ? AND thread_id = ?''',
+                             (conversa.get('mensagens_thread', 0), chamado_id, thread_id),
+                             chave=('conversa', chamado_id))
+
 def init_db():
     """Inicializa o banco de dados"""
     # Criar diretório data se não existir
@@ -59,7 +228,7 @@ def init_db():
         DB_PATH = "/tmp/storopack.db"
         print(f"[INFO] Usando banco de dados temporário: {DB_PATH}")
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = conectar(DB_PATH)
     c = conn.cursor()
     
     # Tabela de chamados
@@ -73,10 +242,19 @@ def init_db():
         latitude REAL,
         longitude REAL,
         distancia_km REAL,
+        geohash TEXT,
+        thread_id TEXT,
+        mensagens_thread INTEGER DEFAULT 0,
+        total_msgs INTEGER NOT NULL DEFAULT 0,
         criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
     
+    # Bancos criados antes da thread por chamado
+    _garantir_coluna(c, 'chamados', 'thread_id', 'TEXT')
+    _garantir_coluna(c, 'chamados', 'mensagens_thread', 'INTEGER DEFAULT 0')
+    _garantir_coluna(c, 'chamados', 'geohash', 'TEXT')
+    
     # Tabela de mensagens
     c.execute('''CREATE TABLE IF NOT EXISTS mensagens (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -96,10 +274,52 @@ def init_db():
         criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )''')
     
+    # Respostas do manual que chegaram depois do prazo do /chat (o cliente busca pelo id)
+    c.execute('''CREATE TABLE IF NOT EXISTS respostas_tardias (
+        id TEXT PRIMARY KEY,
+        chamado_id INTEGER,
+        resposta TEXT,
+        criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    
+    # Índices das listagens do painel (paginação por atualizado_em, id)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_mensagens_chamado ON mensagens(chamado_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_chamados_atualizado ON chamados(atualizado_em, id)')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_chamados_status_atualizado
+                 ON chamados(status, atualizado_em, id)''')
+    # Mapa: cobre a consulta de /admin/mapa sem ler a tabela
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_chamados_geohash
+                 ON chamados(geohash, latitude, longitude, status, modulo, distancia_km)''')
+    
+    _preencher_geohash(c)
+    
     conn.commit()
-    conn.close()
+    
+    # Contadores do painel e consumo do assistente (mantidos por triggers)
+    estatisticas.instalar(conn)
+    consumo.instalar(conn)
     print("[OK] Banco de dados inicializado")
 
+def _preencher_geohash(c):
+    """Calcula o geohash dos chamados antigos que têm coordenadas"""
+    total = 0
+    while True:
+        linhas = c.execute('''SELECT id, latitude, longitude FROM chamados
+                              WHERE geohash IS NULL AND latitude IS NOT NULL AND longitude IS NOT NULL
+                              LIMIT 5000''').fetchall()
+        valores = []
+        for chamado_id, lat, lon in linhas:
+            try:
+                valores.append((geo.codificar(float(lat), float(lon)), chamado_id))
+            except (TypeError, ValueError):
+                valores.append(('', chamado_id))   # coordenada inválida: não tenta de novo
+        if not valores:
+            break
+        c.executemany('UPDATE chamados SET geohash = ? WHERE id = ?', valores)
+        total += len(valores)
+    if total:
+        print(f"[INFO] Geohash calculado para {total} chamado(s)")
+
 def calcular_distancia(lat1, lon1, lat2, lon2):
     """Calcula distância em km usando fórmula de Haversine"""
     R = 6371
@@ -111,6 +331,16 @@ def calcular_distancia(lat1, lon1, lat2, lon2):
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R * c
 
+def _dados_localizacao(latitude, longitude):
+    """(distancia_km, geohash) do ponto do cliente, ou (None, None) se não der para calcular"""
+    if not (latitude and longitude):
+        return None, None
+    try:
+        lat, lon = float(latitude), float(longitude)
+        return calcular_distancia(lat, lon, STOROPACK_LAT, STOROPACK_LNG), geo.codificar(lat, lon)
+    except:
+        return None, None
+
 # Função exportada para outros módulos
 def estimar_distancia(cidade):
     """Estima distância baseado no nome da cidade"""
@@ -168,12 +398,9 @@ def registrar_contato():
         nome = data.get('nome')
         telefone = data.get('telefone')
         
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO contatos (session_id, nome, telefone)
-                     VALUES (?, ?, ?)''', (session_id, nome, telefone))
-        conn.commit()
-        conn.close()
+        with conectar(DB_PATH) as conn:
+            conn.execute('''INSERT OR REPLACE INTO contatos (session_id, nome, telefone)
+                            VALUES (?, ?, ?)''', (session_id, nome, telefone))
         
         return jsonify({'sucesso': True})
     except Exception as e:
@@ -182,87 +409,254 @@ def registrar_contato():
 
 # ============================ CHAT ============================
 
+def _ip_cliente():
+    """IP do cliente (no Render o request chega pelo proxy)"""
+    encaminhado = request.headers.get('X-Forwarded-For', '')
+    return encaminhado.split(',')[0].strip() or request.remote_addr
+
+def _admitir_chat(data):
+    """
+    Balde da sessão/IP; levanta Sobrecarga. A vaga do assistente é reservada pelo
+    assistente.py em volta do run (cache, carona e offline não ocupam vaga)
+    """
+    obter_limitador().admitir(data.get('session_id'), _ip_cliente())
+
+def _texto_sobrecarga(e):
+    return f"Muitas mensagens ao mesmo tempo. Aguarde {e.retry_after}s e tente novamente."
+
+def _resposta_sobrecarga(e, chamado_id=None):
+    """429 rápido com Retry-After (com o chamado, se a recusa veio depois de criá-lo)"""
+    print(f"[AVISO] Chat recusado ({e.motivo}), retry em {e.retry_after}s")
+    dados = {
+        'erro': e.motivo,
+        'retry_after': e.retry_after,
+        'resposta': _texto_sobrecarga(e)
+    }
+    if chamado_id:
+        dados['chamado_id'] = chamado_id
+    resposta = jsonify(dados)
+    resposta.headers['Retry-After'] = str(e.retry_after)
+    return resposta, 429
+
+def _entregar_tarde(chamado_id, complemento_id, conversa):
+    """
+    Callback da resposta que passou do prazo: grava no chamado e deixa disponível em
+    /chat/complemento/<id> (resposta NULL = o manual não respondeu)
+    """
+    def entregar(texto):
+        _registrar_consumo(chamado_id, conversa.pop('uso', None))
+        if texto:
+            _registrar_mensagem(chamado_id, 'assistant', texto)
+            _tocar_chamado(chamado_id)
+        with conectar(DB_PATH) as conn:
+            conn.execute('''INSERT OR REPLACE INTO respostas_tardias (id, chamado_id, resposta)
+                            VALUES (?, ?, ?)''', (complemento_id, chamado_id, texto))
+            conn.execute('''DELETE FROM respostas_tardias WHERE criado_em < DATETIME('now', '-1 day')''')
+    return entregar
+
+def _registrar_pergunta(data, mensagem):
+    """
+    Cria o chamado (primeira mensagem) ou carrega a conversa dele, e enfileira a pergunta.
+    Retorna (chamado_id, conversa); comum ao /chat e ao /chat/stream
+    """
+    chamado_id = data.get('chamado_id')
+    with metricas.etapa('banco'), conectar(DB_PATH) as conn:
+        c = conn.cursor()
+        
+        # Criar ou recuperar chamado
+        novo = False
+        if not chamado_id:
+            latitude = data.get('latitude')
+            longitude = data.get('longitude')
+            distancia_km, geohash = _dados_localizacao(latitude, longitude)
+            
+            # Síncrono: o ID volta para o cliente
+            c.execute('''INSERT INTO chamados
+                        (session_id, nome_cliente, telefone_cliente, modulo, latitude, longitude,
+                         distancia_km, geohash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (data.get('session_id'), data.get('nome_cliente'), data.get('telefone_cliente'),
+                      data.get('modulo'), latitude, longitude, distancia_km, geohash))
+            chamado_id = c.lastrowid
+            novo = True
+        
+        conversa = _carregar_conversa(c, chamado_id, novo)
+    
+    # Salvar mensagem do usuário
+    with metricas.etapa('banco'):
+        _registrar_mensagem(chamado_id, 'user', mensagem)
+    return chamado_id, conversa
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """Endpoint principal do chat"""
+    medicao = metricas.iniciar('chat')
     try:
         data = request.json
+        _admitir_chat(data)
         mensagem = data.get('mensagem', '').strip()
         modulo = data.get('modulo')
-        session_id = data.get('session_id')
-        chamado_id = data.get('chamado_id')
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
         nome_cliente = data.get('nome_cliente')
         telefone_cliente = data.get('telefone_cliente')
         
         print(f"[CHAT] Modulo: {modulo} | Msg: {mensagem[:80]}...")
         
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        # Criar ou recuperar chamado
-        if not chamado_id:
-            distancia_km = None
-            if latitude and longitude:
-                try:
-                    distancia_km = calcular_distancia(
-                        float(latitude), float(longitude), 
-                        STOROPACK_LAT, STOROPACK_LNG
-                    )
-                except:
-                    pass
-            
-            c.execute('''INSERT INTO chamados 
-                        (session_id, nome_cliente, telefone_cliente, modulo, latitude, longitude, distancia_km)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                     (session_id, nome_cliente, telefone_cliente, modulo, latitude, longitude, distancia_km))
-            chamado_id = c.lastrowid
-            conn.commit()
-        
-        # Salvar mensagem do usuário
-        c.execute('''INSERT INTO mensagens (chamado_id, tipo, conteudo)
-                     VALUES (?, ?, ?)''', (chamado_id, 'user', mensagem))
-        conn.commit()
-        
-        # Gerar resposta
+        chamado_id, conversa = _registrar_pergunta(data, mensagem)
+        thread_anterior = conversa.get('thread_id')
+
+        # Gerar resposta (fora da transação; passando do prazo, o manual chega depois)
+        complemento_id = uuid.uuid4().hex
+        recusa = None
         try:
             resposta = responder_cliente(
                 pergunta=mensagem,
                 modulo=modulo,
                 nome_cliente=nome_cliente,
-                telefone_cliente=telefone_cliente
+                telefone_cliente=telefone_cliente,
+                conversa=conversa,
+                ao_concluir_tarde=_entregar_tarde(chamado_id, complemento_id, conversa)
             )
+        except Sobrecarga as e:
+            # Sem vaga para o run: o chamado já existe, então a recusa fica no histórico
+            recusa = e
+            resposta = _texto_sobrecarga(e)
         except Exception as api_err:
             print(f"[ERRO] API do assistente: {api_err}")
             traceback.print_exc()
+            metricas.anotar(resultado='erro')
             resposta = (
                 "Desculpe, ocorreu um erro ao processar sua mensagem.\n\n"
                 "Por favor, tente novamente ou entre em contato:\n"
                 "(11) 5677-4699"
             )
         
+        pendente = conversa.pop('resposta_pendente', False)
+        if pendente:
+            resposta += "\n\n⏳ Ainda estou consultando o manual; a resposta completa aparece aqui em instantes."
+        
         # Salvar resposta
-        c.execute('''INSERT INTO mensagens (chamado_id, tipo, conteudo)
-                     VALUES (?, ?, ?)''', (chamado_id, 'assistant', resposta))
-        c.execute('''UPDATE chamados 
-                     SET atualizado_em = CURRENT_TIMESTAMP
-                     WHERE id = ?''', (chamado_id,))
-        conn.commit()
-        conn.close()
+        with metricas.etapa('banco'):
+            _registrar_mensagem(chamado_id, 'assistant', resposta)
+            _tocar_chamado(chamado_id)
+            _salvar_conversa(chamado_id, conversa, thread_anterior)
+            _registrar_consumo(chamado_id, conversa.pop('uso', None))
         
-        return jsonify({
+        if recusa:
+            return _resposta_sobrecarga(recusa, chamado_id)
+        dados = {
             'resposta': resposta,
             'chamado_id': chamado_id
-        })
+        }
+        if pendente:
+            dados['complemento_id'] = complemento_id
+        return jsonify(dados)
         
+    except Sobrecarga as e:
+        metricas.anotar(resultado='recusado')
+        return _resposta_sobrecarga(e)
     except Exception as e:
         print(f"[ERRO] Chat: {str(e)}")
         traceback.print_exc()
+        metricas.anotar(resultado='erro')
+        return jsonify({
+            'resposta': "Erro ao processar mensagem. Tente novamente.",
+            'erro': str(e)
+        }), 500
+    finally:
+        medicao.concluir()
+
+@app.route('/chat/complemento/<complemento_id>', methods=['GET'])
+def chat_complemento(complemento_id):
+    """Resposta do manual que passou do prazo do /chat: 202 enquanto não chegou"""
+    row = conectar(DB_PATH).execute('''SELECT resposta FROM respostas_tardias WHERE id = ?''',
+                                    (complemento_id,)).fetchone()
+    if row is None:
+        return jsonify({'pendente': True}), 202
+    return jsonify({'pendente': False, 'resposta': row['resposta']})
+
+def _evento_sse(evento, dados):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Chat com resposta enviada em partes (Server-Sent Events)"""
+    medicao = metricas.iniciar('chat_stream')
+    try:
+        data = request.json
+        _admitir_chat(data)
+        mensagem = data.get('mensagem', '').strip()
+        modulo = data.get('modulo')
+        nome_cliente = data.get('nome_cliente')
+        telefone_cliente = data.get('telefone_cliente')
+        
+        print(f"[CHAT-STREAM] Modulo: {modulo} | Msg: {mensagem[:80]}...")
+        
+        chamado_id, conversa = _registrar_pergunta(data, mensagem)
+        thread_anterior = conversa.get('thread_id')
+    except Sobrecarga as e:
+        medicao.concluir(resultado='recusado')
+        return _resposta_sobrecarga(e)
+    except Exception as e:
+        medicao.concluir(resultado='erro')
+        print(f"[ERRO] Chat stream: {str(e)}")
+        traceback.print_exc()
         return jsonify({
             'resposta': "Erro ao processar mensagem. Tente novamente.",
             'erro': str(e)
         }), 500
+    
+    def gerar():
+        # O corpo roda depois que a rota retornou: a medição continua aqui
+        medicao.retomar()
+        yield _evento_sse('inicio', {'chamado_id': chamado_id})
+        
+        resposta = None
+        try:
+            for tipo, texto in responder_cliente_stream(
+                pergunta=mensagem,
+                modulo=modulo,
+                nome_cliente=nome_cliente,
+                telefone_cliente=telefone_cliente,
+                conversa=conversa
+            ):
+                if tipo == 'delta':
+                    yield _evento_sse('delta', {'texto': texto})
+                else:
+                    resposta = texto
+        except Exception as api_err:
+            print(f"[ERRO] API do assistente (stream): {api_err}")
+            traceback.print_exc()
+            metricas.anotar(resultado='erro')
+        
+        if not resposta:
+            resposta = (
+                "Desculpe, ocorreu um erro ao processar sua mensagem.\n\n"
+                "Por favor, tente novamente ou entre em contato:\n"
+                "(11) 5677-4699"
+            )
+        
+        # Salvar resposta completa
+        try:
+            with metricas.etapa('banco'):
+                _registrar_mensagem(chamado_id, 'assistant', resposta)
+                _tocar_chamado(chamado_id)
+                _salvar_conversa(chamado_id, conversa, thread_anterior)
+                _registrar_consumo(chamado_id, conversa.pop('uso', None))
+        except Exception as e:
+            print(f"[ERRO] Salvar resposta (stream): {str(e)}")
+        
+        yield _evento_sse('fim', {'resposta': resposta, 'chamado_id': chamado_id})
+    
+    resposta = Response(
+        stream_with_context(gerar()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # O total vale até o fim do stream (ou até o cliente desconectar)
+    resposta.call_on_close(medicao.concluir)
+    metricas.suspender()
+    return resposta
 
 # ============================ LOCALIZAÇÃO ============================
 
@@ -280,15 +674,13 @@ def salvar_localizacao():
                 float(latitude), float(longitude),
                 STOROPACK_LAT, STOROPACK_LNG
             )
+            geohash = geo.codificar(float(latitude), float(longitude))
             
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute('''UPDATE chamados 
-                         SET latitude = ?, longitude = ?, distancia_km = ?
-                         WHERE id = ?''',
-                     (latitude, longitude, distancia_km, chamado_id))
-            conn.commit()
-            conn.close()
+            with conectar(DB_PATH) as conn:
+                conn.execute('''UPDATE chamados
+                                SET latitude = ?, longitude = ?, distancia_km = ?, geohash = ?
+                                WHERE id = ?''',
+                             (latitude, longitude, distancia_km, geohash, chamado_id))
         
         return jsonify({'sucesso': True})
     except Exception as e:
@@ -297,58 +689,47 @@ def salvar_localizacao():
 
 # ============================ ANÁLISE DE VÍDEO ============================
 
+def _analisar_job(job):
+    """Executado pelo pool da fila: o vídeo já está na pasta da fila"""
+    print(f"[VIDEO] Analisando vídeo ({os.path.getsize(job['video_path']) / 1024 / 1024:.1f}MB) para módulo: {job['modulo']}")
+    return analisar_video_erro(
+        video_path=job['video_path'],
+        modulo=job['modulo'] or 'airplus',
+        descricao_cliente=job['descricao'] or '',
+        hash_video=job.get('hash_video')
+    )
+
+def _fila_videos():
+    """Fila de análise de vídeo do banco atual (sobe o pool deste processo se preciso)"""
+    fila = obter_fila(DB_PATH, _analisar_job)
+    fila.iniciar()
+    return fila
+
 @app.route('/analyze-video', methods=['POST'])
 def analyze_video():
-    """Analisa vídeo enviado pelo usuário"""
+    """Recebe o vídeo e enfileira a análise; o cliente acompanha pelo job_id"""
     try:
         if 'video' not in request.files:
             return jsonify({'erro': 'Nenhum vídeo enviado'}), 400
         
         video = request.files['video']
         modulo = request.form.get('modulo', '')
+        descricao = request.form.get('descricao', '')
         
         if video.filename == '':
             return jsonify({'erro': 'Arquivo vazio'}), 400
         
-        # Salvar vídeo temporariamente
-        temp_dir = os.path.join(BASE_DIR, 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        video_path = os.path.join(temp_dir, f"video_{datetime.now().timestamp()}.mp4")
-        video.save(video_path)
-        
-        print(f"[VIDEO] Analisando vídeo para módulo: {modulo}")
-        
-        # Tentar usar o assistente com vídeo
-        try:
-            with open(video_path, 'rb') as f:
-                video_bytes = f.read()
-            
-            resposta = responder_cliente(
-                pergunta="Analise este vídeo e identifique o problema.",
-                modulo=modulo,
-                video_bytes=video_bytes,
-                video_path=video_path
-            )
-        except Exception as e:
-            print(f"[ERRO] Análise de vídeo: {e}")
-            resposta = (
-                "⚠️ Não foi possível analisar o vídeo automaticamente.\n\n"
-                "Por favor, descreva o problema que está aparecendo:\n"
-                "- Erro no display?\n"
-                "- Problema de selagem?\n"
-                "- Travamento?\n\n"
-                "Ou ligue: (11) 5677-4699"
-            )
-        
-        # Remover vídeo temporário
-        try:
-            os.remove(video_path)
-        except:
-            pass
+        # O upload já está em disco (RequisicaoComUpload), com o hash: só muda de pasta
+        video.stream.flush()
+        hash_video = video.stream.hexdigest() if isinstance(video.stream, ArquivoComHash) else None
+        fila = _fila_videos()
+        job_id = fila.enfileirar(video.stream.name, modulo, descricao, request.form.get('chamado_id'),
+                                 hash_video=hash_video)
         
-        return jsonify({'resposta': resposta})
+        return jsonify(fila.consultar(job_id)), 202
         
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         print(f"[ERRO] Endpoint analyze-video: {str(e)}")
         traceback.print_exc()
@@ -357,6 +738,33 @@ def analyze_video():
             'resposta': 'Erro ao analisar vídeo. Por favor, descreva o problema por texto.'
         }), 500
 
+@app.route('/analyze-video/<job_id>', methods=['GET'])
+def status_analise_video(job_id):
+    """Situação da análise: pendente (com posição na fila), executando, concluido ou erro"""
+    job = _fila_videos().consultar(job_id)
+    if job is None:
+        return jsonify({'erro': 'Análise não encontrada'}), 404
+    return jsonify(job)
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_grande_demais(e):
+    """Upload acima de MAX_CONTENT_LENGTH"""
+    maximo_mb = MAX_VIDEO_BYTES // (1024 * 1024)
+    return jsonify({
+        'erro': f'Arquivo maior que {maximo_mb}MB',
+        'resposta': f'⚠️ Vídeo muito grande (máximo {maximo_mb}MB). Envie um vídeo menor ou descreva o problema por texto.'
+    }), 413
+
+@app.teardown_request
+def remover_uploads(exc):
+    """Apaga os arquivos de upload do request (inclusive se foi interrompido)"""
+    for arquivo in getattr(request, 'arquivos_temporarios', ()):
+        try:
+            arquivo.close()
+            os.remove(arquivo.name)
+        except OSError:
+            pass
+
 # ============================ FEEDBACK ============================
 
 @app.route('/feedback', methods=['POST'])
@@ -370,21 +778,17 @@ def feedback():
         
         status = 'resolvido' if resolvido else 'nao_resolvido'
         
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''UPDATE chamados 
-                     SET status = ?, atualizado_em = CURRENT_TIMESTAMP
-                     WHERE id = ?''',
-                 (status, chamado_id))
-        
+        with conectar(DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute('''UPDATE chamados
+                         SET status = ?, atualizado_em = CURRENT_TIMESTAMP
+                         WHERE id = ?''',
+                     (status, chamado_id))
+
+        # Pela mesma fila das mensagens do chat: fica depois da resposta que avalia
         if comentario:
-            c.execute('''INSERT INTO mensagens (chamado_id, tipo, conteudo)
-                         VALUES (?, ?, ?)''',
-                     (chamado_id, 'feedback', comentario))
-        
-        conn.commit()
-        conn.close()
-        
+            _registrar_mensagem(chamado_id, 'feedback', comentario)
+
         return jsonify({'sucesso': True})
     except Exception as e:
         print(f"[ERRO] Feedback: {str(e)}")
@@ -411,101 +815,268 @@ def admin_login():
 def admin_stats():
     """Estatísticas gerais"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = conectar(DB_PATH)
         c = conn.cursor()
         
-        c.execute('SELECT COUNT(*) as total FROM chamados')
-        total_chamados = c.fetchone()['total']
-        
-        c.execute('''SELECT COUNT(*) as hoje FROM chamados 
-                     WHERE DATE(criado_em) = DATE('now')''')
-        chamados_hoje = c.fetchone()['hoje']
-        
+        # Tudo sai da tabela de contadores (estatisticas.py), não de chamados
         c.execute('''SELECT 
-                        COUNT(*) as total,
-                        SUM(CASE WHEN status = 'resolvido' THEN 1 ELSE 0 END) as resolvidos
-                     FROM chamados''')
+                        COALESCE(SUM(total), 0) as total,
+                        COALESCE(SUM(CASE WHEN dia = DATE('now') THEN total END), 0) as hoje,
+                        COALESCE(SUM(CASE WHEN status = 'resolvido' THEN total END), 0) as resolvidos,
+                        COALESCE(SUM(CASE WHEN status = 'pendente_tecnico' THEN total END), 0) as pendentes,
+                        SUM(soma_distancia) as soma_distancia,
+                        SUM(com_distancia) as com_distancia
+                     FROM estatisticas_chamados''')
         row = c.fetchone()
+        total_chamados = row['total']
+        chamados_hoje = row['hoje']
         taxa_resolucao_bot = int((row['resolvidos'] / row['total'] * 100)) if row['total'] > 0 else 0
+        pendentes_tecnico = row['pendentes']
+        distancia_media = row['soma_distancia'] / row['com_distancia'] if row['com_distancia'] else 0
         
-        c.execute('''SELECT COUNT(*) as pendentes FROM chamados 
-                     WHERE status = 'pendente_tecnico' ''')
-        pendentes_tecnico = c.fetchone()['pendentes']
+        try:
+            cache_respostas = obter_cache().estatisticas()
+        except Exception as e:
+            print(f"[AVISO] Estatísticas do cache: {e}")
+            cache_respostas = {}
         
-        c.execute('''SELECT AVG(distancia_km) as media FROM chamados 
-                     WHERE distancia_km IS NOT NULL''')
-        distancia_media = c.fetchone()['media'] or 0
+        try:
+            cache_videos = obter_cache_videos().estatisticas()
+        except Exception as e:
+            print(f"[AVISO] Estatísticas do cache de vídeos: {e}")
+            cache_videos = {}
         
-        conn.close()
+        try:
+            consumo_assistente = consumo.resumo(conn, 30)
+        except Exception as e:
+            print(f"[AVISO] Consumo do assistente: {e}")
+            consumo_assistente = {}
         
         return jsonify({
+            'gravador': _gravador().estatisticas(),
+            'fila_videos': _fila_videos().estatisticas(),
+            'limitador': obter_limitador().estatisticas(),
+            'disjuntores': estados_disjuntores(),
+            'coalescencia': obter_coalescedor().estatisticas(),
             'total_chamados': total_chamados,
             'chamados_hoje': chamados_hoje,
             'taxa_resolucao_bot': taxa_resolucao_bot,
+            'consumo': consumo_assistente,
             'pendentes_tecnico': pendentes_tecnico,
-            'distancia_media_km': round(distancia_media, 1)
+            'distancia_media_km': round(distancia_media, 1),
+            'cache_respostas': cache_respostas,
+            'cache_videos': cache_videos
         })
     except Exception as e:
         print(f"[ERRO] Admin stats: {str(e)}")
         return jsonify({}), 500
 
+def _codificar_cursor(row):
+    """Cursor opaco com a posição (atualizado_em, id) do último chamado da página"""
+    bruto = json.dumps([row['atualizado_em'], row['id']]).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+def _decodificar_cursor(cursor):
+    bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    atualizado_em, chamado_id = json.loads(bruto)
+    return atualizado_em, int(chamado_id)
+
 @app.route('/admin/chamados', methods=['GET'])
 def admin_chamados():
-    """Lista de chamados com filtros"""
+    """
+    Lista de chamados com filtros, do mais recente para o mais antigo.
+    Paginação por cursor: passe o next_cursor da resposta anterior em ?cursor=.
+    """
     try:
         status = request.args.get('status')
         modulo = request.args.get('modulo')
         data = request.args.get('data')
-        per_page = int(request.args.get('per_page', 20))
-        
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        per_page = max(1, min(int(request.args.get('per_page', 20)), 1000))
         
-        query = '''SELECT c.*, 
-                         (SELECT COUNT(*) FROM mensagens WHERE chamado_id = c.id) as total_msgs
-                   FROM chamados c
-                   WHERE 1=1'''
+        filtros = ''
         params = []
-        
-        if status:
-            query += ' AND c.status = ?'
-            params.append(status)
         if modulo:
-            query += ' AND c.modulo LIKE ?'
+            filtros += ' AND c.modulo LIKE ?'
             params.append(f'{modulo}%')
         if data:
-            query += ' AND DATE(c.criado_em) = ?'
-            params.append(data)
+            filtros += " AND c.criado_em >= ? AND c.criado_em < DATE(?, '+1 day')"
+            params.extend([data, data])
+        if request.args.get('cursor'):
+            try:
+                posicao = _decodificar_cursor(request.args['cursor'])
+            except Exception:
+                return jsonify({'erro': 'Cursor inválido'}), 400
+            filtros += ' AND (c.atualizado_em, c.id) < (?, ?)'
+            params.extend(posicao)
+        
+        conn = conectar(DB_PATH)
+        
+        def consultar(condicao, valores):
+            return conn.execute(f'''SELECT c.* FROM chamados c
+                                    WHERE {condicao}{filtros}
+                                    ORDER BY c.atualizado_em DESC, c.id DESC LIMIT ?''',
+                                valores + params + [per_page + 1]).fetchall()
         
-        query += ' ORDER BY c.atualizado_em DESC LIMIT ?'
-        params.append(per_page)
+        # Uma consulta por status: cada uma percorre o índice (status, atualizado_em, id)
+        # já na ordem e para no LIMIT, em vez de juntar e ordenar todos os chamados do IN
+        lista_status = list(dict.fromkeys(s.strip() for s in (status or '').split(',') if s.strip()))
+        if lista_status:
+            linhas = []
+            for s in lista_status:
+                linhas += consultar('c.status = ?', [s])
+            linhas.sort(key=lambda r: (r['atualizado_em'] or '', r['id']), reverse=True)
+        else:
+            linhas = consultar('1=1', [])
         
-        c.execute(query, params)
-        chamados = [dict(row) for row in c.fetchall()]
-        conn.close()
+        pagina = linhas[:per_page]
+        next_cursor = _codificar_cursor(pagina[-1]) if len(linhas) > per_page else None
         
-        return jsonify({'chamados': chamados})
+        return jsonify({'chamados': [dict(row) for row in pagina], 'next_cursor': next_cursor})
     except Exception as e:
         print(f"[ERRO] Admin chamados: {str(e)}")
         return jsonify({'chamados': []}), 500
 
+@app.route('/admin/mapa', methods=['GET'])
+def admin_mapa():
+    """
+    Chamados com localização em GeoJSON compacto, agrupados por célula de geohash.
+    ?bbox=oeste,sul,leste,norte (padrão: mundo inteiro) &zoom=0-18 &status=a,b
+    Célula com um chamado só vira ponto com id/status/modulo; as demais vêm no
+    centróide com n (total) e a contagem por status.
+    """
+    try:
+        try:
+            bbox = request.args.get('bbox')
+            oeste, sul, leste, norte = [float(v) for v in bbox.split(',')] if bbox else (-180.0, -90.0, 180.0, 90.0)
+            zoom = int(request.args.get('zoom', 4))
+        except ValueError:
+            return jsonify({'erro': 'bbox ou zoom inválido'}), 400
+        precisao = geo.precisao_para_zoom(zoom)
+        lista_status = list(dict.fromkeys(s.strip() for s in request.args.get('status', '').split(',') if s.strip()))
+        
+        # Zoom afastado: soma as células pré-agregadas por trigger (~39 x 20 km, estatisticas_mapa),
+        # filtrando pelo centróide de cada uma; zoom próximo: lê os chamados pelo índice
+        agregado = precisao <= estatisticas.CELULA_MAPA
+        if agregado:
+            coluna, lat, lon = 'celula', 'soma_lat / total', 'soma_lon / total'
+            campos = '''SUM(total) AS n, SUM(soma_lat) AS soma_lat, SUM(soma_lon) AS soma_lon,
+                        NULL AS id, NULL AS modulo,
+                        SUM(soma_distancia) AS soma_distancia, SUM(com_distancia) AS com_distancia
+                        FROM estatisticas_mapa'''
+        else:
+            coluna, lat, lon = 'geohash', 'latitude', 'longitude'
+            campos = '''COUNT(*) AS n, SUM(latitude) AS soma_lat, SUM(longitude) AS soma_lon,
+                        MIN(id) AS id, MIN(modulo) AS modulo,
+                        SUM(distancia_km) AS soma_distancia, COUNT(distancia_km) AS com_distancia
+                        FROM chamados'''
+        
+        def filtros_area(coluna, lat, lon, prefixos):
+            # Faixas de prefixo no índice ('{' vem logo depois de 'z') + retângulo exato
+            sql = '(' + ' OR '.join(f'({coluna} >= ? AND {coluna} < ?)' for _ in prefixos) + ')'
+            params = []
+            for prefixo in prefixos:
+                params += [prefixo, prefixo + '{']
+            sql += f' AND {lat} BETWEEN ? AND ?'
+            params += [sul, norte]
+            if oeste <= leste:
+                sql += f' AND {lon} BETWEEN ? AND ?'
+            else:
+                sql += f' AND ({lon} >= ? OR {lon} <= ?)'
+            params += [oeste, leste]
+            if lista_status:
+                sql += f" AND status IN ({','.join('?' * len(lista_status))})"
+                params += lista_status
+            return sql, params
+        
+        conn = conectar(DB_PATH)
+        filtros, params = filtros_area(coluna, lat, lon, geo.cobrir(oeste, sul, leste, norte))
+        linhas = conn.execute(f'''SELECT substr({coluna}, 1, ?) AS celula, status, {campos}
+                                  WHERE {filtros}
+                                  GROUP BY 1, status''', [precisao] + params).fetchall()
+        
+        celulas = {}
+        por_status = {}
+        soma_distancia = 0
+        com_distancia = 0
+        for row in linhas:
+            status = row['status'] or 'aberto'
+            celula = celulas.setdefault(row['celula'], {'n': 0, 'lat': 0, 'lon': 0, 'status': {}})
+            celula['n'] += row['n']
+            celula['lat'] += row['soma_lat']
+            celula['lon'] += row['soma_lon']
+            celula['status'][status] = celula['status'].get(status, 0) + row['n']
+            celula['id'] = row['id']
+            celula['modulo'] = row['modulo']
+            por_status[status] = por_status.get(status, 0) + row['n']
+            soma_distancia += row['soma_distancia'] or 0
+            com_distancia += row['com_distancia']
+        
+        # No agregado não há id: busca os chamados sozinhos na célula (uma busca no índice cada)
+        if agregado:
+            for prefixo, celula in list(celulas.items())[:500]:
+                if celula['n'] == 1:
+                    filtros, params = filtros_area('geohash', 'latitude', 'longitude', [prefixo])
+                    row = conn.execute(f'''SELECT id, modulo FROM chamados
+                                           WHERE {filtros} LIMIT 1''', params).fetchone()
+                    if row:
+                        celula['id'], celula['modulo'] = row['id'], row['modulo']
+        
+        features = []
+        for celula in celulas.values():
+            n = celula['n']
+            if n == 1 and celula['id'] is not None:
+                propriedades = {'id': celula['id'], 'status': next(iter(celula['status'])), 'modulo': celula['modulo']}
+            else:
+                propriedades = {'n': n, 'status': celula['status']}
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Point',
+                             'coordinates': [round(celula['lon'] / n, 5), round(celula['lat'] / n, 5)]},
+                'properties': propriedades
+            })
+        
+        return jsonify({
+            'type': 'FeatureCollection',
+            'features': features,
+            'total': sum(por_status.values()),
+            'por_status': por_status,
+            'distancia_media_km': round(soma_distancia / com_distancia, 1) if com_distancia else 0,
+            'precisao': precisao
+        })
+    except Exception as e:
+        print(f"[ERRO] Admin mapa: {str(e)}")
+        return jsonify({'type': 'FeatureCollection', 'features': []}), 500
+
 @app.route('/admin/pendentes-tecnico', methods=['GET'])
 def admin_pendentes():
-    """Chamados pendentes para técnico"""
+    """
+    Chamados pendentes para técnico, do mais recente para o mais antigo.
+    O corpo continua sendo a lista (formato antigo); a próxima página vem no cabeçalho
+    X-Next-Cursor, para passar de volta em ?cursor= como no /admin/chamados.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('''SELECT c.*, 
-                           (SELECT COUNT(*) FROM mensagens WHERE chamado_id = c.id) as total_msgs
-                     FROM chamados c
-                     WHERE c.status = 'pendente_tecnico'
-                     ORDER BY c.atualizado_em DESC''')
-        pendentes = [dict(row) for row in c.fetchall()]
-        conn.close()
-        return jsonify(pendentes)
+        per_page = max(1, min(int(request.args.get('per_page', 1000)), 1000))
+        filtros = ''
+        params = []
+        if request.args.get('cursor'):
+            try:
+                posicao = _decodificar_cursor(request.args['cursor'])
+            except Exception:
+                return jsonify({'erro': 'Cursor inválido'}), 400
+            filtros = ' AND (c.atualizado_em, c.id) < (?, ?)'
+            params.extend(posicao)
+        
+        # Índice (status, atualizado_em, id): lê só a página, já na ordem
+        linhas = conectar(DB_PATH).execute(f'''SELECT c.* FROM chamados c
+                                               WHERE c.status = 'pendente_tecnico'{filtros}
+                                               ORDER BY c.atualizado_em DESC, c.id DESC LIMIT ?''',
+                                           params + [per_page + 1]).fetchall()
+        pagina = linhas[:per_page]
+        
+        resposta = jsonify([dict(row) for row in pagina])
+        if len(linhas) > per_page:
+            resposta.headers['X-Next-Cursor'] = _codificar_cursor(pagina[-1])
+        return resposta
     except Exception as e:
         print(f"[ERRO] Admin pendentes: {str(e)}")
         return jsonify([]), 500
@@ -514,17 +1085,13 @@ def admin_pendentes():
 def admin_chamado_detalhes(chamado_id):
     """Detalhes completos de um chamado"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = conectar(DB_PATH)
         c = conn.cursor()
         
-        c.execute('''SELECT c.*,
-                           (SELECT COUNT(*) FROM mensagens WHERE chamado_id = c.id) as total_msgs
-                     FROM chamados c
+        c.execute('''SELECT c.* FROM chamados c
                      WHERE c.id = ?''', (chamado_id,))
         row = c.fetchone()
         if not row:
-            conn.close()
             return jsonify({'erro': 'Chamado não encontrado'}), 404
         
         chamado = dict(row)
@@ -534,7 +1101,7 @@ def admin_chamado_detalhes(chamado_id):
                      ORDER BY criado_em ASC''', (chamado_id,))
         mensagens = [dict(r) for r in c.fetchall()]
         chamado['mensagens'] = mensagens
-        conn.close()
+        chamado['consumo'] = consumo.do_chamado(conn, chamado_id)
         
         return jsonify(chamado)
     except Exception as e:
@@ -547,13 +1114,10 @@ def admin_alterar_status(chamado_id):
     try:
         data = request.json
         novo_status = data.get('status')
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''UPDATE chamados 
-                     SET status = ?, atualizado_em = CURRENT_TIMESTAMP
-                     WHERE id = ?''', (novo_status, chamado_id))
-        conn.commit()
-        conn.close()
+        with conectar(DB_PATH) as conn:
+            conn.execute('''UPDATE chamados
+                            SET status = ?, atualizado_em = CURRENT_TIMESTAMP
+                            WHERE id = ?''', (novo_status, chamado_id))
         return jsonify({'sucesso': True})
     except Exception as e:
         print(f"[ERRO] Alterar status: {str(e)}")
@@ -563,12 +1127,12 @@ def admin_alterar_status(chamado_id):
 def admin_excluir_chamado(chamado_id):
     """Excluir chamado"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM mensagens WHERE chamado_id = ?', (chamado_id,))
-        c.execute('DELETE FROM chamados WHERE id = ?', (chamado_id,))
-        conn.commit()
-        conn.close()
+        # Mensagens ainda na fila voltariam a aparecer depois do DELETE
+        _gravador().descarregar(timeout=5)
+        with conectar(DB_PATH) as conn:
+            conn.execute('DELETE FROM mensagens WHERE chamado_id = ?', (chamado_id,))
+            conn.execute('DELETE FROM chamados WHERE id = ?', (chamado_id,))
+            # consumo_assistente fica: os tokens foram gastos mesmo assim
         return jsonify({'sucesso': True})
     except Exception as e:
         print(f"[ERRO] Excluir chamado: {str(e)}")
@@ -584,11 +1148,38 @@ def reiniciar():
 @app.route('/health')
 def health():
     """Endpoint de health check para o Render"""
+    disjuntores = estados_disjuntores()
+    abertos = sorted(nome for nome, d in disjuntores.items() if d['estado'] != 'fechado')
     return jsonify({
         'status': 'ok',
-        'assistente': 'ok' if ASSISTENTE_OK else 'offline'
+        'assistente': 'ok' if ASSISTENTE_OK else 'offline',
+        'api_assistente': 'degradada' if abertos else 'ok',
+        'disjuntores_abertos': abertos
     })
 
+@app.route('/metrics')
+def metrics():
+    """Métricas no formato do Prometheus (histogramas somando todos os workers)"""
+    texto = metricas.obter_metricas().exportar()
+    try:
+        coalescencia = obter_coalescedor().estatisticas()
+        texto += metricas.formatar(
+            'storopack_coalescencia_total', 'counter', 'Perguntas iguais em andamento por papel',
+            [({'papel': papel}, coalescencia[papel]) for papel in ('lideres', 'caronas', 'caronas_sem_resultado')]
+        )
+    except Exception as e:
+        print(f"[AVISO] Métricas da coalescência: {e}")
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready')
+def ready():
+    """Pronto para atender: 503 enquanto o assistente ainda está aquecendo"""
+    estado = estado_aquecimento()
+    estado['assistente'] = 'ok' if ASSISTENTE_OK else 'offline'
+    if not AQUECIMENTO:
+        estado['pronto'] = True     # sem aquecimento, tudo sobe no primeiro uso
+    return jsonify(estado), 200 if estado['pronto'] else 503
+
 # ============================ INICIALIZAÇÃO AUTOMÁTICA ============================
 
 # Inicializar banco de dados automaticamente quando o módulo é carregado
@@ -600,6 +1191,17 @@ except Exception as e:
     print(f"[ERRO] Falha ao inicializar banco: {e}")
     traceback.print_exc()
 
+# Cliente OpenAI e caches sobem em segundo plano: o /health responde sem esperar por eles
+# (AQUECIMENTO=0 deixa tudo para o primeiro uso)
+if AQUECIMENTO:
+    threading.Thread(target=aquecer, name='aquecimento', daemon=True).start()
+
+# Pool da fila de vídeos: retoma jobs que ficaram pendentes de execuções anteriores
+try:
+    _fila_videos()
+except Exception as e:
+    print(f"[ERRO] Falha ao iniciar fila de vídeos: {e}")
+
 # Criar pastas necessárias
 try:
     for pasta in ['static', 'static/erros', 'temp', 'logs', 'uploads', 'uploads/pdfs', 'uploads/videos']:
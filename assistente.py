@@ -1,8 +1,19 @@
 from dotenv import load_dotenv
 import os
 import re
+import threading
+import time
 import traceback
 
+from cache_respostas import CACHE_ATIVO, PADRAO_CODIGO_ERRO, obter_cache, versao_equipamento
+from coalescencia import chave_pergunta, obter_coalescedor
+from disjuntor import obter_disjuntor
+from equipamentos import obter_registro
+from indice_manuais import buscar_trechos, resumo
+from limitador import Sobrecarga, obter_limitador
+import metricas
+from pos_processamento import PosProcessador, pos_processar
+
 # LIMPAR VARIÁVEIS DE PROXY DO AMBIENTE
 for proxy_var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'ALL_PROXY', 'all_proxy']:
     if proxy_var in os.environ:
@@ -11,85 +22,73 @@ for proxy_var in ['HTTP_PROXY', 'HTTPS_PROXY', 'http_proxy', 'https_proxy', 'ALL
 load_dotenv(override=True)
 
 API_KEY = os.getenv("OPENAI_API_KEY", "").strip()
+# Outro servidor compatível (ex.: benchmarks/simulador_openai.py); dispensa a chave
+BASE_URL = os.getenv("OPENAI_BASE_URL", "").strip() or None
 
 # ============================ CONFIGURAÇÃO OPENAI ============================
 
-OPENAI_DISPONIVEL = False
+# O cliente é criado no primeiro uso (ou no aquecimento): importar openai/httpx leva
+# centenas de ms e não deve atrasar o boot nem o /health
+OPENAI_DISPONIVEL = bool(BASE_URL or (API_KEY and len(API_KEY) > 10))
 client = None
+_lock_cliente = threading.Lock()
 
-if API_KEY and len(API_KEY) > 10:
-    try:
-        from openai import OpenAI, RateLimitError
-        import httpx
-        
-        http_client = httpx.Client(
-            timeout=30.0,
-            follow_redirects=True
-        )
-        
-        client = OpenAI(
-            api_key=API_KEY,
-            http_client=http_client,
-            max_retries=2
-        )
-        OPENAI_DISPONIVEL = True
-        print("[OK] API Key carregada: " + API_KEY[:15] + "..." + API_KEY[-8:])
-    except Exception as e:
-        print(f"[ERRO] Falha ao inicializar OpenAI: {e}")
-        traceback.print_exc()
-else:
+if not OPENAI_DISPONIVEL:
     print("[AVISO] API Key não configurada")
-    try:
-        from openai import RateLimitError
-    except:
-        class RateLimitError(Exception):
-            pass
+
+
+class RateLimitError(Exception):
+    """Trocada pela exceção do openai quando o cliente é criado"""
+
+
+def obter_cliente():
+    """Cliente OpenAI (None se a API não estiver disponível)"""
+    global client, OPENAI_DISPONIVEL, RateLimitError
+    if client is not None or not OPENAI_DISPONIVEL:
+        return client
+    with _lock_cliente:
+        if client is not None or not OPENAI_DISPONIVEL:
+            return client
+        try:
+            from openai import OpenAI, RateLimitError as _RateLimitError
+            import httpx
+            
+            http_client = httpx.Client(
+                timeout=30.0,
+                follow_redirects=True
+            )
+            
+            RateLimitError = _RateLimitError
+            client = OpenAI(
+                api_key=API_KEY or "sem-chave",
+                base_url=BASE_URL,
+                http_client=http_client,
+                max_retries=2
+            )
+            if BASE_URL:
+                print(f"[AVISO] OpenAI apontado para {BASE_URL}")
+            else:
+                print("[OK] API Key carregada: " + API_KEY[:15] + "..." + API_KEY[-8:])
+        except Exception as e:
+            OPENAI_DISPONIVEL = False
+            print(f"[ERRO] Falha ao inicializar OpenAI: {e}")
+            traceback.print_exc()
+    return client
 
 # ============================ CONFIGURAÇÃO DE EQUIPAMENTOS ============================
 
-EQUIPAMENTOS = {
-    # AIRplus (sem submenu - entra direto)
-    "airplus": {
-        "nome_completo": "AIRplus Mini",
-        "assistant_id": os.getenv("ASSISTANT_AIRPLUS_MINI", ""),
-        "vector_store_id": os.getenv("VECTOR_AIRPLUS_MINI", ""),
-    },
-    
-    # AIRmove
-    "airmove_2": {
-        "nome_completo": "AIRmove 2",
-        "assistant_id": os.getenv("ASSISTANT_AIRMOVE_2", ""),
-        "vector_store_id": os.getenv("VECTOR_AIRMOVE_2", ""),
-    },
-    
-    # FOAMplus
-    "foamplus": {
-        "nome_completo": "FOAMplus Bag Packer",
-        "assistant_id": os.getenv("ASSISTANT_FOAMPLUS_BAG", ""),
-        "vector_store_id": os.getenv("VECTOR_FOAMPLUS_BAG", ""),
-    },
-    
-    # PAPERplus
-    "paperplus_classic": {
-        "nome_completo": "PAPERplus Classic",
-        "assistant_id": os.getenv("ASSISTANT_PAPERPLUS_CLASSIC", ""),
-        "vector_store_id": os.getenv("VECTOR_PAPERPLUS_CLASSIC", ""),
-    },
-    "paperplus_track": {
-        "nome_completo": "PAPERplus Track",
-        "assistant_id": os.getenv("ASSISTANT_PAPERPLUS_TRACK", ""),
-        "vector_store_id": os.getenv("VECTOR_PAPERPLUS_TRACK", ""),
-    },
-}
+# Registro em equipamentos.json (equipamentos.py): novos equipamentos e prefixos do frontend
+# entram sem mudar código e são recarregados sem reiniciar o servidor
 
-# Mostrar equipamentos configurados
-print("\n[INFO] Equipamentos configurados:")
-for key, config in EQUIPAMENTOS.items():
-    if config["assistant_id"] and config["vector_store_id"]:
-        status = "✓"
-        print(f"  {status} {config['nome_completo']}")
-    else:
-        print(f"  ✗ {config['nome_completo']} - NÃO CONFIGURADO")
+def mostrar_equipamentos():
+    """Mostra no log quais equipamentos têm assistente configurado"""
+    print("\n[INFO] Equipamentos configurados:")
+    for config in obter_registro().equipamentos.values():
+        if config["assistant_id"] and config["vector_store_id"]:
+            status = "✓"
+            print(f"  {status} {config['nome_completo']}")
+        else:
+            print(f"  ✗ {config['nome_completo']} - NÃO CONFIGURADO")
 
 CONTATO_TELEFONE = "(11) 5677-4699"
 CONTATO_EMAIL = "packaging.br@storopack.com"
@@ -146,51 +145,251 @@ def processar_videos(texto: str) -> str:
     return texto.strip()
 
 
-
 def get_equipamento_config(modulo: str) -> dict:
-    """Retorna a configuração do equipamento baseado no módulo"""
-    modulo_lower = modulo.lower() if modulo else ""
-    
-    # Mapeamento direto
-    if modulo_lower in EQUIPAMENTOS:
-        return EQUIPAMENTOS[modulo_lower]
-    
-    # Mapeamento por prefixo do frontend
-    # airplus_void, airplus_cushion, airplus_bubble, airplus_wrap → airplus
-    if modulo_lower.startswith("airplus"):
-        return EQUIPAMENTOS.get("airplus")
-    
-    # airmove1_void, airmove1_cushion → airmove (usa mesmo assistant)
-    # airmove2_void, airmove2_cushion, airmove2_bubble, airmove2_wrap → airmove_2
-    if modulo_lower.startswith("airmove2") or modulo_lower.startswith("airmove_2"):
-        return EQUIPAMENTOS.get("airmove_2")
-    if modulo_lower.startswith("airmove1") or modulo_lower.startswith("airmove_1"):
-        return EQUIPAMENTOS.get("airmove_2")  # mesmo assistant por enquanto
-    if modulo_lower.startswith("airmove"):
-        return EQUIPAMENTOS.get("airmove_2")
-    
-    # foamplus_bagpacker, foam_bagpacker, foam_handpacker → foamplus
-    if modulo_lower.startswith("foam"):
-        return EQUIPAMENTOS.get("foamplus")
-    
-    # paper_shooter, paper_papillon, paper_classic, paper_cx, paper_track, paper_chevron → paperplus
-    if modulo_lower.startswith("paper"):
-        # Tentar match específico
-        if "track" in modulo_lower:
-            return EQUIPAMENTOS.get("paperplus_track")
-        return EQUIPAMENTOS.get("paperplus_classic")  # fallback para classic
-    
+    """
+    Retorna a configuração do equipamento baseado no módulo
+    (airplus_void → airplus, airmove1_cushion → airmove_2, paper_track → paperplus_track...).
+    Resolva uma vez por mensagem e passe o config adiante.
+    """
+    return obter_registro().resolver(modulo)
+
+
+# ============================ PRAZO POR MENSAGEM ============================
+
+# Quanto o cliente espera pelo manual no /chat. Passando disso recebe a resposta offline
+# e o run continua em segundo plano; a resposta do manual é entregue quando chegar
+PRAZO_CHAT_S = float(os.getenv("CHAT_PRAZO_S", "8"))
+# Até quando um run em segundo plano é acompanhado
+PRAZO_SEGUNDO_PLANO_S = float(os.getenv("CHAT_PRAZO_SEGUNDO_PLANO_S", "120"))
+RUN_EM_ANDAMENTO = ("queued", "in_progress", "cancelling")
+
+
+class PrazoEsgotado(Exception):
+    """O prazo da mensagem acabou antes de o run ser criado"""
+
+
+def _timeout(prazo: float = None) -> float:
+    """Timeout da próxima chamada à API: o que sobra do prazo (30s sem prazo)"""
+    if prazo is None:
+        return 30.0
+    return max(prazo - time.monotonic(), 0.5)
+
+
+def _aguardar_run(thread_id: str, run, prazo: float, vaga=None):
+    """
+    Consulta o run com intervalo crescente (0,2s até 2s) até terminar ou o prazo acabar,
+    renovando a `vaga` do limitador. O tempo vai para as métricas como run_fila (queued)
+    e run_execucao; a troca é vista na consulta seguinte, então a divisão tem a resolução
+    do intervalo.
+    """
+    intervalo = 0.2
+    inicio_etapa = time.monotonic()
+    etapa = "run_fila" if run.status == "queued" else "run_execucao"
+    while run.status in RUN_EM_ANDAMENTO:
+        restante = prazo - time.monotonic()
+        if restante <= 0:
+            break
+        time.sleep(min(intervalo, restante))
+        intervalo = min(intervalo * 1.5, 2.0)
+        if vaga is not None:
+            vaga.manter()
+        run = client.beta.threads.runs.retrieve(run_id=run.id, thread_id=thread_id, timeout=_timeout(prazo))
+        if etapa == "run_fila" and run.status != "queued":
+            agora = time.monotonic()
+            metricas.somar(etapa, agora - inicio_etapa)
+            etapa, inicio_etapa = "run_execucao", agora
+    metricas.somar(etapa, time.monotonic() - inicio_etapa)
+    return run
+
+
+def _texto_do_run(thread_id: str, run, prazo: float = None, uso: dict = None):
+    """Resposta do assistente produzida pelo run, já pós-processada (conta as citações em `uso`)"""
+    with metricas.etapa("mensagens_listar"):
+        messages = client.beta.threads.messages.list(thread_id=thread_id, run_id=run.id, timeout=_timeout(prazo))
+    for msg in messages.data:
+        if msg.role == "assistant":
+            if uso is not None:
+                uso["citacoes"] = _citacoes(msg)
+            with metricas.etapa("pos_processamento"):
+                return pos_processar(msg.content[0].text.value)
     return None
 
 
+def _continuar_em_segundo_plano(thread_id: str, run, config: dict, inicio: float, ao_concluir,
+                                conversa: dict, inicio_run: float, vaga):
+    """
+    Acompanha o run que passou do prazo e entrega o texto (ou None) para `ao_concluir`;
+    o consumo do run vai antes para conversa["uso"]. A vaga do limitador fica com o run
+    e só é devolvida quando ele termina
+    """
+    nome_equipamento = config["nome_completo"]
+    disjuntor = _disjuntor(config)
+    
+    def seguir():
+        texto = None
+        try:
+            final = _aguardar_run(thread_id, run, time.monotonic() + PRAZO_SEGUNDO_PLANO_S, vaga)
+            if final.status not in RUN_EM_ANDAMENTO:
+                conversa["uso"] = _uso_do_run(final, config, thread_id, time.monotonic() - inicio_run)
+            if final.status == "completed":
+                disjuntor.sucesso(time.monotonic() - inicio)
+                texto = _texto_do_run(thread_id, final, uso=conversa.get("uso"))
+                print(f"[OK] Resposta do manual de {nome_equipamento} chegou em {time.monotonic() - inicio:.1f}s")
+            else:
+                disjuntor.falha(f"run {final.status}", time.monotonic() - inicio)
+                print(f"[AVISO] Run em segundo plano ({nome_equipamento}): {final.status}")
+        except Exception as e:
+            disjuntor.falha(f"{type(e).__name__}: {e}", time.monotonic() - inicio)
+            print(f"[ERRO] Run em segundo plano ({nome_equipamento}): {str(e)[:300]}")
+        finally:
+            vaga.liberar()
+        try:
+            ao_concluir(texto)
+        except Exception as e:
+            print(f"[ERRO] Entregar resposta do segundo plano: {e}")
+            traceback.print_exc()
+    
+    threading.Thread(target=seguir, name="run-segundo-plano", daemon=True).start()
+
+
+# ============================ CONSUMO POR RESPOSTA ============================
+
+def _citacoes(msg) -> int:
+    """Anotações file_citation da mensagem (trechos do manual usados na resposta)"""
+    try:
+        return sum(1 for a in msg.content[0].text.annotations or [] if getattr(a, "type", "") == "file_citation")
+    except (AttributeError, IndexError, TypeError):
+        return 0
+
+
+def _uso_do_run(run, config: dict, thread_id: str, duracao_s: float, citacoes: int = 0) -> dict:
+    """Tokens e tempos de um run terminado, no formato de consumo.py (vai em conversa["uso"])"""
+    usage = getattr(run, "usage", None)
+    criado, iniciado = getattr(run, "created_at", None), getattr(run, "started_at", None)
+    return {
+        "run_id": run.id,
+        "thread_id": thread_id,
+        "equipamento": config.get("chave") or config["nome_completo"],
+        "status": run.status,
+        "tokens_entrada": getattr(usage, "prompt_tokens", 0) or 0,
+        "tokens_saida": getattr(usage, "completion_tokens", 0) or 0,
+        "duracao_s": round(duracao_s, 3),
+        "fila_s": iniciado - criado if criado and iniciado else None,
+        "citacoes": citacoes,
+    }
+
+
+def contar_buscas(thread_id: str, run_id: str):
+    """Chamadas do File Search nos passos do run (None se não der para consultar)"""
+    if not obter_cliente():
+        return None
+    try:
+        passos = client.beta.threads.runs.steps.list(thread_id=thread_id, run_id=run_id, limit=100, timeout=30)
+    except Exception as e:
+        print(f"[AVISO] Passos do run {run_id}: {str(e)[:200]}")
+        return None
+    total = 0
+    for passo in passos.data:
+        for chamada in getattr(getattr(passo, "step_details", None), "tool_calls", None) or []:
+            if getattr(chamada, "type", "") == "file_search":
+                total += 1
+    return total
+
+
+# ============================ THREADS POR CHAMADO ============================
+
+# Cada chamado mantém uma thread no OpenAI; o run só considera as mensagens mais recentes
+MENSAGENS_CONTEXTO = int(os.getenv("THREAD_MENSAGENS_CONTEXTO", "10"))
+# Passando desse tamanho, a conversa continua numa thread nova com um resumo da anterior
+MAX_MENSAGENS_THREAD = int(os.getenv("THREAD_MAX_MENSAGENS", "40"))
+TRUNCAMENTO_THREAD = {"type": "last_messages", "last_messages": MENSAGENS_CONTEXTO}
+
+
+def _resumo_thread(thread_id: str, prazo: float = None) -> str:
+    """Resume as últimas trocas de uma thread para semear a próxima"""
+    try:
+        recentes = client.beta.threads.messages.list(thread_id=thread_id, order="desc", limit=6,
+                                                     timeout=_timeout(prazo))
+    except Exception as e:
+        print(f"[AVISO] Não foi possível resumir a thread {thread_id}: {str(e)[:200]}")
+        return ""
+    
+    linhas = []
+    for msg in reversed(recentes.data):
+        if not msg.content or not hasattr(msg.content[0], "text"):
+            continue
+        autor = "Cliente" if msg.role == "user" else "Assistente"
+        linhas.append(f"{autor}: {limpar_formatacao(msg.content[0].text.value)[:300]}")
+    
+    if not linhas:
+        return ""
+    return "Resumo da conversa anterior deste chamado:\n" + "\n".join(linhas)
+
+
+def _preparar_thread(pergunta: str, conversa: dict, prazo: float = None) -> str:
+    """Coloca a pergunta na thread do chamado, criando uma nova quando necessário"""
+    thread_id = conversa.get("thread_id")
+    total = conversa.get("mensagens_thread") or 0
+    resumo = ""
+    
+    # Thread longa demais: recomeça com um resumo para o run não ficar cada vez mais lento
+    if thread_id and total >= MAX_MENSAGENS_THREAD:
+        print(f"[INFO] Thread {thread_id} atingiu {total} mensagens, iniciando nova")
+        with metricas.etapa("mensagens_listar"):
+            resumo = _resumo_thread(thread_id, prazo)
+        thread_id = None
+    
+    if thread_id:
+        try:
+            with metricas.etapa("mensagem_criar"):
+                client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role="user",
+                    content=pergunta,
+                    timeout=_timeout(prazo)
+                )
+            conversa["mensagens_thread"] = total + 1
+            return thread_id
+        except Exception as e:
+            print(f"[AVISO] Thread {thread_id} indisponível, criando nova: {str(e)[:200]}")
+    
+    mensagens = [{"role": "user", "content": resumo}] if resumo else []
+    # Primeira thread do chamado: leva as trocas respondidas sem run (cache, carona...)
+    if not thread_id:
+        mensagens += [{"role": "user" if tipo == "user" else "assistant", "content": texto}
+                      for tipo, texto in conversa.pop("historico", None) or [] if texto]
+    mensagens.append({"role": "user", "content": pergunta})
+    
+    # Cria a thread já com a pergunta (uma chamada a menos)
+    with metricas.etapa("thread_criar"):
+        thread = client.beta.threads.create(messages=mensagens, timeout=_timeout(prazo))
+    conversa["thread_id"] = thread.id
+    conversa["mensagens_thread"] = len(mensagens)
+    return thread.id
+
+
 # ============================ RESPOSTA COM ASSISTANTS API ============================
 
-def responder_com_assistants_api(pergunta: str, modulo: str) -> str:
-    """Usa a Assistants API específica do equipamento com File Search"""
-    if not client:
+def _disjuntor(config: dict):
+    """Um disjuntor por equipamento (cada um tem seu assistente)"""
+    return obter_disjuntor(config.get("chave") or config["assistant_id"])
+
+
+def responder_com_assistants_api(pergunta: str, modulo: str, conversa: dict = None, config: dict = None,
+                                 prazo_s: float = None, ao_concluir_tarde=None) -> str:
+    """
+    Usa a Assistants API específica do equipamento com File Search.
+    `conversa` guarda thread_id/mensagens_thread do chamado e é atualizado aqui.
+    Todas as etapas dividem o prazo `prazo_s` (padrão CHAT_PRAZO_S). Se o run não terminar
+    a tempo, retorna None e, com `ao_concluir_tarde`, marca conversa["resposta_pendente"]
+    e entrega o texto para ele quando o run terminar.
+    O run ocupa uma vaga do limitador (espera no máximo o que sobra do prazo); sem vaga,
+    levanta Sobrecarga.
+    """
+    if not obter_cliente():
         return None
     
-    config = get_equipamento_config(modulo)
+    config = config or get_equipamento_config(modulo)
     
     if not config or not config.get("assistant_id"):
         print(f"[AVISO] Equipamento {modulo} não tem assistente configurado")
@@ -198,40 +397,142 @@ def responder_com_assistants_api(pergunta: str, modulo: str) -> str:
     
     assistant_id = config["assistant_id"]
     nome_equipamento = config["nome_completo"]
+    conversa = conversa if conversa is not None else {}
+    
+    disjuntor = _disjuntor(config)
+    if not disjuntor.permitir():
+        print(f"[INFO] API de {nome_equipamento} fora do ar (disjuntor aberto), usando offline")
+        return None
+    inicio = time.monotonic()
+    prazo = inicio + (prazo_s or PRAZO_CHAT_S)
+    with metricas.etapa("limitador"):
+        try:
+            vaga = obter_limitador().vaga(espera_s=prazo - time.monotonic())
+        except Sobrecarga:
+            disjuntor.desistir()
+            raise
+    em_segundo_plano = False
     
     try:
         print(f"[INFO] Consultando assistente de {nome_equipamento}...")
         
-        thread = client.beta.threads.create()
+        thread_id = _preparar_thread(pergunta, conversa, prazo)
+        if time.monotonic() >= prazo:
+            raise PrazoEsgotado("prazo esgotado antes do run")
         
-        client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=pergunta
-        )
+        inicio_run = time.monotonic()
+        with metricas.etapa("run_fila"):
+            run = client.beta.threads.runs.create(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                truncation_strategy=TRUNCAMENTO_THREAD,
+                timeout=_timeout(prazo)
+            )
+        run = _aguardar_run(thread_id, run, prazo, vaga)
         
-        run = client.beta.threads.runs.create_and_poll(
-            thread_id=thread.id,
-            assistant_id=assistant_id,
-            timeout=30
-        )
+        if run.status in RUN_EM_ANDAMENTO:
+            print(f"[AVISO] Prazo de {prazo - inicio:.0f}s esgotado ({nome_equipamento}), run segue em segundo plano")
+            if ao_concluir_tarde:
+                conversa["resposta_pendente"] = True
+                _continuar_em_segundo_plano(thread_id, run, config, inicio, ao_concluir_tarde, conversa,
+                                            inicio_run, vaga)
+                em_segundo_plano = True
+            return None
         
+        # Run que falhou também gasta tokens
+        conversa["uso"] = _uso_do_run(run, config, thread_id, time.monotonic() - inicio_run)
         if run.status == "completed":
-            messages = client.beta.threads.messages.list(thread_id=thread.id)
-            for msg in messages.data:
-                if msg.role == "assistant":
-                    resposta = limpar_formatacao(msg.content[0].text.value)
-                    print(f"[OK] Resposta obtida do manual de {nome_equipamento}")
-                    return resposta
-        else:
-            print(f"[AVISO] Run status: {run.status}")
+            conversa["mensagens_thread"] = conversa.get("mensagens_thread", 0) + 1
+            disjuntor.sucesso(time.monotonic() - inicio)
+            resposta = _texto_do_run(thread_id, run, prazo, conversa["uso"])
+            if resposta:
+                print(f"[OK] Resposta obtida do manual de {nome_equipamento}")
+            return resposta
         
+        print(f"[AVISO] Run status: {run.status}")
+        disjuntor.falha(f"run {run.status}", time.monotonic() - inicio)
         return None
         
     except Exception as e:
+        disjuntor.falha(f"{type(e).__name__}: {e}", time.monotonic() - inicio)
         print(f"[ERRO] Assistants API ({nome_equipamento}): {str(e)[:300]}")
         traceback.print_exc()
         return None
+    finally:
+        if not em_segundo_plano:
+            vaga.liberar()
+
+
+def responder_com_assistants_api_stream(pergunta: str, modulo: str, conversa: dict = None, config: dict = None):
+    """
+    Versão em streaming: gera os trechos de texto conforme o assistente escreve.
+    A vaga do limitador vale até o stream terminar (ou o cliente desconectar)
+    """
+    if not obter_cliente():
+        return
+    
+    config = config or get_equipamento_config(modulo)
+    
+    if not config or not config.get("assistant_id"):
+        print(f"[AVISO] Equipamento {modulo} não tem assistente configurado")
+        return
+    
+    assistant_id = config["assistant_id"]
+    nome_equipamento = config["nome_completo"]
+    
+    conversa = conversa if conversa is not None else {}
+    
+    disjuntor = _disjuntor(config)
+    if not disjuntor.permitir():
+        print(f"[INFO] API de {nome_equipamento} fora do ar (disjuntor aberto), usando offline")
+        return
+    
+    print(f"[INFO] Consultando assistente de {nome_equipamento} (streaming)...")
+    
+    # Latência considerada = até o primeiro trecho (o resto depende do tamanho da resposta)
+    inicio = time.monotonic()
+    primeiro_trecho = None
+    with metricas.etapa("limitador"):
+        try:
+            vaga = obter_limitador().vaga()
+        except Sobrecarga:
+            disjuntor.desistir()
+            raise
+    try:
+        # O stream já mostra progresso ao cliente: o prazo vale só para preparar a thread
+        thread_id = _preparar_thread(pergunta, conversa, inicio + PRAZO_CHAT_S)
+        
+        inicio_run = time.monotonic()
+        with client.beta.threads.runs.stream(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            truncation_strategy=TRUNCAMENTO_THREAD
+        ) as stream:
+            for delta in stream.text_deltas:
+                if primeiro_trecho is None:
+                    primeiro_trecho = time.monotonic() - inicio
+                    metricas.somar("primeiro_trecho", time.monotonic() - inicio_run)
+                vaga.manter()
+                yield delta
+            run = stream.get_final_run()
+            try:
+                citacoes = sum(_citacoes(msg) for msg in stream.get_final_messages())
+            except Exception:
+                citacoes = 0
+        metricas.somar("run_execucao", time.monotonic() - inicio_run)
+        conversa["uso"] = _uso_do_run(run, config, thread_id, time.monotonic() - inicio_run, citacoes)
+    except Exception as e:
+        disjuntor.falha(f"{type(e).__name__}: {e}", time.monotonic() - inicio)
+        raise
+    finally:
+        vaga.liberar()
+    
+    if run.status == "completed":
+        conversa["mensagens_thread"] = conversa.get("mensagens_thread", 0) + 1
+        disjuntor.sucesso(primeiro_trecho if primeiro_trecho is not None else time.monotonic() - inicio)
+    else:
+        print(f"[AVISO] Run status: {run.status}")
+        disjuntor.falha(f"run {run.status}", time.monotonic() - inicio)
 
 
 # ============================ RESPOSTA OFFLINE (FALLBACK) ============================
@@ -252,31 +553,142 @@ RESPOSTAS_OFFLINE = {
     "selagem": "Problemas de Selagem:\n\n1. Verifique temperatura (125-135°C para maioria dos materiais)\n2. Confira pressão do ar e velocidade\n3. Inspecione fios de selagem (desgaste/oxidação)\n4. Se selagem irregular, recalibre o sistema",
 }
 
-def resposta_offline(pergunta: str, modulo: str) -> str:
+SAUDACOES = ["ola", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi"]
+
+# ============================ ROTEADOR DE INTENÇÕES ============================
+
+# Responder erros conhecidos direto da tabela local, sem chamar a API
+FAST_PATH_ERROS = os.getenv("FAST_PATH_ERROS", "0") == "1"
+# Mensagens maiores que isso provavelmente trazem contexto que só o assistente entende
+FAST_PATH_MAX_PALAVRAS = int(os.getenv("FAST_PATH_MAX_PALAVRAS", "6"))
+
+_ACENTOS = {"a": "aáàâã", "e": "eéê", "i": "ií", "o": "oóôõ", "u": "uú", "c": "cç"}
+
+
+def _padrao_sem_acento(palavra: str) -> str:
+    """'vedacao' -> 'v[eéê]d[aáàâã][cç]...' para casar com ou sem acento"""
+    partes = []
+    for ch in palavra:
+        if ch in _ACENTOS:
+            partes.append(f"[{_ACENTOS[ch]}]")
+        elif ch == " ":
+            partes.append(r"\s+")
+        else:
+            partes.append(re.escape(ch))
+    return "".join(partes)
+
+
+def _compilar_roteador():
+    """Uma única expressão com todas as intenções conhecidas, montada das tabelas acima"""
+    topicos = {"calibracao": ["calibra"], "selagem": PALAVRAS_SELAGEM}
+    # erro e9 / erro 9 / erro: E-09 / e9: o mesmo padrão da chave do cache
+    alternativas = [f"(?P<erro>{PADRAO_CODIGO_ERRO})"]
+    for chave in RESPOSTAS_OFFLINE:
+        if chave in topicos:
+            palavras = "|".join(_padrao_sem_acento(p) for p in topicos[chave])
+            alternativas.append(f"(?P<{chave}>\\b(?:{palavras})\\w*)")
+    saudacoes = "|".join(_padrao_sem_acento(p) for p in SAUDACOES)
+    alternativas.append(f"(?P<saudacao>\\b(?:{saudacoes})\\b)")
+    return re.compile("|".join(alternativas), re.IGNORECASE)
+
+
+_ROTEADOR = _compilar_roteador()
+_PRIORIDADE_INTENCOES = ["erro", "calibracao", "selagem", "saudacao"]
+
+
+def classificar_mensagem(pergunta: str) -> dict:
+    """
+    Classifica a mensagem numa passada só.
+    Retorna {"tipo", "chave", "confianca"}; tipo None quando nada conhecido aparece.
+    """
+    encontrados = set()
+    codigos = []
+    for m in _ROTEADOR.finditer(pergunta or ""):
+        tipo = m.lastgroup
+        if tipo == "erro":
+            codigo = f"e{int(m.group('num_erro') or m.group('num_e'))}"
+            if codigo not in codigos:
+                codigos.append(codigo)
+        encontrados.add(tipo)
+    
+    for tipo in _PRIORIDADE_INTENCOES:
+        if tipo not in encontrados:
+            continue
+        if tipo == "erro":
+            chave = codigos[0]
+            alta = (
+                len(codigos) == 1
+                and chave in RESPOSTAS_OFFLINE
+                and len((pergunta or "").split()) <= FAST_PATH_MAX_PALAVRAS
+            )
+            return {"tipo": "erro", "chave": chave, "confianca": "alta" if alta else "baixa"}
+        return {"tipo": tipo, "chave": tipo if tipo in RESPOSTAS_OFFLINE else None, "confianca": "baixa"}
+    
+    return {"tipo": None, "chave": None, "confianca": "baixa"}
+
+
+# Quantos trechos do manual a resposta offline mostra
+TRECHOS_OFFLINE = int(os.getenv("INDICE_TRECHOS_OFFLINE", "2"))
+
+
+def resposta_rapida(pergunta: str):
+    """Resposta local para códigos de erro claros (fast path); None se precisar do assistente"""
+    if not FAST_PATH_ERROS:
+        return None
+    intencao = classificar_mensagem(pergunta)
+    if intencao["tipo"] == "erro" and intencao["confianca"] == "alta":
+        print(f"[INFO] Fast path: {intencao['chave'].upper()} respondido pela tabela local")
+        return processar_videos(RESPOSTAS_OFFLINE[intencao["chave"]])
+    return None
+
+
+def _trechos_do_manual(pergunta: str, modulo: str) -> str:
+    """Trechos mais relevantes do manual (índice local BM25), já formatados; "" se nada"""
+    try:
+        trechos = buscar_trechos(pergunta, modulo, limite=TRECHOS_OFFLINE)
+    except Exception as e:
+        print(f"[AVISO] Busca nos manuais: {e}")
+        return ""
+    if not trechos:
+        return ""
+    partes = []
+    for t in trechos:
+        partes.append(f"• {resumo(t['texto'], pergunta)}\n  ({t['arquivo']}, p. {t['pagina']})")
+    return "\n\n".join(partes)
+
+
+@metricas.etapa("offline")
+def resposta_offline(pergunta: str, modulo: str, config: dict = None) -> str:
     """Resposta offline quando API não disponível"""
-    pergunta_lower = pergunta.lower()
-    config = get_equipamento_config(modulo)
+    config = config or get_equipamento_config(modulo)
     nome = config["nome_completo"] if config else modulo.upper()
     
-    # Detectar erros E1-E11
-    for i in range(1, 12):
-        codigo = f"e{i}"
-        if codigo in pergunta_lower or f"erro {i}" in pergunta_lower:
-            return RESPOSTAS_OFFLINE.get(codigo, f"Erro {codigo.upper()} detectado.\n\nLigue: {CONTATO_TELEFONE}")
+    intencao = classificar_mensagem(pergunta)
     
-    # Calibração
-    if "calibra" in pergunta_lower:
-        return RESPOSTAS_OFFLINE.get("calibracao")
-    
-    # Selagem
-    if any(palavra in pergunta_lower for palavra in PALAVRAS_SELAGEM):
-        return RESPOSTAS_OFFLINE.get("selagem")
+    # Erros E1-E11 (ou outro código citado), calibração e selagem
+    if intencao["tipo"] == "erro":
+        codigo = intencao["chave"]
+        if codigo in RESPOSTAS_OFFLINE:
+            return RESPOSTAS_OFFLINE[codigo]
+        trechos = _trechos_do_manual(f"erro {codigo} {pergunta}", modulo)
+        if trechos:
+            return f"Erro {codigo.upper()} - o que o manual diz:\n\n{trechos}\n\nLigue: {CONTATO_TELEFONE}"
+        return f"Erro {codigo.upper()} detectado.\n\nLigue: {CONTATO_TELEFONE}"
+    if intencao["tipo"] in ("calibracao", "selagem"):
+        return RESPOSTAS_OFFLINE.get(intencao["chave"])
     
     # Saudações
-    saudacoes = ["ola", "oi", "bom dia", "boa tarde", "boa noite", "hello", "hi"]
-    if any(s in pergunta_lower for s in saudacoes):
+    if intencao["tipo"] == "saudacao":
         return f"Olá! Sou o assistente técnico Storopack para {nome}.\n\nDescreva o problema ou erro que está aparecendo na máquina."
     
+    trechos = _trechos_do_manual(pergunta, modulo)
+    if trechos:
+        return (
+            f"Sem conexão com o assistente de {nome}. Trechos do manual que podem ajudar:\n\n"
+            f"{trechos}\n\n"
+            f"Se não resolver, ligue: {CONTATO_TELEFONE}"
+        )
+    
     return (
         f"Sistema offline para {nome}.\n\n"
         "Para suporte completo com acesso aos manuais, verifique:\n"
@@ -286,15 +698,98 @@ def resposta_offline(pergunta: str, modulo: str) -> str:
     )
 
 
+# ============================ CACHE DE RESPOSTAS ============================
+
+_cache_pronto = False
+
+
+def _cache_respostas():
+    """Cache compartilhado entre workers (None se desativado)"""
+    global _cache_pronto
+    if not CACHE_ATIVO:
+        return None
+    cache = obter_cache()
+    if not _cache_pronto:
+        # Descarta respostas de assistentes/vector stores que mudaram desde a última execução
+        removidas = cache.invalidar_versoes(versao_equipamento(c) for c in obter_registro().equipamentos.values())
+        if removidas:
+            print(f"[INFO] Cache: {removidas} respostas de configurações antigas removidas")
+        _cache_pronto = True
+    return cache
+
+
+def _primeira_mensagem(conversa) -> bool:
+    """
+    Nenhuma troca anterior no chamado (nem thread, nem resposta dada sem run): só aí a
+    resposta não depende do histórico
+    """
+    conversa = conversa or {}
+    return not conversa.get("thread_id") and not conversa.get("historico")
+
+
+def _pode_usar_cache(conversa) -> bool:
+    return CACHE_ATIVO and _primeira_mensagem(conversa)
+
+
+def _buscar_no_cache(config: dict, pergunta: str):
+    try:
+        resposta = _cache_respostas().obter(config["assistant_id"], versao_equipamento(config), pergunta)
+        if resposta:
+            print(f"[OK] Resposta do cache para {config['nome_completo']}")
+        return resposta
+    except Exception as e:
+        print(f"[AVISO] Cache indisponível: {e}")
+        return None
+
+
+def _guardar_no_cache(config: dict, pergunta: str, resposta: str):
+    try:
+        _cache_respostas().salvar(config["assistant_id"], versao_equipamento(config), pergunta, resposta)
+    except Exception as e:
+        print(f"[AVISO] Não foi possível gravar no cache: {e}")
+
+
+# Pergunta igual já em andamento no mesmo assistente: espera a resposta dela (coalescencia.py).
+# O stream não tem prazo, então o carona espera mais
+ESPERA_CARONA_S = PRAZO_CHAT_S + 2
+ESPERA_CARONA_STREAM_S = float(os.getenv("COALESCENCIA_ESPERA_STREAM_S", "45"))
+
+
+def _pode_coalescer(conversa, config: dict) -> bool:
+    """Mesma regra do cache: só a primeira mensagem do chamado não depende do histórico"""
+    return bool(config.get("assistant_id")) and _primeira_mensagem(conversa)
+
+
+def _entrar_no_voo(conversa, config: dict, pergunta: str, timeout: float):
+    """Participação no voo da pergunta (None quando a mensagem não pode coalescer)"""
+    if not _pode_coalescer(conversa, config):
+        return None
+    return obter_coalescedor().participar(chave_pergunta(config["assistant_id"], pergunta), timeout)
+
+
+def _pegar_carona(participacao, timeout: float, nome_equipamento: str):
+    """Espera a resposta do líder (None se ele falhar ou passar do prazo: responde offline)"""
+    resposta = participacao.aguardar(timeout)
+    if resposta:
+        print(f"[OK] Resposta compartilhada com pergunta igual em andamento ({nome_equipamento})")
+    return resposta
+
+
 # ============================ FUNÇÃO PRINCIPAL ============================
 
-def responder_cliente(pergunta: str, modulo: str = None, video_bytes=None, video_path=None, nome_cliente=None, telefone_cliente=None) -> str:
-    """Função principal que consulta o manual específico do equipamento"""
+def responder_cliente(pergunta: str, modulo: str = None, video_bytes=None, video_path=None, nome_cliente=None, telefone_cliente=None, conversa=None, config=None, ao_concluir_tarde=None) -> str:
+    """
+    Função principal que consulta o manual específico do equipamento.
+    `conversa` (thread_id/mensagens_thread do chamado) é atualizado in-place.
+    Com `ao_concluir_tarde`, uma consulta que passa do prazo devolve a resposta offline,
+    marca conversa["resposta_pendente"] e a resposta do manual vai para o callback depois.
+    """
     
     if nome_cliente or telefone_cliente:
         print(f"[INFO] Cliente: {nome_cliente} | Tel: {telefone_cliente}")
     
     pergunta = (pergunta or "").strip()
+    metricas.anotar(resultado="invalido")
     if not pergunta:
         saudacao = f"Oi{' ' + nome_cliente.split()[0] if nome_cliente else ''}!"
         return f"{saudacao}\n\nDescreva o problema do equipamento."
@@ -302,52 +797,234 @@ def responder_cliente(pergunta: str, modulo: str = None, video_bytes=None, video
     if not modulo:
         return "Por favor, selecione o equipamento no menu."
     
-    # Obter configuração do equipamento
-    config = get_equipamento_config(modulo)
+    # Obter configuração do equipamento (uma vez; vai junto para as funções abaixo)
+    if not config:
+        with metricas.etapa("equipamento"):
+            config = get_equipamento_config(modulo)
     if not config:
+        metricas.anotar(equipamento="desconhecido")
         return f"Equipamento '{modulo}' não reconhecido. Selecione um equipamento válido."
     
     nome_equipamento = config["nome_completo"]
+    metricas.anotar(equipamento=config.get("chave") or nome_equipamento)
     
     # Se OpenAI não disponível, usar offline
-    if not OPENAI_DISPONIVEL or not client:
+    if not OPENAI_DISPONIVEL or not obter_cliente():
         print("[INFO] Usando resposta offline (API indisponível)")
-        resposta = resposta_offline(pergunta, modulo)
+        metricas.anotar(resultado="offline")
+        resposta = resposta_offline(pergunta, modulo, config)
         return processar_videos(resposta)
     
+    # Código de erro claro: responde da tabela local, sem custo de API
+    resposta = resposta_rapida(pergunta)
+    if resposta:
+        metricas.anotar(resultado="rapida")
+        return resposta
+    
+    usar_cache = _pode_usar_cache(conversa) and config.get("assistant_id")
+    if usar_cache:
+        resposta = _buscar_no_cache(config, pergunta)
+        if resposta:
+            metricas.anotar(resultado="cache")
+            return resposta
+    
     try:
-        # Tentar Assistants API (com PDFs do equipamento)
-        texto = responder_com_assistants_api(pergunta, modulo)
+        tarde = None
+        if ao_concluir_tarde:
+            def tarde(texto):
+                if texto and usar_cache:
+                    _guardar_no_cache(config, pergunta, texto)
+                ao_concluir_tarde(texto)
+        
+        # Tentar Assistants API (com PDFs do equipamento); pergunta igual em andamento: carona
+        participacao = _entrar_no_voo(conversa, config, pergunta, ESPERA_CARONA_S)
+        carona = participacao is not None and not participacao.lider
+        texto = None
+        if carona:
+            texto = _pegar_carona(participacao, ESPERA_CARONA_S, nome_equipamento)
+        else:
+            try:
+                texto = responder_com_assistants_api(pergunta, modulo, conversa, config, ao_concluir_tarde=tarde)
+            finally:
+                if participacao:
+                    # Sem resposta (erro, prazo, sem vaga): os caronas respondem offline
+                    participacao.concluir(texto)
         
         # Se falhou, usar offline
         if not texto:
             print(f"[INFO] Assistente de {nome_equipamento} falhou, usando offline")
-            resposta = resposta_offline(pergunta, modulo)
+            metricas.anotar(resultado="prazo" if (conversa or {}).get("resposta_pendente") else "fallback")
+            resposta = resposta_offline(pergunta, modulo, config)
             return processar_videos(resposta)
         
-        # Processar marcadores de vídeo
-        texto = processar_videos(texto)
-        
-        # Injetar marcador de vídeo se a resposta da API fala sobre erro E1-E11 mas não tem o marcador
-        if '[SIM_VIDEO_E' not in texto:
-            texto_lower = texto.lower()
-            for i in range(11, 0, -1):
-                if f'erro e{i}' in texto_lower or f'e{i} ' in texto_lower or f'e{i}-' in texto_lower or f'e{i}:' in texto_lower:
-                    texto += f'\n\n[SIM_VIDEO_E{i}]'
-                    print(f"[INFO] Marcador [SIM_VIDEO_E{i}] injetado na resposta da API")
-                    break
+        if usar_cache and not carona:
+            _guardar_no_cache(config, pergunta, texto)
         
+        metricas.anotar(resultado="carona" if carona else "api")
         return texto
     
     except RateLimitError:
+        metricas.anotar(resultado="erro")
         return "Muitas requisições. Tente novamente em alguns segundos."
+    except Sobrecarga:
+        # Sem vaga para o run: o app responde 429 com Retry-After
+        metricas.anotar(resultado="recusado")
+        raise
     except Exception as e:
         print(f"[ERRO] {str(e)[:200]}")
         traceback.print_exc()
-        resposta = resposta_offline(pergunta, modulo)
+        metricas.anotar(resultado="fallback")
+        resposta = resposta_offline(pergunta, modulo, config)
         return processar_videos(resposta)
 
 
+def responder_cliente_stream(pergunta: str, modulo: str = None, nome_cliente=None, telefone_cliente=None, conversa=None):
+    """
+    Versão em streaming de responder_cliente.
+    Gera ("delta", trecho) conforme o texto chega e, no final, ("fim", resposta_completa).
+    """
+    pergunta = (pergunta or "").strip()
+    with metricas.etapa("equipamento"):
+        config = get_equipamento_config(modulo) if modulo else None
+    
+    # Sem pergunta, sem equipamento ou sem API: resposta pronta de uma vez
+    if not pergunta or not config or not OPENAI_DISPONIVEL or not obter_cliente():
+        resposta = responder_cliente(pergunta, modulo, nome_cliente=nome_cliente, telefone_cliente=telefone_cliente, config=config)
+        yield "delta", resposta
+        yield "fim", resposta
+        return
+    
+    nome_equipamento = config["nome_completo"]
+    metricas.anotar(equipamento=config.get("chave") or nome_equipamento)
+    resposta = resposta_rapida(pergunta)
+    if resposta:
+        metricas.anotar(resultado="rapida")
+    
+    usar_cache = _pode_usar_cache(conversa) and config.get("assistant_id")
+    if not resposta and usar_cache:
+        resposta = _buscar_no_cache(config, pergunta)
+        if resposta:
+            metricas.anotar(resultado="cache")
+    
+    participacao = None
+    if not resposta:
+        participacao = _entrar_no_voo(conversa, config, pergunta, ESPERA_CARONA_STREAM_S)
+        if participacao and not participacao.lider:
+            resposta = _pegar_carona(participacao, ESPERA_CARONA_STREAM_S, nome_equipamento)
+            metricas.anotar(resultado="carona" if resposta else "fallback")
+            if not resposta:
+                resposta = processar_videos(resposta_offline(pergunta, modulo, config))
+    
+    if resposta:
+        yield "delta", resposta
+        yield "fim", resposta
+        return
+    
+    try:
+        yield from _stream_do_manual(pergunta, modulo, conversa, config, usar_cache, participacao)
+    finally:
+        if participacao:
+            # Sem resposta (erro ou cliente desconectou): os caronas respondem offline
+            participacao.concluir(None)
+
+
+def _stream_do_manual(pergunta: str, modulo: str, conversa, config: dict, usar_cache, participacao):
+    """Parte do stream que consulta o assistente; entrega o texto final aos caronas"""
+    nome_equipamento = config["nome_completo"]
+    processador = PosProcessador()
+    enviado = []
+    interrompido = False
+    
+    try:
+        for delta in responder_com_assistants_api_stream(pergunta, modulo, conversa, config):
+            with metricas.etapa("pos_processamento"):
+                trecho = processador.alimentar(delta)
+            if trecho:
+                yield "delta", trecho
+                enviado.append(trecho)
+    except RateLimitError:
+        metricas.anotar(resultado="erro")
+        resposta = "Muitas requisições. Tente novamente em alguns segundos."
+        yield "fim", resposta
+        return
+    except Sobrecarga as e:
+        # O stream já começou: a recusa vai como resposta, não como 429
+        print(f"[AVISO] Stream recusado ({e.motivo}), retry em {e.retry_after}s")
+        metricas.anotar(resultado="recusado")
+        resposta = f"Muitas mensagens ao mesmo tempo. Aguarde {e.retry_after}s e tente novamente."
+        yield "delta", resposta
+        yield "fim", resposta
+        return
+    except Exception as e:
+        print(f"[ERRO] Streaming ({nome_equipamento}): {str(e)[:300]}")
+        traceback.print_exc()
+        interrompido = True
+    
+    with metricas.etapa("pos_processamento"):
+        final = processador.finalizar()
+    resposta = "".join(enviado) + final
+    # Interrompido no meio: o cliente ficou só com parte do texto
+    metricas.anotar(resultado="erro" if interrompido else "api")
+    if not resposta:
+        print(f"[INFO] Assistente de {nome_equipamento} falhou, usando offline")
+        metricas.anotar(resultado="fallback")
+        resposta = processar_videos(resposta_offline(pergunta, modulo, config))
+        yield "delta", resposta
+        yield "fim", resposta
+        return
+    
+    print(f"[OK] Resposta obtida do manual de {nome_equipamento}")
+    if not interrompido:
+        if usar_cache:
+            _guardar_no_cache(config, pergunta, resposta)
+        if participacao:
+            participacao.concluir(resposta)
+    if final:
+        yield "delta", final
+    yield "fim", resposta
+
+
+# ============================ AQUECIMENTO ============================
+
+_aquecimento = {"pronto": False, "iniciado": False, "duracao_s": None, "erro": None}
+_lock_aquecimento = threading.Lock()
+
+
+def aquecer():
+    """
+    Prepara em segundo plano o que o primeiro chat pagaria: cliente OpenAI (import do
+    openai/httpx) e cache de respostas. Idempotente.
+    """
+    with _lock_aquecimento:
+        if _aquecimento["iniciado"]:
+            return
+        _aquecimento["iniciado"] = True
+    
+    inicio = time.monotonic()
+    try:
+        mostrar_equipamentos()
+        obter_cliente()
+        if CACHE_ATIVO:
+            _cache_respostas()
+    except Exception as e:
+        _aquecimento["erro"] = str(e)
+        print(f"[ERRO] Aquecimento do assistente: {e}")
+        traceback.print_exc()
+    _aquecimento["duracao_s"] = round(time.monotonic() - inicio, 3)
+    _aquecimento["pronto"] = True
+    print(f"[OK] Assistente aquecido em {_aquecimento['duracao_s']}s")
+
+
+def estado_aquecimento() -> dict:
+    """Situação do aquecimento para o /ready"""
+    return {
+        "pronto": _aquecimento["pronto"],
+        "openai": "ok" if client is not None else ("pendente" if OPENAI_DISPONIVEL else "offline"),
+        "duracao_s": _aquecimento["duracao_s"],
+        "erro": _aquecimento["erro"],
+    }
+
+
 # ============================ TESTE ============================
 
 if __name__ == "__main__":
@@ -355,8 +1032,9 @@ if __name__ == "__main__":
     print("ASSISTENTE STOROPACK - SISTEMA MULTI-EQUIPAMENTO")
     print("="*60 + "\n")
     
+    mostrar_equipamentos()
     print(f"OpenAI disponível: {OPENAI_DISPONIVEL}")
-    print(f"Total de equipamentos: {len(EQUIPAMENTOS)}\n")
+    print(f"Total de equipamentos: {len(obter_registro().equipamentos)}\n")
     
     # Teste
     resposta = responder_cliente(
@@ -0,0 +1,140 @@
+"""
+Tempo de partida a frio do app.
+
+Roda `import app` em processos novos (como num cold start do Render) e mostra em quanto
+tempo o /health responde, quando o /ready fica pronto (assistente aquecido em segundo
+plano) e, numa rodada à parte com -X importtime, quanto cada módulo custa.
+
+    python benchmarks/bench_importacao.py [--repeticoes 5] [--top 15] [--limite-ms 800]
+
+Com --limite-ms o script sai com erro se a mediana do `import app` passar do limite,
+para pegar regressões (ex.: alguém voltou a importar o openai no topo de um módulo).
+Sem OPENAI_API_KEY no ambiente usa uma chave falsa, para o aquecimento criar o cliente
+como em produção (nenhuma chamada de rede é feita).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SONDA = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t_import = time.perf_counter() - t0
+cliente = app.app.test_client()
+cliente.get('/health')
+t_health = time.perf_counter() - t0
+while cliente.get('/ready').status_code == 503 and time.perf_counter() - t0 < 60:
+    time.sleep(0.005)
+t_ready = time.perf_counter() - t0
+print('@@BENCH ' + json.dumps({'import': t_import, 'health': t_health, 'ready': t_ready}))
+"""
+
+# O -X importtime não separa imports de threads diferentes: para medir cada módulo o
+# aquecimento roda no mesmo thread, depois do import
+SONDA_MODULOS = """
+import app, assistente
+assistente.aquecer()
+"""
+
+
+def modulos_do_projeto():
+    return {nome[:-3] for nome in os.listdir(RAIZ) if nome.endswith(".py")}
+
+
+def ler_importtime(stderr):
+    """Linhas do -X importtime -> [(nome, proprio_us, acumulado_us)]"""
+    modulos = []
+    for linha in stderr.splitlines():
+        if not linha.startswith("import time:") or "imported package" in linha:
+            continue
+        proprio, acumulado, nome = linha[len("import time:"):].split("|", 2)
+        modulos.append((nome.strip(), int(proprio), int(acumulado)))
+    return modulos
+
+
+def rodar(codigo, *opcoes, **ambiente_extra):
+    ambiente = dict(os.environ)
+    ambiente.setdefault("OPENAI_API_KEY", "sk-bench-" + "0" * 40)
+    ambiente.update(ambiente_extra)
+    proc = subprocess.run(
+        [sys.executable, *opcoes, "-c", codigo],
+        cwd=RAIZ, env=ambiente, capture_output=True, text=True, timeout=120
+    )
+    if proc.returncode != 0:
+        print(proc.stdout[-2000:])
+        print(proc.stderr[-2000:])
+        raise SystemExit("[ERRO] A sonda falhou")
+    return proc
+
+
+def medir_partida():
+    inicio = time.perf_counter()
+    proc = rodar(SONDA)
+    total = time.perf_counter() - inicio
+    marcador = [l for l in proc.stdout.splitlines() if l.startswith("@@BENCH ")]
+    if not marcador:
+        raise SystemExit("[ERRO] A sonda não informou os tempos")
+    tempos = json.loads(marcador[0][len("@@BENCH "):])
+    tempos["processo"] = total
+    return tempos
+
+
+def medir_modulos():
+    return ler_importtime(rodar(SONDA_MODULOS, "-X", "importtime", AQUECIMENTO="0").stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="módulos mais caros a listar")
+    parser.add_argument("--limite-ms", type=float, default=None, help="falha se o import app passar disso")
+    args = parser.parse_args()
+
+    partidas = [medir_partida() for _ in range(args.repeticoes)]
+    execucoes = [medir_modulos() for _ in range(args.repeticoes)]
+    projeto = modulos_do_projeto()
+
+    # Mediana por módulo (acumulado = o módulo e tudo que ele importou pela primeira vez;
+    # o aquecimento aparece como os imports feitos fora do app, ex.: openai)
+    acumulados = {}
+    proprios = {}
+    for modulos in execucoes:
+        for nome, proprio, acumulado in modulos:
+            acumulados.setdefault(nome, []).append(acumulado)
+            proprios.setdefault(nome, []).append(proprio)
+    mediana_ms = lambda valores: statistics.median(valores) / 1000
+
+    print(f"{args.repeticoes} processo(s) novo(s), mediana em ms\n")
+    for etapa, descricao in (("import", "import app"), ("health", "/health respondeu"),
+                             ("ready", "/ready pronto"), ("processo", "processo inteiro")):
+        print(f"  {descricao:<22} {statistics.median(t[etapa] for t in partidas) * 1000:>8.1f}")
+
+    print(f"\n  {'Módulos do projeto':<26} {'próprio':>8} {'acumulado':>10}")
+    print("-" * 46)
+    for nome in sorted(projeto & acumulados.keys(), key=lambda n: -mediana_ms(acumulados[n])):
+        print(f"  {nome:<26} {mediana_ms(proprios[nome]):>8.1f} {mediana_ms(acumulados[nome]):>10.1f}")
+
+    print(f"\n  {'Módulos mais caros':<26} {'próprio':>8} {'acumulado':>10}")
+    print("-" * 46)
+    caros = sorted(acumulados, key=lambda n: -mediana_ms(acumulados[n]))[:args.top]
+    for nome in caros:
+        print(f"  {nome[:26]:<26} {mediana_ms(proprios[nome]):>8.1f} {mediana_ms(acumulados[nome]):>10.1f}")
+
+    if args.limite_ms is not None:
+        mediana_import = statistics.median(t["import"] for t in partidas) * 1000
+        if mediana_import > args.limite_ms:
+            print(f"\n[ERRO] import app levou {mediana_import:.0f}ms (limite {args.limite_ms:.0f}ms)")
+            sys.exit(1)
+        print(f"\n[OK] import app dentro do limite de {args.limite_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
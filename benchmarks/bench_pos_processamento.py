@@ -0,0 +1,209 @@
+"""
+Micro-benchmark do pós-processamento das respostas.
+
+Compara o pipeline antigo (limpar_formatacao -> processar_videos -> loop de injeção do
+marcador) com pos_processamento.PosProcessador, de uma vez e em trechos como no streaming,
+e confere que a saída é idêntica byte a byte.
+
+    python benchmarks/bench_pos_processamento.py [--repeticoes 2000]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from assistente import limpar_formatacao, processar_videos
+from pos_processamento import PosProcessador, pos_processar
+
+
+# Respostas no formato devolvido pelo assistente (markdown + citações do File Search)
+RESPOSTA_ERRO = """### Erro E9 - Calibração fora do limite
+
+O **erro E9** indica que o valor medido durante a calibração ficou fora da faixa aceita pelo sistema de selagem【4:0†manual_airmove2.pdf】. Na prática, isso quase sempre está ligado ao estado dos fios de selagem ou às conexões do conjunto.
+
+#### Possíveis causas
+
+1. **Fios de selagem desgastados**: com o uso, o fio perde seção e a resistência sobe. Valores acima de 5200 indicam desgaste avançado【4:1†manual_airmove2.pdf】.
+2. **Conexões soltas**: terminais oxidados ou mal apertados geram leituras instáveis.
+3. **Teflon danificado**: a fita de teflon queimada altera a transferência de calor e a leitura.
+4. **Resistência fora da faixa**: o ideal é entre 2800 e 5200.
+
+
+
+#### Como resolver
+
+- Desligue a máquina e aguarde o resfriamento completo da barra de selagem (pelo menos 10 minutos).
+- Abra a tampa lateral e verifique se os terminais dos fios estão firmes.
+- Limpe os contatos com álcool isopropílico.
+- Rode a calibração novamente pelo menu `Configurações > Calibrar`.
+- Se o valor continuar alto, substitua os fios de selagem conforme o procedimento da seção 7.3【4:2†manual_airmove2.pdf】.
+
+> **Atenção:** durante a calibração os botões do painel não têm efeito. Apenas parar ou desligar a máquina interrompe o processo.
+
+Se depois da troca dos fios o erro E9 persistir, o problema pode estar na placa de controle. Nesse caso, abra um chamado com o técnico informando o valor exibido na última calibração.
+
+[VIDEO_E9]
+"""
+
+RESPOSTA_SELAGEM = """Entendi, a selagem está saindo **irregular**. Vamos por partes:
+
+## 1. Temperatura
+
+Para a maioria dos filmes a temperatura ideal fica entre **125 °C e 135 °C**【7:0†manual_paperplus.pdf】. Abaixo disso a solda fica fraca e as almofadas abrem; acima disso o filme derrete e fura.
+
+* Filme de 20 µm: comece em 125 °C
+* Filme de 25 µm: comece em 130 °C
+* Filme reciclado: pode precisar de até 140 °C
+
+## 2. Pressão do ar e velocidade
+
+Confira se a pressão está no valor recomendado para o tipo de almofada【7:1†manual_paperplus.pdf】. Velocidade alta com temperatura baixa é a combinação que mais causa selagem aberta.
+
+```
+Velocidade   Temperatura mínima
+  10 m/min        125 °C
+  15 m/min        130 °C
+  20 m/min        135 °C
+```
+
+## 3. Fios de selagem
+
+Inspecione os fios: pontos escuros, oxidação ou deformação indicam que é hora de trocar. Depois da troca é **obrigatório** recalibrar (se aparecer erro e9: repita a calibração com a máquina fria).
+
+## 4. Recalibração
+
+Se nada disso resolver, recalibre o sistema. Se aparecer o erro E11 durante o uso, verifique também a estabilidade da rede elétrica, porque flutuações de tensão afetam a temperatura da barra.
+
+[VIDEO_SELAGEM]
+"""
+
+RESPOSTAS = {
+    "erro_e9": RESPOSTA_ERRO,
+    "selagem": RESPOSTA_SELAGEM,
+    "longa": "\n\n".join([RESPOSTA_ERRO, RESPOSTA_SELAGEM] * 3),
+}
+
+
+def injetar_antigo(texto):
+    """Loop de injeção como era em responder_cliente"""
+    if '[SIM_VIDEO_E' not in texto:
+        texto_lower = texto.lower()
+        for i in range(11, 0, -1):
+            if f'erro e{i}' in texto_lower or f'e{i} ' in texto_lower or f'e{i}-' in texto_lower or f'e{i}:' in texto_lower:
+                texto += f'\n\n[SIM_VIDEO_E{i}]'
+                break
+    return texto
+
+
+def pipeline_antigo(texto):
+    return injetar_antigo(processar_videos(limpar_formatacao(texto)))
+
+
+def trecho_estavel_antigo(bruto):
+    """Como o streaming antigo decidia até onde limpar o buffer"""
+    corte = len(bruto)
+    abre = bruto.rfind('\u3010')
+    if abre != -1 and '\u3011' not in bruto[abre:] and '\n' not in bruto[abre:]:
+        corte = abre
+    colchete = bruto.rfind('[', 0, corte)
+    if colchete != -1 and ']' not in bruto[colchete:corte]:
+        corte = colchete
+    while corte > 0 and bruto[corte - 1] in '`*':
+        corte -= 1
+    return bruto[:corte]
+
+
+def em_trechos_antigo(texto, tamanhos):
+    """Streaming antigo: limpa o buffer inteiro de novo a cada trecho"""
+    bruto = ""
+    enviado = ""
+    pos = 0
+    for tam in tamanhos:
+        bruto += texto[pos:pos + tam]
+        pos += tam
+        limpo = processar_videos(limpar_formatacao(trecho_estavel_antigo(bruto)))
+        if len(limpo) > len(enviado) and limpo.startswith(enviado):
+            enviado = limpo
+    return pipeline_antigo(bruto)
+
+
+def em_trechos(texto, tamanhos):
+    processador = PosProcessador()
+    saida = []
+    pos = 0
+    for tam in tamanhos:
+        saida.append(processador.alimentar(texto[pos:pos + tam]))
+        pos += tam
+    saida.append(processador.finalizar())
+    return "".join(saida)
+
+
+def tamanhos_de_trecho(texto, semente=0):
+    """Trechos de 1 a 12 caracteres, parecidos com os text_deltas da API"""
+    rnd = random.Random(semente)
+    tamanhos = []
+    resto = len(texto)
+    while resto > 0:
+        tam = min(resto, rnd.randint(1, 12))
+        tamanhos.append(tam)
+        resto -= tam
+    return tamanhos
+
+
+def medir(funcao, n):
+    """Melhor tempo por chamada, em µs"""
+    return min(timeit.repeat(funcao, number=n, repeat=5)) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=2000)
+    args = parser.parse_args()
+
+    divergencias = 0
+    print(f"{'':<10} {'':>6} {'--- resposta inteira (µs) ---':>30} {'------ streaming (µs) ------':>30}")
+    print(f"{'resposta':<10} {'bytes':>6} {'antigo':>10} {'novo':>10} {'ganho':>7} {'antigo':>10} {'novo':>10} {'ganho':>7}")
+    print("-" * 78)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultados = []
+        for nome, texto in RESPOSTAS.items():
+            esperado = pipeline_antigo(texto)
+            tamanhos = tamanhos_de_trecho(texto)
+            for modo, obtido in (("uma vez", pos_processar(texto)), ("streaming", em_trechos(texto, tamanhos))):
+                if obtido.encode("utf-8") != esperado.encode("utf-8"):
+                    divergencias += 1
+                    resultados.append(f"[ERRO] {nome} ({modo}): saída diferente do pipeline antigo")
+
+            n = args.repeticoes
+            n_stream = max(1, n // 50)
+            antigo = medir(lambda: pipeline_antigo(texto), n)
+            novo = medir(lambda: pos_processar(texto), n)
+            stream_antigo = medir(lambda: em_trechos_antigo(texto, tamanhos), n_stream)
+            stream_novo = medir(lambda: em_trechos(texto, tamanhos), n_stream)
+            resultados.append(
+                f"{nome:<10} {len(texto.encode('utf-8')):>6} {antigo:>10.1f} {novo:>10.1f} {antigo / novo:>6.1f}x"
+                f" {stream_antigo:>10.1f} {stream_novo:>10.1f} {stream_antigo / stream_novo:>6.1f}x"
+            )
+
+    for linha in resultados:
+        print(linha)
+
+    print()
+    print("(streaming = mesmo texto em trechos de 1-12 caracteres; o antigo limpava o buffer")
+    print(" inteiro a cada trecho)")
+    if divergencias:
+        print(f"\n[ERRO] {divergencias} divergência(s) encontradas")
+        sys.exit(1)
+    print("\n[OK] Saídas idênticas ao pipeline antigo")
+
+
+if __name__ == "__main__":
+    main()
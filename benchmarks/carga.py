@@ -0,0 +1,450 @@
+"""
+Teste de carga de ponta a ponta: gunicorn + simulador do OpenAI + sessões de clientes.
+
+Sobe o app com gunicorn numa cópia da árvore (o banco do teste não mistura com data/),
+aponta o assistente para benchmarks/simulador_openai.py e roda usuários virtuais que
+seguem o roteiro de um chamado:
+
+    /chat (primeira mensagem) -> /salvar-localizacao -> /chat (0 a 2 seguimentos) -> /feedback
+
+Em paralelo, admins consultam /admin/stats, /admin/chamados e /admin/chamado/<id>.
+Mostra vazão e p50/p95/p99 por endpoint e por etapa do roteiro e grava tudo em JSON
+(com a configuração de workers/threads usada).
+
+    python benchmarks/carga.py [--ref HEAD] [--usuarios 10] [--admins 1] [--duracao 30]
+        [--workers 2] [--threads 4] [--saida resultado.json]
+
+    # Mesma carga em dois commits, com a diferença lado a lado
+    python benchmarks/carga.py --comparar main HEAD [--tolerancia 0.15]
+
+    # Só comparar resultados já gravados
+    python benchmarks/carga.py --comparar-json antes.json depois.json
+
+--ref aceita qualquer referência do git (a árvore é extraída com git archive) ou
+"atual" para a árvore de trabalho com as mudanças não commitadas. Com --url a carga vai
+para um servidor já no ar e nada é iniciado. Com --tolerancia o script sai com erro se
+o p95 de algum endpoint piorar ou a vazão cair mais que essa fração. Com --banco o app
+sobe com uma cópia desse banco (ex.: gerado por benchmarks/gerar_dados.py) em vez de vazio.
+"""
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULADOR = os.path.join(RAIZ, "benchmarks", "simulador_openai.py")
+
+MODULOS = ["airplus", "airmove_2", "airmove1", "foamplus", "paperplus_classic", "paper_track"]
+# Variáveis dos assistentes (equipamentos.json nas versões novas, fixas nas antigas)
+VARIAVEIS_ASSISTENTE = [
+    "ASSISTANT_AIRPLUS_MINI", "VECTOR_AIRPLUS_MINI", "ASSISTANT_AIRMOVE_2", "VECTOR_AIRMOVE_2",
+    "ASSISTANT_FOAMPLUS_BAG", "VECTOR_FOAMPLUS_BAG", "ASSISTANT_PAPERPLUS_CLASSIC",
+    "VECTOR_PAPERPLUS_CLASSIC", "ASSISTANT_PAPERPLUS_TRACK", "VECTOR_PAPERPLUS_TRACK",
+]
+PRIMEIRAS = [
+    "A máquina não liga", "Erro E3 no display", "O filme está rasgando na selagem",
+    "As almofadas saem murchas", "Como faço a calibração?", "Está aparecendo erro 9",
+    "A esteira parou de puxar o papel", "Barulho estranho no motor", "Bom dia, preciso de ajuda",
+    "A selagem não está fechando", "Luz vermelha piscando", "O papel está enroscando",
+]
+SEGUIMENTOS = [
+    "Já fiz isso e continua", "Onde fica esse sensor?", "E se não resolver?",
+    "Qual a temperatura certa?", "Ok, vou tentar", "Precisa desligar da tomada?",
+]
+IGNORAR_NA_COPIA = shutil.ignore_patterns(".git", "data", "temp", "logs", "uploads", "__pycache__", "*.pyc")
+
+
+# ============================ AMBIENTE ============================
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def extrair_arvore(ref, destino):
+    """Cópia da árvore do ref (ou da árvore de trabalho, com ref 'atual')"""
+    if ref == "atual":
+        shutil.copytree(RAIZ, destino, ignore=IGNORAR_NA_COPIA, dirs_exist_ok=True)
+        return "atual"
+    commit = subprocess.run(["git", "rev-parse", "--short", ref], cwd=RAIZ, check=True,
+                            capture_output=True, text=True).stdout.strip()
+    arquivo = subprocess.run(["git", "archive", "--format=tar", commit], cwd=RAIZ, check=True,
+                             capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(arquivo)) as tar:
+        tar.extractall(destino)
+    return commit
+
+
+def esperar_http(url, timeout=60):
+    partes = urlsplit(url)
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            conn = http.client.HTTPConnection(partes.hostname, partes.port, timeout=2)
+            conn.request("GET", partes.path or "/")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"[ERRO] {url} não respondeu em {timeout}s")
+
+
+class Servidores:
+    """Simulador do OpenAI + gunicorn numa cópia do ref, encerrados no fim"""
+
+    def __init__(self, ref, args):
+        self.args = args
+        self.pasta = tempfile.mkdtemp(prefix="carga_")
+        self.versao = extrair_arvore(ref, self.pasta)
+        if args.banco:
+            # Banco pré-populado (ex.: benchmarks/gerar_dados.py) no lugar do vazio
+            os.makedirs(os.path.join(self.pasta, "data"), exist_ok=True)
+            shutil.copyfile(args.banco, os.path.join(self.pasta, "data", "storopack.db"))
+        self.processos = []
+        self.url = None
+        self.simulador = {
+            "run_mediana_s": args.run_mediana_s, "run_sigma": args.run_sigma,
+            "primeiro_token_s": args.primeiro_token_s, "falhas": args.falhas, "taxa_429": args.taxa_429,
+        }
+
+    def __enter__(self):
+        porta_sim = porta_livre()
+        comando_sim = [sys.executable, SIMULADOR, "--porta", str(porta_sim), "--semente", str(self.args.semente)]
+        for nome, valor in self.simulador.items():
+            comando_sim += ["--" + nome.replace("_", "-"), str(valor)]
+        self._iniciar(comando_sim, os.path.dirname(SIMULADOR), dict(os.environ))
+        esperar_http(f"http://127.0.0.1:{porta_sim}/_simulador/estatisticas")
+
+        porta = porta_livre()
+        ambiente = dict(os.environ)
+        ambiente.update({
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{porta_sim}/v1",
+            "OPENAI_API_KEY": "sk-carga-" + "0" * 40,
+            "GEMINI_API_KEY": "",
+            "LIMITADOR": "1" if self.args.com_limitador else "0",
+        })
+        ambiente.update({nome: "asst_carga" if nome.startswith("ASSISTANT") else "vs_carga"
+                         for nome in VARIAVEIS_ASSISTENTE})
+        ambiente.update(dict(item.split("=", 1) for item in self.args.env))
+        self._iniciar(["gunicorn", "app:app", "-b", f"127.0.0.1:{porta}", "-w", str(self.args.workers),
+                       "--threads", str(self.args.threads), "-k", "gthread", "--timeout", "120",
+                       "--log-level", "warning"], self.pasta, ambiente)
+        self.url = f"http://127.0.0.1:{porta}"
+        esperar_http(self.url + "/health")
+        return self
+
+    def _iniciar(self, comando, pasta, ambiente):
+        log = open(os.path.join(self.pasta, f"processo_{len(self.processos)}.log"), "w")
+        self.processos.append(subprocess.Popen(comando, cwd=pasta, env=ambiente, stdout=log,
+                                               stderr=subprocess.STDOUT, start_new_session=True))
+
+    def __exit__(self, *erro):
+        for proc in reversed(self.processos):
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+                proc.wait(timeout=20)
+            except Exception:
+                proc.kill()
+        if erro[0] is None:
+            shutil.rmtree(self.pasta, ignore_errors=True)
+        else:
+            print(f"[INFO] Logs dos processos em {self.pasta}")
+
+
+# ============================ CARGA ============================
+
+class Cliente:
+    """Conexão keep-alive de um usuário virtual; registra cada request"""
+
+    def __init__(self, url, registros, fase, fim):
+        partes = urlsplit(url)
+        self.host, self.porta = partes.hostname, partes.port
+        self.registros = registros
+        self.fase = fase
+        self.fim = fim
+        self.conn = None
+
+    def _enviar(self, metodo, caminho, corpo):
+        cabecalhos = {"Content-Type": "application/json"} if corpo is not None else {}
+        # Conexão parada pode ter sido fechada pelo keep-alive do gunicorn: tenta de novo numa nova
+        for tentativa in (1, 2):
+            reaproveitada = self.conn is not None
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.porta, timeout=120)
+            try:
+                self.conn.request(metodo, caminho, body=json.dumps(corpo) if corpo is not None else None,
+                                  headers=cabecalhos)
+                resposta = self.conn.getresponse()
+                return resposta.status, resposta.read()
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if not reaproveitada or tentativa == 2:
+                    return 0, b""
+
+    def chamar(self, metodo, caminho, endpoint, etapa, corpo=None):
+        # Passou do fim: o roteiro para sem abrir requests novos
+        if time.monotonic() >= self.fim:
+            return None, {}
+        fase = self.fase[0]
+        inicio = time.perf_counter()
+        status, dados = self._enviar(metodo, caminho, corpo)
+        duracao = time.perf_counter() - inicio
+        self.registros.append((fase, endpoint, etapa, status, duracao))
+        try:
+            return status, json.loads(dados) if dados else {}
+        except ValueError:
+            return status, {}
+
+
+def sessao_cliente(cliente, rng, pensar):
+    session_id = f"carga-{rng.getrandbits(48):012x}"
+    modulo = rng.choice(MODULOS)
+    status, dados = cliente.chamar("POST", "/chat", "/chat", "chat_primeira", {
+        "mensagem": rng.choice(PRIMEIRAS), "modulo": modulo, "session_id": session_id,
+    })
+    chamado_id = dados.get("chamado_id")
+    if status != 200 or not chamado_id:
+        return None
+    pensar()
+    cliente.chamar("POST", "/salvar-localizacao", "/salvar-localizacao", "localizacao", {
+        "chamado_id": chamado_id,
+        "latitude": -23.5 + rng.uniform(-1.5, 1.5), "longitude": -46.6 + rng.uniform(-1.5, 1.5),
+    })
+    for _ in range(rng.choice((0, 1, 1, 2))):
+        pensar()
+        cliente.chamar("POST", "/chat", "/chat", "chat_seguimento", {
+            "mensagem": rng.choice(SEGUIMENTOS), "modulo": modulo,
+            "session_id": session_id, "chamado_id": chamado_id,
+        })
+    if rng.random() < 0.7:
+        pensar()
+        cliente.chamar("POST", "/feedback", "/feedback", "feedback", {
+            "chamado_id": chamado_id, "resolvido": rng.random() < 0.7,
+            "comentario": rng.choice(["", "", "Resolveu, obrigado", "Não resolveu"]),
+        })
+    return chamado_id
+
+
+def sessao_admin(cliente, rng, pensar, chamados):
+    cliente.chamar("GET", "/admin/stats", "/admin/stats", "admin")
+    pensar()
+    cliente.chamar("GET", "/admin/chamados?per_page=20", "/admin/chamados", "admin")
+    if chamados:
+        pensar()
+        chamado_id = rng.choice(chamados[-200:])
+        cliente.chamar("GET", f"/admin/chamado/{chamado_id}", "/admin/chamado/<id>", "admin")
+
+
+def rodar_carga(url, args):
+    """Aquecimento + medição; devolve os registros da medição e a janela em segundos"""
+    registros = []
+    chamados = []
+    fase = ["aquecimento"]
+    fim = time.monotonic() + args.aquecimento + args.duracao
+
+    def usuario(indice, admin):
+        rng = random.Random(args.semente * 1000 + indice)
+        cliente = Cliente(url, registros, fase, fim)
+        pensar_s = args.pensar_ms / 1000 * (5 if admin else 1)
+        pensar = lambda: time.sleep(rng.expovariate(1 / pensar_s)) if pensar_s > 0 else None
+        while time.monotonic() < fim:
+            if admin:
+                sessao_admin(cliente, rng, pensar, chamados)
+            else:
+                chamado_id = sessao_cliente(cliente, rng, pensar)
+                if chamado_id:
+                    chamados.append(chamado_id)
+            pensar()
+
+    threads = [threading.Thread(target=usuario, args=(i, i >= args.usuarios), daemon=True)
+               for i in range(args.usuarios + args.admins)]
+    for t in threads:
+        t.start()
+    time.sleep(args.aquecimento)
+    fase[0] = "medicao"
+    for t in threads:
+        t.join()
+    # Vazão sobre a janela de medição (requests que começaram nela, mesmo terminando depois)
+    return [r[1:] for r in registros if r[0] == "medicao"], args.duracao
+
+
+# ============================ RELATÓRIO ============================
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def resumir(duracoes, status, janela_s):
+    ordenados = sorted(duracoes)
+    ms = lambda v: round(v * 1000, 1) if v is not None else None
+    return {
+        "requests": len(ordenados),
+        "por_segundo": round(len(ordenados) / janela_s, 2) if janela_s else 0,
+        "erros": sum(1 for s in status if s == 0 or s >= 500),
+        "recusados_429": sum(1 for s in status if s == 429),
+        "p50_ms": ms(percentil(ordenados, 50)),
+        "p95_ms": ms(percentil(ordenados, 95)),
+        "p99_ms": ms(percentil(ordenados, 99)),
+        "media_ms": ms(sum(ordenados) / len(ordenados)) if ordenados else None,
+    }
+
+
+def agrupar(registros, indice, janela_s):
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(registro[indice], []).append(registro)
+    return {nome: resumir([r[3] for r in itens], [r[2] for r in itens], janela_s)
+            for nome, itens in sorted(grupos.items())}
+
+
+def medir(ref, args):
+    configuracao = {
+        "usuarios": args.usuarios, "admins": args.admins, "duracao_s": args.duracao,
+        "aquecimento_s": args.aquecimento, "pensar_ms": args.pensar_ms, "semente": args.semente,
+        "limitador": args.com_limitador, "env": args.env, "banco": args.banco,
+    }
+    if args.url:
+        print(f"[INFO] Carga em {args.url} ({args.usuarios} usuários, {args.admins} admin(s), {args.duracao}s)")
+        registros, janela = rodar_carga(args.url, args)
+        versao = None
+        configuracao.update({"url": args.url, "workers": None, "threads": None})
+    else:
+        with Servidores(ref, args) as servidores:
+            print(f"[INFO] {ref} ({servidores.versao}): gunicorn {args.workers} worker(s) x {args.threads} "
+                  f"thread(s), {args.usuarios} usuários, {args.admins} admin(s), {args.duracao}s")
+            registros, janela = rodar_carga(servidores.url, args)
+            versao = servidores.versao
+            configuracao.update({"workers": args.workers, "threads": args.threads, "worker_class": "gthread",
+                                 "simulador": servidores.simulador})
+    return {
+        "ref": ref,
+        "versao": versao,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "configuracao": configuracao,
+        "janela_s": round(janela, 2),
+        "total": resumir([r[3] for r in registros], [r[2] for r in registros], janela),
+        "endpoints": agrupar(registros, 0, janela),
+        "etapas": agrupar(registros, 1, janela),
+    }
+
+
+def imprimir(resultado):
+    print(f"\n{resultado['ref']} ({resultado['versao']}), janela de {resultado['janela_s']}s")
+    cabecalho = f"  {'':<24} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>6} {'429':>5}"
+    for titulo in ("endpoints", "etapas"):
+        print(f"\n{cabecalho.replace(' ' * 24, titulo.capitalize().ljust(24), 1)}")
+        print("-" * len(cabecalho))
+        for nome, r in list(resultado[titulo].items()) + [("TOTAL", resultado["total"])]:
+            print(f"  {nome:<24} {r['por_segundo']:>7.2f} {r['p50_ms'] or 0:>9.1f} {r['p95_ms'] or 0:>9.1f} "
+                  f"{r['p99_ms'] or 0:>9.1f} {r['erros']:>6} {r['recusados_429']:>5}")
+
+
+def comparar(base, nova, tolerancia=None):
+    """Tabela antes/depois por endpoint; retorna as regressões acima da tolerância"""
+    print(f"\nComparação: {base['ref']} ({base['versao']}) -> {nova['ref']} ({nova['versao']})")
+    print(f"  {'Endpoint':<24} {'req/s':>25} {'p50 ms':>25} {'p95 ms':>25}")
+    print("-" * 104)
+    variacao = lambda a, b: (b - a) / a if a else 0.0
+    regressoes = []
+    for nome in sorted(set(base["endpoints"]) | set(nova["endpoints"])) + ["TOTAL"]:
+        a = base["total"] if nome == "TOTAL" else base["endpoints"].get(nome)
+        b = nova["total"] if nome == "TOTAL" else nova["endpoints"].get(nome)
+        if not a or not b:
+            print(f"  {nome:<24} (só em um dos lados)")
+            continue
+        linha = f"  {nome:<24}"
+        for campo in ("por_segundo", "p50_ms", "p95_ms"):
+            va, vb = a[campo] or 0, b[campo] or 0
+            linha += f" {va:>8.1f} -> {vb:<8.1f}{variacao(va, vb):>+6.0%}"
+        print(linha)
+        if tolerancia is not None:
+            if variacao(a["p95_ms"] or 0, b["p95_ms"] or 0) > tolerancia:
+                regressoes.append(f"{nome}: p95 {a['p95_ms']} -> {b['p95_ms']} ms")
+            if variacao(a["por_segundo"], b["por_segundo"]) < -tolerancia:
+                regressoes.append(f"{nome}: vazão {a['por_segundo']} -> {b['por_segundo']} req/s")
+    return regressoes
+
+
+def gravar(dados, caminho):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    print(f"\n[OK] Resultado gravado em {caminho}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ref", default="atual", help="commit/branch/tag ou 'atual' (árvore de trabalho)")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "NOVA"))
+    parser.add_argument("--comparar-json", nargs=2, metavar=("BASE.json", "NOVA.json"))
+    parser.add_argument("--url", help="servidor já no ar (não inicia gunicorn nem simulador)")
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--duracao", type=float, default=30)
+    parser.add_argument("--aquecimento", type=float, default=5)
+    parser.add_argument("--pensar-ms", type=float, default=300, help="pausa média entre passos do roteiro")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--run-mediana-s", type=float, default=2.0)
+    parser.add_argument("--run-sigma", type=float, default=0.4)
+    parser.add_argument("--primeiro-token-s", type=float, default=0.6)
+    parser.add_argument("--falhas", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0)
+    parser.add_argument("--com-limitador", action="store_true", help="mantém o controle de admissão ligado")
+    parser.add_argument("--env", action="append", default=[], metavar="NOME=VALOR",
+                        help="variável extra para o app (pode repetir)")
+    parser.add_argument("--banco", help="cópia deste banco vira o data/storopack.db do app testado")
+    parser.add_argument("--tolerancia", type=float, default=None)
+    parser.add_argument("--saida", default=None)
+    args = parser.parse_args()
+
+    if args.comparar_json:
+        with open(args.comparar_json[0], encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.comparar_json[1], encoding="utf-8") as f:
+            nova = json.load(f)
+    elif args.comparar:
+        base, nova = medir(args.comparar[0], args), medir(args.comparar[1], args)
+        for resultado in (base, nova):
+            imprimir(resultado)
+        if args.saida:
+            gravar({"base": base, "nova": nova}, args.saida)
+    else:
+        resultado = medir(args.ref, args)
+        imprimir(resultado)
+        if args.saida:
+            gravar(resultado, args.saida)
+        return
+
+    regressoes = comparar(base, nova, args.tolerancia)
+    if regressoes:
+        print("\n[ERRO] Regressões acima da tolerância:")
+        for r in regressoes:
+            print(f"  - {r}")
+        sys.exit(1)
+    if args.tolerancia is not None:
+        print(f"\n[OK] Nenhuma regressão acima de {args.tolerancia:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""
+Gerador de dados sintéticos para testar o banco em escala (milhões de linhas).
+
+Preenche chamados, mensagens, contatos, localizacoes e logs — as tabelas que existirem
+no schema escolhido:
+
+    app        schema do app.init_db (ids inteiros; chamados, mensagens, contatos)
+    database   schema do database.Database (ids de 8 hex; chamados, mensagens,
+               localizacoes, logs)
+
+As distribuições imitam o uso real: poucos módulos concentram a maioria dos chamados,
+o volume cresce ao longo do período e cai no fim de semana e de madrugada, chamados
+antigos quase sempre estão encerrados e as coordenadas se concentram na Grande São
+Paulo (com cidades industriais do Sudeste/Sul e alguns chamados sem localização).
+
+    python benchmarks/gerar_dados.py [--banco data/sintetico.db] [--schema app]
+        [--chamados 1000000] [--mensagens-por-chamado 4] [--contatos 0.6]
+        [--localizacoes 0.8] [--logs-por-chamado 1.5] [--dias 365] [--semente 42]
+        [--lote 50000] [--substituir]
+
+A carga é feita em lotes grandes sem os triggers de estatisticas.py e sem os índices
+secundários; no fim os índices são recriados, os contadores reconstruídos (e conferidos
+com --verificar) e o ANALYZE atualiza as estatísticas do planejador. Rodar de novo no
+mesmo banco acrescenta dados; --substituir começa do zero.
+
+Para usar o banco no teste de carga: python benchmarks/carga.py --banco data/sintetico.db
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import estatisticas  # noqa: E402
+import geo  # noqa: E402
+
+STOROPACK_LAT = -23.67376
+STOROPACK_LNG = -46.69436
+
+# ============================ DISTRIBUIÇÕES ============================
+
+# Ids do frontend (index.html) com peso aproximado de uso
+MODULOS = {
+    "airplus_void": 18, "airplus_cushion": 10, "airplus_wrap": 6, "airplus_bubble": 5,
+    "airmove2_cushion": 9, "airmove2_void": 7, "airmove2_bubble": 3, "airmove2_wrap": 2,
+    "airmove1_cushion": 5, "airmove1_void": 3,
+    "paper_track": 6, "paper_classic": 4, "paper_cx": 3, "paper_papillon": 2, "paper_shooter": 2,
+    "paper_chevron": 1, "foam_bagpacker": 2, "foam_handpacker": 1,
+}
+
+# (cidade, lat, lon, desvio em graus, peso, DDD)
+CIDADES = [
+    ("São Paulo", -23.5505, -46.6333, 0.12, 34, "11"),
+    ("Guarulhos", -23.4538, -46.5333, 0.05, 6, "11"),
+    ("São Bernardo do Campo", -23.6914, -46.5646, 0.05, 5, "11"),
+    ("Diadema", -23.6861, -46.6228, 0.03, 3, "11"),
+    ("Barueri", -23.5057, -46.8790, 0.04, 5, "11"),
+    ("Osasco", -23.5329, -46.7917, 0.03, 3, "11"),
+    ("Cajamar", -23.3556, -46.8769, 0.04, 3, "11"),
+    ("Jundiaí", -23.1857, -46.8978, 0.05, 4, "11"),
+    ("Campinas", -22.9099, -47.0626, 0.08, 7, "19"),
+    ("Sorocaba", -23.5015, -47.4526, 0.06, 4, "15"),
+    ("São José dos Campos", -23.1791, -45.8872, 0.06, 4, "12"),
+    ("Santos", -23.9608, -46.3336, 0.04, 2, "13"),
+    ("Ribeirão Preto", -21.1775, -47.8103, 0.05, 2, "16"),
+    ("Curitiba", -25.4284, -49.2733, 0.08, 4, "41"),
+    ("Joinville", -26.3045, -48.8487, 0.05, 2, "47"),
+    ("Rio de Janeiro", -22.9068, -43.1729, 0.12, 5, "21"),
+    ("Belo Horizonte", -19.9167, -43.9345, 0.08, 3, "31"),
+    ("Manaus", -3.1190, -60.0217, 0.06, 1, "92"),
+]
+
+# Fração dos chamados sem GPS (cliente negou a localização)
+SEM_LOCALIZACAO = 0.15
+
+# Status por idade do chamado; "resolvido_tecnico" só existe no schema do database.py
+STATUS_RECENTES = {"aberto": 55, "resolvido": 25, "nao_resolvido": 6, "pendente_tecnico": 12,
+                   "resolvido_tecnico": 2}
+STATUS_ANTIGOS = {"aberto": 22, "resolvido": 52, "nao_resolvido": 11, "pendente_tecnico": 4,
+                  "resolvido_tecnico": 11}
+DIAS_RECENTE = 7
+
+# Volume por hora do dia (horário comercial, pico de manhã e no meio da tarde)
+HORAS = [1, 1, 1, 1, 1, 2, 4, 8, 14, 18, 17, 14, 10, 13, 16, 16, 14, 10, 6, 4, 3, 2, 2, 1]
+# Segunda a domingo
+DIAS_SEMANA = [1.0, 1.0, 0.95, 0.95, 0.85, 0.35, 0.15]
+# Volume no fim do período em relação ao início (crescimento exponencial)
+CRESCIMENTO = 3.0
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Eduardo", "Fernanda", "Gabriel", "Helena", "Igor",
+         "Juliana", "Karina", "Lucas", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sandra",
+         "Thiago", "Vanessa", "Wagner", "José", "Maria", "Antônio", "Francisco", "Adriana"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira",
+              "Lima", "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes"]
+
+PERGUNTAS = [
+    "A máquina não liga", "Apareceu o erro E3 no painel", "O filme está rasgando",
+    "A esteira parou de puxar o papel", "Barulho estranho no motor", "Bom dia, preciso de ajuda",
+    "A selagem não está fechando", "Luz vermelha piscando", "O papel está enroscando",
+    "As almofadas estão saindo murchas", "Como troco a bobina?", "Qual a temperatura de selagem?",
+    "O sensor de filme não detecta", "Erro E7 depois de trocar o rolo", "A faca não corta o papel",
+]
+SEGUIMENTOS = [
+    "Já fiz isso e continua", "Onde fica esse sensor?", "E se não resolver?",
+    "Qual a temperatura certa?", "Ok, vou tentar", "Precisa desligar da tomada?",
+    "Funcionou, obrigado!", "Continua com o mesmo erro", "Pode chamar um técnico?",
+]
+RESPOSTAS = [
+    "Vamos verificar primeiro a alimentação: confira se o cabo está bem conectado e se o "
+    "disjuntor do painel traseiro está ligado. Depois, pressione o botão verde por 3 segundos.",
+    "O erro indica falha no sensor de filme. Desligue o equipamento, abra a tampa frontal, "
+    "limpe o sensor com um pano seco e confirme que o filme passa entre as duas guias. "
+    "[SIM_VIDEO_E3]",
+    "A temperatura de selagem recomendada fica entre 150 e 170 °C para o filme padrão. "
+    "Se as almofadas estiverem murchas, aumente 5 °C por vez e teste com 10 unidades.",
+    "Verifique se a bobina está encaixada até o fim do eixo e se o papel passa por baixo do "
+    "rolo tensionador. Um papel fora da guia costuma enroscar logo na entrada.",
+    "Entendi. Nesse caso o melhor é acionar a assistência técnica: o problema parece ser no "
+    "motor de tração e precisa de uma peça de reposição.",
+    "Ótimo! Qualquer outra dúvida é só chamar. Lembre de limpar os sensores semanalmente.",
+]
+COMENTARIOS = ["", "", "", "Resolveu rápido", "Não entendi a explicação", "Precisei do técnico",
+               "Muito bom o atendimento", "A máquina voltou a funcionar"]
+
+# ============================ GERAÇÃO ============================
+
+
+def _distancia_km(lat, lon):
+    """Haversine até a Storopack (mesma conta do app.calcular_distancia)"""
+    dlat = math.radians(STOROPACK_LAT - lat)
+    dlon = math.radians(STOROPACK_LNG - lon)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat)) * math.cos(math.radians(STOROPACK_LAT)) * math.sin(dlon / 2) ** 2)
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def _acumulados(pesos):
+    total, saida = 0, []
+    for peso in pesos:
+        total += peso
+        saida.append(total)
+    return saida
+
+
+def _id_embaralhado(n, bits):
+    """Bijeção de n em [0, 2**bits): ids únicos sem precisar conferir colisão"""
+    return (n * 0x9E3779B1 + 0x7F4A7C15) % (1 << bits)
+
+
+class Gerador:
+    """Monta as linhas de um lote de chamados (e das tabelas que dependem deles)."""
+
+    def __init__(self, args, colunas):
+        self.args = args
+        self.colunas = colunas
+        self.rnd = random.Random(args.semente)
+        self.schema_database = "cidade" in colunas["chamados"]
+
+        self.modulos = list(MODULOS)
+        self.pesos_modulos = _acumulados(MODULOS.values())
+        self.pesos_cidades = _acumulados(c[4] for c in CIDADES)
+        self.pesos_horas = _acumulados(HORAS)
+        status = [s for s in STATUS_RECENTES if self.schema_database or s != "resolvido_tecnico"]
+        self.status = status
+        self.pesos_recentes = _acumulados(STATUS_RECENTES[s] for s in status)
+        self.pesos_antigos = _acumulados(STATUS_ANTIGOS[s] for s in status)
+
+        # Dias do período (do mais antigo ao de hoje) com o peso de cada um
+        hoje = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.dias = [hoje - timedelta(days=args.dias - 1 - i) for i in range(args.dias)]
+        self.prefixos = [d.strftime("%Y-%m-%d ") for d in self.dias]
+        self.pesos_dias = _acumulados(
+            CRESCIMENTO ** (i / max(args.dias - 1, 1)) * DIAS_SEMANA[d.weekday()]
+            for i, d in enumerate(self.dias))
+
+    def _momento(self, dia, segundos):
+        """Texto 'AAAA-MM-DD HH:MM:SS' a partir de um dia do período e segundos desde 0h"""
+        extra, segundos = divmod(int(segundos), 86400)
+        dia += extra
+        if dia >= len(self.dias):
+            dia, segundos = len(self.dias) - 1, 86399
+        h, resto = divmod(segundos, 3600)
+        return f"{self.prefixos[dia]}{h:02d}:{resto // 60:02d}:{resto % 60:02d}"
+
+    def _mensagens(self, chamado_id, dia, inicio, status):
+        """(linhas, segundos até a última mensagem)"""
+        rnd = self.rnd
+        media_pares = max(self.args.mensagens_por_chamado / 2, 1)
+        pares = 1
+        while pares < 50 and rnd.random() > 1 / media_pares:
+            pares += 1
+        linhas, t = [], inicio
+        for i in range(pares):
+            pergunta = rnd.choice(PERGUNTAS) if i == 0 else rnd.choice(SEGUIMENTOS)
+            linhas.append((chamado_id, "user", pergunta, self._momento(dia, t)))
+            t += rnd.randint(3, 25)
+            if i == pares - 1 and status == "aberto" and rnd.random() < 0.1:
+                break       # cliente desistiu antes da resposta
+            linhas.append((chamado_id, "assistant", rnd.choice(RESPOSTAS), self._momento(dia, t)))
+            t += rnd.randint(20, 240)
+        return linhas, t - inicio
+
+    def lote(self, primeiro, quantidade):
+        """Linhas de cada tabela para os chamados primeiro .. primeiro+quantidade-1"""
+        rnd, args = self.rnd, self.args
+        idade_recente = len(self.dias) - DIAS_RECENTE
+        tabelas = {"chamados": [], "mensagens": [], "contatos": [], "localizacoes": [], "logs": []}
+
+        for n in range(primeiro, primeiro + quantidade):
+            dia = rnd.choices(range(len(self.dias)), cum_weights=self.pesos_dias)[0]
+            hora = rnd.choices(range(24), cum_weights=self.pesos_horas)[0]
+            inicio = hora * 3600 + rnd.randrange(3600)
+            modulo = rnd.choices(self.modulos, cum_weights=self.pesos_modulos)[0]
+            pesos_status = self.pesos_recentes if dia >= idade_recente else self.pesos_antigos
+            status = rnd.choices(self.status, cum_weights=pesos_status)[0]
+
+            cidade, lat, lon, desvio, _, ddd = rnd.choices(CIDADES, cum_weights=self.pesos_cidades)[0]
+            if rnd.random() < SEM_LOCALIZACAO:
+                lat = lon = distancia = geohash = None
+            else:
+                lat, lon = round(rnd.gauss(lat, desvio), 6), round(rnd.gauss(lon, desvio), 6)
+                distancia = round(_distancia_km(lat, lon), 2)
+                geohash = geo.codificar(lat, lon)
+
+            session_id = f"sess_{_id_embaralhado(n, 40):010x}"
+            nome = f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+            telefone = f"({ddd}) 9{rnd.randrange(10000):04d}-{rnd.randrange(10000):04d}"
+            chamado_id = f"{_id_embaralhado(n, 32):08x}" if self.schema_database else n
+            thread_id = f"thread_{_id_embaralhado(n, 48):012x}"
+
+            mensagens, duracao = self._mensagens(chamado_id, dia, inicio, status)
+            tabelas["mensagens"].extend(mensagens)
+            criado_em = self._momento(dia, inicio)
+            encerrado = status != "aberto" and status != "pendente_tecnico"
+            # Feedback/técnico chegam depois da conversa
+            fim = inicio + duracao + (rnd.randint(60, 3 * 86400) if status != "aberto" else 0)
+            atualizado_em = self._momento(dia, fim)
+
+            if self.schema_database:
+                tecnico = status in ("pendente_tecnico", "resolvido_tecnico")
+                tabelas["chamados"].append((
+                    chamado_id, session_id, nome, telefone, modulo,
+                    cidade if lat is not None or rnd.random() < 0.5 else "",
+                    f"{distancia:.0f} km" if distancia is not None else "",
+                    status, int(status == "resolvido"), int(status == "resolvido_tecnico"),
+                    rnd.choice(COMENTARIOS) if status in ("resolvido", "nao_resolvido") else "",
+                    int(tecnico), "Troca do sensor de filme" if status == "resolvido_tecnico" else "",
+                    thread_id, len(mensagens), len(mensagens), criado_em, atualizado_em,
+                    atualizado_em if encerrado else None,
+                ))
+                if lat is not None and rnd.random() < args.localizacoes:
+                    tabelas["localizacoes"].append((session_id, lat, lon, self._momento(dia, inicio + 5)))
+                tabelas["logs"].extend(self._logs(chamado_id, modulo, cidade, status, criado_em,
+                                                  atualizado_em, session_id, lat is not None))
+            else:
+                tabelas["chamados"].append((
+                    chamado_id, session_id, nome, telefone, modulo, status, lat, lon, distancia, geohash,
+                    thread_id, len(mensagens), len(mensagens), criado_em, atualizado_em,
+                ))
+                if rnd.random() < args.contatos:
+                    tabelas["contatos"].append((session_id, nome, telefone, criado_em))
+        return tabelas
+
+    def _logs(self, chamado_id, modulo, cidade, status, criado_em, atualizado_em, session_id, com_gps):
+        """Logs do database.py para um chamado, na média de --logs-por-chamado"""
+        rnd = self.rnd
+        candidatos = [("chamado_criado", f"Chamado {chamado_id} criado",
+                       {"modulo": modulo, "cidade": cidade}, criado_em)]
+        if com_gps:
+            candidatos.append(("info", f"Localizacao salva para session {session_id}", {}, criado_em))
+        if status in ("resolvido", "nao_resolvido"):
+            resolvido = status == "resolvido"
+            candidatos.append(("feedback", f"Chamado {chamado_id}: {'resolvido' if resolvido else 'nao resolvido'}",
+                               {"chamado_id": chamado_id, "resolvido": resolvido, "comentario": ""}, atualizado_em))
+        if status in ("pendente_tecnico", "resolvido_tecnico"):
+            candidatos.append(("tecnico_acionado", f"Tecnico acionado para chamado {chamado_id}",
+                               {"chamado_id": chamado_id}, atualizado_em))
+        if status == "resolvido_tecnico":
+            candidatos.append(("tecnico_resolveu", f"Tecnico resolveu chamado {chamado_id}",
+                               {"chamado_id": chamado_id, "observacao": ""}, atualizado_em))
+        if rnd.random() < 0.02:
+            candidatos.append(("erro", "Erro ao salvar localizacao: database is locked", {}, criado_em))
+        # Cada log entra com a mesma chance, para a média bater com o pedido
+        chance = min(self.args.logs_por_chamado / 2.2, 1.0)
+        return [(tipo, mensagem, json.dumps(dados, ensure_ascii=False), momento)
+                for tipo, mensagem, dados, momento in candidatos if rnd.random() < chance]
+
+
+# ============================ BANCO ============================
+
+INSERTS = {
+    "app": {
+        "chamados": """INSERT INTO chamados (id, session_id, nome_cliente, telefone_cliente, modulo, status,
+                           latitude, longitude, distancia_km, geohash, thread_id, mensagens_thread, total_msgs,
+                           criado_em, atualizado_em)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        "mensagens": "INSERT INTO mensagens (chamado_id, tipo, conteudo, criado_em) VALUES (?, ?, ?, ?)",
+        "contatos": "INSERT OR IGNORE INTO contatos (session_id, nome, telefone, criado_em) VALUES (?, ?, ?, ?)",
+    },
+    "database": {
+        "chamados": """INSERT INTO chamados (id, session_id, nome_cliente, telefone_cliente, modulo, cidade,
+                           distancia_estimada, status, resolvido_bot, resolvido_tecnico, feedback_comentario,
+                           tecnico_acionado, tecnico_observacao, thread_id, mensagens_thread, total_msgs,
+                           criado_em, atualizado_em, encerrado_em)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        "mensagens": "INSERT INTO mensagens (chamado_id, remetente, conteudo, criado_em) VALUES (?, ?, ?, ?)",
+        "localizacoes": "INSERT INTO localizacoes (session_id, latitude, longitude, criado_em) VALUES (?, ?, ?, ?)",
+        "logs": "INSERT INTO logs (tipo, mensagem, dados, criado_em) VALUES (?, ?, ?, ?)",
+    },
+}
+
+
+def criar_schema(banco, schema):
+    """Cria as tabelas com o próprio código do app (mesmos índices, migrações e triggers)"""
+    if schema == "database":
+        from database import Database
+        Database(banco)
+        return
+    # O import do app já roda o init_db no DB_PATH
+    os.environ.setdefault("AQUECIMENTO", "0")
+    os.environ["DB_PATH"] = banco
+    import app  # noqa: F401
+
+
+def _colunas(conn, tabela):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")]
+
+
+def _remover_indices(conn, tabelas):
+    """Apaga os índices secundários (recriados no fim, de uma vez) e devolve o SQL deles"""
+    marcas = ",".join("?" * len(tabelas))
+    indices = conn.execute(f"""SELECT name, sql FROM sqlite_master
+                               WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({marcas})""",
+                           tabelas).fetchall()
+    for nome, _ in indices:
+        conn.execute(f"DROP INDEX {nome}")
+    return [sql for _, sql in indices]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banco", default=os.path.join(RAIZ, "data", "sintetico.db"))
+    parser.add_argument("--schema", choices=("app", "database"), default="app")
+    parser.add_argument("--chamados", type=int, default=1_000_000)
+    parser.add_argument("--mensagens-por-chamado", type=float, default=4, help="média")
+    parser.add_argument("--contatos", type=float, default=0.6, help="fração dos chamados (schema app)")
+    parser.add_argument("--localizacoes", type=float, default=0.8,
+                        help="fração dos chamados com GPS (schema database)")
+    parser.add_argument("--logs-por-chamado", type=float, default=1.5, help="média (schema database)")
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--lote", type=int, default=50_000, help="chamados por transação")
+    parser.add_argument("--substituir", action="store_true", help="apaga o banco antes")
+    parser.add_argument("--verificar", action="store_true", help="confere os contadores no fim (lento)")
+    args = parser.parse_args()
+
+    banco = os.path.abspath(args.banco)
+    if args.substituir:
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(banco + sufixo):
+                os.remove(banco + sufixo)
+    os.makedirs(os.path.dirname(banco), exist_ok=True)
+    criar_schema(banco, args.schema)
+
+    conn = sqlite3.connect(banco, isolation_level=None)
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-262144")       # 256 MB
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+    existentes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    inserts = {t: sql for t, sql in INSERTS[args.schema].items() if t in existentes}
+    colunas = {t: _colunas(conn, t) for t in inserts}
+    gerador = Gerador(args, colunas)
+
+    if args.schema == "app":
+        primeiro = (conn.execute("SELECT MAX(id) FROM chamados").fetchone()[0] or 0) + 1
+    else:
+        primeiro = conn.execute("SELECT COUNT(*) FROM chamados").fetchone()[0] + 1
+    print(f"[INFO] {banco} (schema {args.schema}): {args.chamados} chamados a partir do nº {primeiro}")
+
+    inicio = time.perf_counter()
+    conn.execute("BEGIN")
+    for nome in estatisticas.TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    indices = _remover_indices(conn, list(inserts))
+    conn.execute("COMMIT")
+
+    totais = dict.fromkeys(inserts, 0)
+    feitos = 0
+    while feitos < args.chamados:
+        quantidade = min(args.lote, args.chamados - feitos)
+        linhas = gerador.lote(primeiro + feitos, quantidade)
+        conn.execute("BEGIN")
+        for tabela, sql in inserts.items():
+            conn.executemany(sql, linhas[tabela])
+            totais[tabela] += len(linhas[tabela])
+        conn.execute("COMMIT")
+        feitos += quantidade
+        decorrido = time.perf_counter() - inicio
+        print(f"[INFO] {feitos}/{args.chamados} chamados, {sum(totais.values())} linhas "
+              f"({sum(totais.values()) / decorrido * 60 / 1e6:.2f} mi linhas/min)")
+    carga = time.perf_counter() - inicio
+
+    print(f"[INFO] Recriando {len(indices)} índice(s), triggers e contadores...")
+    conn.execute("BEGIN")
+    for sql in indices:
+        conn.execute(sql)
+    conn.execute("COMMIT")
+    conn.isolation_level = ""
+    estatisticas.instalar(conn)
+    estatisticas.reconstruir(conn)
+    conn.isolation_level = None
+    conn.execute("ANALYZE")
+    total = time.perf_counter() - inicio
+
+    for tabela, quantidade in totais.items():
+        print(f"[OK] {tabela}: +{quantidade}")
+    linhas = sum(totais.values())
+    print(f"[OK] {linhas} linhas em {total:.1f}s (carga {carga:.1f}s, "
+          f"{linhas / carga * 60 / 1e6:.2f} mi linhas/min; índices e contadores {total - carga:.1f}s)")
+
+    if args.verificar:
+        divergencias = estatisticas.verificar(conn)
+        for linha in divergencias[:20]:
+            print(f"[ERRO] {linha}")
+        if divergencias:
+            raise SystemExit(f"[ERRO] {len(divergencias)} contador(es) divergente(s)")
+        print("[OK] Contadores conferem com as tabelas")
+
+
+if __name__ == "__main__":
+    main()
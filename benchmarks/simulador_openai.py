@@ -0,0 +1,330 @@
+"""
+Simulador local da Assistants API do OpenAI, para testar latência e carga sem gastar.
+
+Implementa só o que o assistente.py usa: threads, mensagens, runs (com polling e com
+stream SSE) e os passos do run (uma busca no File Search por run concluído). Os runs demoram segundo uma distribuição log-normal configurável, podem
+falhar ou receber 429, e respondem textos fixos por assistant_id.
+
+    python benchmarks/simulador_openai.py [--porta 8765] [--run-mediana-s 3] [--run-sigma 0.5]
+        [--primeiro-token-s 0.8] [--api-ms 40] [--falhas 0.02] [--taxa-429 0.01]
+        [--respostas respostas.json] [--semente 42]
+
+Para o app usar o simulador:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 ASSISTANT_AIRMOVE_2=asst_teste python app.py
+
+O --respostas é um JSON {"asst_teste": "texto" ou ["texto 1", "texto 2"], "*": "padrão"}.
+Com --semente as latências, falhas e respostas saem na mesma sequência a cada rodada.
+A configuração pode ser trocada com o simulador no ar (POST /_simulador/config com o
+mesmo nome dos parâmetros, ex. {"falhas": 0.5}) e GET /_simulador/estatisticas mostra
+o que ele recebeu.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+config = {
+    "run_mediana_s": 3.0,       # duração total do run
+    "run_sigma": 0.5,           # dispersão da log-normal (0 = sempre a mediana)
+    "primeiro_token_s": 0.8,    # stream: espera até o primeiro trecho
+    "api_ms": 40.0,             # demais chamadas (threads, mensagens, retrieve)
+    "falhas": 0.0,              # fração dos runs que terminam em "failed"
+    "taxa_429": 0.0,            # fração das requisições que recebem 429
+    "retry_after_s": 1,
+}
+respostas = {"*": "Resposta simulada do manual para o assistente {assistant_id}. "
+                  "Verifique o sensor de filme e a temperatura de selagem."}
+
+_lock = threading.Lock()
+_aleatorio = random.Random()
+_threads = {}       # thread_id -> [mensagens]
+_runs = {}          # run_id -> dict
+_contadores = {"requisicoes": 0, "erros_429": 0, "runs": 0, "runs_stream": 0, "runs_falhos": 0}
+
+
+def _id(prefixo):
+    return f"{prefixo}_{uuid.uuid4().hex[:24]}"
+
+
+def _sortear(func, *args):
+    with _lock:
+        return func(*args)
+
+
+def _duracao_run():
+    mediana, sigma = config["run_mediana_s"], config["run_sigma"]
+    if sigma <= 0:
+        return mediana
+    return _sortear(_aleatorio.lognormvariate, math.log(mediana), sigma)
+
+
+def _texto_para(assistant_id):
+    texto = respostas.get(assistant_id, respostas.get("*", ""))
+    if isinstance(texto, list):
+        texto = _sortear(_aleatorio.choice, texto)
+    return texto.format(assistant_id=assistant_id)
+
+
+def _mensagem(thread_id, role, texto, run_id=None, assistant_id=None):
+    return {
+        "id": _id("msg"), "object": "thread.message", "created_at": int(time.time()),
+        "thread_id": thread_id, "role": role, "status": "completed",
+        "content": [{"type": "text", "text": {"value": texto, "annotations": []}}],
+        "run_id": run_id, "assistant_id": assistant_id, "attachments": [], "metadata": {},
+    }
+
+
+def _conteudo(dado):
+    """content pode vir como texto ou lista de blocos"""
+    if isinstance(dado, list):
+        return "".join(b.get("text", "") for b in dado if isinstance(b, dict))
+    return dado or ""
+
+
+def _erro(status, mensagem, tipo="invalid_request_error"):
+    return jsonify({"error": {"message": mensagem, "type": tipo, "code": None}}), status
+
+
+def _objeto_run(run):
+    """Estado do run no momento (anda sozinho conforme o tempo passa)"""
+    agora = time.time()
+    if run["status"] in ("queued", "in_progress"):
+        if agora >= run["termina_em"]:
+            if run["falha"]:
+                run["status"] = "failed"
+            else:
+                run["status"] = "completed"
+                _threads[run["thread_id"]].append(
+                    _mensagem(run["thread_id"], "assistant", run["texto"], run["id"], run["assistant_id"]))
+        elif agora >= run["criado_em"] + min(0.2, run["duracao"] / 10):
+            run["status"] = "in_progress"
+    terminado = run["status"] in ("completed", "failed")
+    return {
+        "id": run["id"], "object": "thread.run", "created_at": int(run["criado_em"]),
+        "started_at": int(run["criado_em"] + min(0.2, run["duracao"] / 10)) if run["status"] != "queued" else None,
+        "completed_at": int(run["termina_em"]) if run["status"] == "completed" else None,
+        "failed_at": int(run["termina_em"]) if run["status"] == "failed" else None,
+        "thread_id": run["thread_id"], "assistant_id": run["assistant_id"], "status": run["status"],
+        "last_error": {"code": "server_error", "message": "falha simulada"} if run["status"] == "failed" else None,
+        "model": "simulador", "instructions": "", "tools": [], "metadata": {},
+        "usage": {"prompt_tokens": 800, "completion_tokens": len(run["texto"].split()) * 2,
+                  "total_tokens": 800 + len(run["texto"].split()) * 2} if terminado else None,
+    }
+
+
+@app.before_request
+def antes():
+    if request.path.startswith("/_simulador"):
+        return None
+    with _lock:
+        _contadores["requisicoes"] += 1
+    if _sortear(_aleatorio.random) < config["taxa_429"]:
+        with _lock:
+            _contadores["erros_429"] += 1
+        resposta, status = _erro(429, "Rate limit simulado", "rate_limit_exceeded")
+        resposta.headers["Retry-After"] = str(config["retry_after_s"])
+        return resposta, status
+    # Stream tem a própria espera (primeiro token)
+    if not (request.is_json and (request.get_json(silent=True) or {}).get("stream")):
+        time.sleep(_sortear(_aleatorio.lognormvariate, math.log(max(config["api_ms"], 0.1) / 1000), 0.3))
+    return None
+
+
+@app.post("/v1/threads")
+def criar_thread():
+    dados = request.get_json(silent=True) or {}
+    thread_id = _id("thread")
+    mensagens = [_mensagem(thread_id, m.get("role", "user"), _conteudo(m.get("content")))
+                 for m in dados.get("messages") or []]
+    with _lock:
+        _threads[thread_id] = mensagens
+    return jsonify({"id": thread_id, "object": "thread", "created_at": int(time.time()),
+                    "metadata": {}, "tool_resources": {}})
+
+
+@app.post("/v1/threads/<thread_id>/messages")
+def criar_mensagem(thread_id):
+    if thread_id not in _threads:
+        return _erro(404, f"No thread found with id '{thread_id}'.")
+    dados = request.get_json(silent=True) or {}
+    mensagem = _mensagem(thread_id, dados.get("role", "user"), _conteudo(dados.get("content")))
+    with _lock:
+        _threads[thread_id].append(mensagem)
+    return jsonify(mensagem)
+
+
+@app.get("/v1/threads/<thread_id>/messages")
+def listar_mensagens(thread_id):
+    if thread_id not in _threads:
+        return _erro(404, f"No thread found with id '{thread_id}'.")
+    with _lock:
+        for run_id in [r["id"] for r in _runs.values() if r["thread_id"] == thread_id]:
+            _objeto_run(_runs[run_id])
+        mensagens = list(_threads[thread_id])
+    run_id = request.args.get("run_id")
+    if run_id:
+        mensagens = [m for m in mensagens if m["run_id"] == run_id]
+    if request.args.get("order", "desc") == "desc":
+        mensagens.reverse()
+    mensagens = mensagens[:int(request.args.get("limit", 20))]
+    return jsonify({"object": "list", "data": mensagens, "has_more": False,
+                    "first_id": mensagens[0]["id"] if mensagens else None,
+                    "last_id": mensagens[-1]["id"] if mensagens else None})
+
+
+@app.post("/v1/threads/<thread_id>/runs")
+def criar_run(thread_id):
+    if thread_id not in _threads:
+        return _erro(404, f"No thread found with id '{thread_id}'.")
+    dados = request.get_json(silent=True) or {}
+    assistant_id = dados.get("assistant_id")
+    if not assistant_id:
+        return _erro(400, "Missing required parameter: 'assistant_id'.")
+    duracao = _duracao_run()
+    agora = time.time()
+    run = {
+        "id": _id("run"), "thread_id": thread_id, "assistant_id": assistant_id,
+        "criado_em": agora, "duracao": duracao, "termina_em": agora + duracao,
+        "falha": _sortear(_aleatorio.random) < config["falhas"], "status": "queued",
+        "texto": _texto_para(assistant_id),
+    }
+    with _lock:
+        _runs[run["id"]] = run
+        _contadores["runs"] += 1
+        _contadores["runs_falhos"] += run["falha"]
+        _contadores["runs_stream"] += bool(dados.get("stream"))
+    if dados.get("stream"):
+        return Response(_eventos_stream(run), mimetype="text/event-stream")
+    with _lock:
+        return jsonify(_objeto_run(run))
+
+
+@app.get("/v1/threads/<thread_id>/runs/<run_id>")
+def consultar_run(thread_id, run_id):
+    run = _runs.get(run_id)
+    if run is None or run["thread_id"] != thread_id:
+        return _erro(404, f"No run found with id '{run_id}'.")
+    with _lock:
+        return jsonify(_objeto_run(run))
+
+
+@app.get("/v1/threads/<thread_id>/runs/<run_id>/steps")
+def listar_passos(thread_id, run_id):
+    run = _runs.get(run_id)
+    if run is None or run["thread_id"] != thread_id:
+        return _erro(404, f"No run found with id '{run_id}'.")
+    with _lock:
+        objeto = _objeto_run(run)
+    passos = []
+    if objeto["status"] == "completed":
+        passos.append({
+            "id": _id("step"), "object": "thread.run.step", "created_at": objeto["started_at"],
+            "run_id": run_id, "thread_id": thread_id, "assistant_id": run["assistant_id"],
+            "type": "tool_calls", "status": "completed",
+            "step_details": {"type": "tool_calls", "tool_calls": [
+                {"id": _id("call"), "type": "file_search", "file_search": {}}]},
+        })
+    return jsonify({"object": "list", "data": passos, "has_more": False,
+                    "first_id": passos[0]["id"] if passos else None,
+                    "last_id": passos[-1]["id"] if passos else None})
+
+
+def _sse(evento, dados):
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+def _eventos_stream(run):
+    """Eventos SSE na ordem da API: run criado, mensagem criada, deltas, mensagem e run concluídos"""
+    with _lock:
+        criado = _objeto_run(run)
+    yield _sse("thread.run.created", criado)
+    primeiro = min(config["primeiro_token_s"], run["duracao"])
+    time.sleep(primeiro)
+    with _lock:
+        run["status"] = "in_progress"
+        andamento = _objeto_run(run)
+    yield _sse("thread.run.in_progress", andamento)
+
+    if run["falha"]:
+        time.sleep(max(run["duracao"] - primeiro, 0))
+        run["termina_em"] = time.time()
+        with _lock:
+            falhou = _objeto_run(run)
+        yield _sse("thread.run.failed", falhou)
+        yield "event: done\ndata: [DONE]\n\n"
+        return
+
+    mensagem = _mensagem(run["thread_id"], "assistant", "", run["id"], run["assistant_id"])
+    mensagem.update(status="in_progress", content=[])
+    yield _sse("thread.message.created", mensagem)
+
+    palavras = run["texto"].split(" ")
+    pausa = max(run["duracao"] - primeiro, 0) / max(len(palavras), 1)
+    for i, palavra in enumerate(palavras):
+        trecho = palavra if i == 0 else " " + palavra
+        yield _sse("thread.message.delta", {
+            "id": mensagem["id"], "object": "thread.message.delta",
+            "delta": {"content": [{"index": 0, "type": "text", "text": {"value": trecho, "annotations": []}}]},
+        })
+        time.sleep(pausa)
+
+    run["termina_em"] = time.time()
+    with _lock:
+        final = _objeto_run(run)
+    completa = dict(mensagem, status="completed",
+                    content=[{"type": "text", "text": {"value": run["texto"], "annotations": []}}])
+    yield _sse("thread.message.completed", completa)
+    yield _sse("thread.run.completed", final)
+    yield "event: done\ndata: [DONE]\n\n"
+
+
+@app.get("/_simulador/estatisticas")
+def estatisticas():
+    with _lock:
+        dados = dict(_contadores, threads=len(_threads), config=config)
+    return jsonify(dados)
+
+
+@app.post("/_simulador/config")
+def alterar_config():
+    dados = request.get_json(silent=True) or {}
+    desconhecidos = set(dados) - set(config)
+    if desconhecidos:
+        return _erro(400, f"parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}")
+    config.update({k: type(config[k])(v) for k, v in dados.items()})
+    return jsonify(config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    for nome, valor in config.items():
+        parser.add_argument("--" + nome.replace("_", "-"), type=type(valor), default=valor)
+    parser.add_argument("--respostas", help="JSON com o texto por assistant_id")
+    parser.add_argument("--semente", type=int, default=None)
+    args = parser.parse_args()
+
+    config.update({nome: getattr(args, nome) for nome in config})
+    if args.respostas:
+        with open(args.respostas, encoding="utf-8") as f:
+            respostas.update(json.load(f))
+    if args.semente is not None:
+        _aleatorio.seed(args.semente)
+
+    print(f"[OK] Simulador OpenAI em http://{args.host}:{args.porta}/v1")
+    print(f"[INFO] {json.dumps(config)}")
+    app.run(host=args.host, port=args.porta, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
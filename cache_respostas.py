@@ -0,0 +1,181 @@
+"""
+Cache de respostas do assistente para perguntas repetidas.
+Fica em SQLite (data/cache_respostas.db) para ser compartilhado entre os workers do gunicorn.
+"""
+
+import hashlib
+import os
+import re
+import time
+import unicodedata
+
+from conexoes import conectar
+
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache_respostas.db')
+
+CACHE_ATIVO = os.getenv("CACHE_RESPOSTAS", "1") != "0"
+TTL_SEGUNDOS = int(os.getenv("CACHE_RESPOSTAS_TTL", str(24 * 3600)))
+MAX_ENTRADAS = int(os.getenv("CACHE_RESPOSTAS_MAX", "2000"))
+
+# "erro 9", "erro e9", "erro: E-09", "e-9", "e09" -> "e9" (e1 não casa com e10/e11).
+# O roteador do assistente.py e o pós-processamento usam este mesmo padrão: cache, roteamento
+# e marcador de vídeo concordam. Começa pelo 'e' literal (e o \b vem depois, no lookbehind)
+# para o re pular direto para os 'e' do texto ao varrer respostas inteiras
+PADRAO_CODIGO_ERRO = (r'e(?<=\be)(?:rro\s*:?\s*(?:e\s*)?-?\s*0*(?P<num_erro>[1-9]\d?)(?!\d)'
+                      r'|-?0*(?P<num_e>[1-9]\d?)\b)')
+_RE_ERRO = re.compile(PADRAO_CODIGO_ERRO, re.IGNORECASE)
+_RE_NAO_ALFANUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar_pergunta(pergunta: str) -> str:
+    """Minúsculas, sem acentos/pontuação, espaços colapsados e códigos de erro canônicos"""
+    texto = unicodedata.normalize('NFKD', (pergunta or '').lower())
+    texto = ''.join(ch for ch in texto if not unicodedata.combining(ch))
+    texto = _RE_ERRO.sub(lambda m: f" e{int(m.group('num_erro') or m.group('num_e'))} ", texto)
+    texto = _RE_NAO_ALFANUM.sub(' ', texto)
+    return ' '.join(texto.split())
+
+
+def versao_equipamento(config: dict) -> str:
+    """Identifica o par assistente/vector store; muda quando qualquer ID muda"""
+    base = f"{config.get('assistant_id', '')}|{config.get('vector_store_id', '')}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()[:16]
+
+
+class CacheRespostas:
+    def __init__(self, db_path=None, ttl=TTL_SEGUNDOS, max_entradas=MAX_ENTRADAS):
+        self.db_path = db_path or CACHE_PATH
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.inicializar()
+
+    def _conn(self):
+        return conectar(self.db_path)
+
+    def inicializar(self):
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                chave TEXT PRIMARY KEY,
+                versao TEXT NOT NULL,
+                assistant_id TEXT,
+                pergunta TEXT,
+                resposta TEXT,
+                criado_em REAL,
+                expira_em REAL,
+                ultimo_acesso REAL,
+                acessos INTEGER DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_respostas_acesso ON respostas(ultimo_acesso);
+            CREATE INDEX IF NOT EXISTS idx_respostas_expira ON respostas(expira_em);
+        """)
+        conn.commit()
+
+    @staticmethod
+    def _chave(assistant_id, pergunta_normalizada):
+        return hashlib.sha256(f"{assistant_id}\0{pergunta_normalizada}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _contar(conn, nome):
+        conn.execute(
+            """INSERT INTO contadores (nome, valor) VALUES (?, 1)
+               ON CONFLICT(nome) DO UPDATE SET valor = valor + 1""",
+            (nome,)
+        )
+
+    def obter(self, assistant_id, versao, pergunta):
+        """Resposta em cache ou None. Entradas vencidas ou de outra versao sao descartadas."""
+        chave = self._chave(assistant_id, normalizar_pergunta(pergunta))
+        agora = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT versao, resposta, expira_em FROM respostas WHERE chave = ?", (chave,)
+            ).fetchone()
+
+            if row and row["versao"] == versao and row["expira_em"] > agora:
+                conn.execute(
+                    "UPDATE respostas SET ultimo_acesso = ?, acessos = acessos + 1 WHERE chave = ?",
+                    (agora, chave)
+                )
+                self._contar(conn, "hits")
+                return row["resposta"]
+
+            if row:
+                conn.execute("DELETE FROM respostas WHERE chave = ?", (chave,))
+            self._contar(conn, "misses")
+            return None
+
+    def salvar(self, assistant_id, versao, pergunta, resposta):
+        """Guarda a resposta e aplica TTL e limite de tamanho (LRU)."""
+        normalizada = normalizar_pergunta(pergunta)
+        if not normalizada or not resposta:
+            return
+        agora = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO respostas
+                   (chave, versao, assistant_id, pergunta, resposta, criado_em, expira_em, ultimo_acesso, acessos)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)""",
+                (self._chave(assistant_id, normalizada), versao, assistant_id, normalizada,
+                 resposta, agora, agora + self.ttl, agora)
+            )
+            conn.execute("DELETE FROM respostas WHERE expira_em <= ?", (agora,))
+            excesso = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0] - self.max_entradas
+            if excesso > 0:
+                conn.execute(
+                    """DELETE FROM respostas WHERE chave IN (
+                           SELECT chave FROM respostas ORDER BY ultimo_acesso ASC LIMIT ?)""",
+                    (excesso,)
+                )
+                conn.execute(
+                    """INSERT INTO contadores (nome, valor) VALUES ('removidas_lru', ?)
+                       ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor""",
+                    (excesso,)
+                )
+
+    def invalidar_versoes(self, versoes_validas):
+        """Remove entradas de assistentes/vector stores que nao estao mais configurados."""
+        versoes = list(versoes_validas)
+        marcadores = ",".join("?" * len(versoes)) or "''"
+        with self._conn() as conn:
+            cur = conn.execute(f"DELETE FROM respostas WHERE versao NOT IN ({marcadores})", versoes)
+        return cur.rowcount
+
+    def limpar(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM respostas")
+
+    def estatisticas(self):
+        conn = self._conn()
+        contadores = {row["nome"]: row["valor"] for row in conn.execute("SELECT nome, valor FROM contadores")}
+        entradas = conn.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+        hits = contadores.get("hits", 0)
+        misses = contadores.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "taxa_acerto": round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+            "entradas": entradas,
+            "removidas_lru": contadores.get("removidas_lru", 0),
+            "max_entradas": self.max_entradas,
+            "ttl_segundos": self.ttl,
+        }
+
+
+_cache = None
+
+
+def obter_cache():
+    """Instancia unica por processo (criada no primeiro uso)."""
+    global _cache
+    if _cache is None:
+        _cache = CacheRespostas()
+    return _cache
@@ -0,0 +1,186 @@
+"""
+Cache das analises de video pelo conteudo do arquivo.
+Cliente que reenvia o mesmo video (ex.: depois de uma falha) recebe a analise guardada,
+sem novo upload nem nova chamada ao Gemini. Fica em SQLite (data/cache_videos.db),
+compartilhado entre os workers do gunicorn.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from conexoes import conectar
+
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache_videos.db')
+
+CACHE_ATIVO = os.getenv("CACHE_VIDEOS", "1") != "0"
+TTL_SEGUNDOS = int(os.getenv("CACHE_VIDEOS_TTL", str(30 * 24 * 3600)))
+MAX_ENTRADAS = int(os.getenv("CACHE_VIDEOS_MAX", "1000"))
+
+BLOCO_HASH = 1024 * 1024
+
+
+def hash_arquivo(caminho):
+    """SHA-256 do arquivo lido em blocos (o video nunca fica inteiro em memoria)"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        while True:
+            bloco = arquivo.read(BLOCO_HASH)
+            if not bloco:
+                break
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class ArquivoComHash:
+    """
+    Arquivo de upload que calcula o SHA-256 conforme os blocos sao gravados, para o
+    video nao ser lido de novo do disco so para o hash. O resto vai para o arquivo.
+    """
+    
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+        self._sha = hashlib.sha256()
+    
+    def write(self, dados):
+        self._sha.update(dados)
+        return self._arquivo.write(dados)
+    
+    def hexdigest(self):
+        return self._sha.hexdigest()
+    
+    def __getattr__(self, nome):
+        return getattr(self._arquivo, nome)
+
+
+def versao_base(*partes):
+    """Identifica a base de erros/modelo usada na analise; muda quando qualquer parte muda"""
+    texto = json.dumps(partes, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+
+class CacheVideos:
+    def __init__(self, db_path=None, ttl=TTL_SEGUNDOS, max_entradas=MAX_ENTRADAS):
+        self.db_path = db_path or CACHE_PATH
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self.inicializar()
+
+    def _conn(self):
+        return conectar(self.db_path)
+
+    def inicializar(self):
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analises (
+                chave TEXT PRIMARY KEY,
+                hash_video TEXT NOT NULL,
+                modulo TEXT,
+                versao TEXT NOT NULL,
+                resultado TEXT NOT NULL,
+                criado_em REAL,
+                expira_em REAL,
+                ultimo_acesso REAL,
+                acessos INTEGER DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL DEFAULT 0
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_analises_acesso ON analises(ultimo_acesso);
+            CREATE INDEX IF NOT EXISTS idx_analises_expira ON analises(expira_em);
+        """)
+        conn.commit()
+
+    @staticmethod
+    def _chave(hash_video, modulo, versao):
+        return hashlib.sha256(f"{hash_video}\0{modulo}\0{versao}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _contar(conn, nome, valor=1):
+        conn.execute(
+            """INSERT INTO contadores (nome, valor) VALUES (?, ?)
+               ON CONFLICT(nome) DO UPDATE SET valor = valor + excluded.valor""",
+            (nome, valor)
+        )
+
+    def obter(self, hash_video, modulo, versao):
+        """Resultado (dict) guardado para o video, ou None."""
+        chave = self._chave(hash_video, modulo, versao)
+        agora = time.time()
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT resultado, expira_em FROM analises WHERE chave = ?", (chave,)
+            ).fetchone()
+
+            if row and row["expira_em"] > agora:
+                conn.execute(
+                    "UPDATE analises SET ultimo_acesso = ?, acessos = acessos + 1 WHERE chave = ?",
+                    (agora, chave)
+                )
+                self._contar(conn, "hits")
+                return json.loads(row["resultado"])
+
+            if row:
+                conn.execute("DELETE FROM analises WHERE chave = ?", (chave,))
+            self._contar(conn, "misses")
+            return None
+
+    def salvar(self, hash_video, modulo, versao, resultado):
+        """Guarda o resultado e aplica TTL e limite de tamanho (LRU)."""
+        if not resultado:
+            return
+        agora = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO analises
+                   (chave, hash_video, modulo, versao, resultado, criado_em, expira_em, ultimo_acesso, acessos)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)""",
+                (self._chave(hash_video, modulo, versao), hash_video, modulo, versao,
+                 json.dumps(resultado, ensure_ascii=False), agora, agora + self.ttl, agora)
+            )
+            conn.execute("DELETE FROM analises WHERE expira_em <= ? OR versao != ?", (agora, versao))
+            excesso = conn.execute("SELECT COUNT(*) FROM analises").fetchone()[0] - self.max_entradas
+            if excesso > 0:
+                conn.execute(
+                    """DELETE FROM analises WHERE chave IN (
+                           SELECT chave FROM analises ORDER BY ultimo_acesso ASC LIMIT ?)""",
+                    (excesso,)
+                )
+                self._contar(conn, "removidas_lru", excesso)
+
+    def limpar(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM analises")
+
+    def estatisticas(self):
+        conn = self._conn()
+        contadores = {row["nome"]: row["valor"] for row in conn.execute("SELECT nome, valor FROM contadores")}
+        entradas = conn.execute("SELECT COUNT(*) FROM analises").fetchone()[0]
+        hits = contadores.get("hits", 0)
+        misses = contadores.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "taxa_acerto": round(hits / (hits + misses) * 100, 1) if hits + misses else 0,
+            "entradas": entradas,
+            "removidas_lru": contadores.get("removidas_lru", 0),
+            "max_entradas": self.max_entradas,
+            "ttl_segundos": self.ttl,
+        }
+
+
+_cache = None
+
+
+def obter_cache_videos():
+    """Instancia unica por processo (criada no primeiro uso)."""
+    global _cache
+    if _cache is None:
+        _cache = CacheVideos()
+    return _cache
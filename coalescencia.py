@@ -0,0 +1,240 @@
+"""
+Coalescencia (single-flight) de perguntas iguais em andamento.
+
+Quando varios clientes mandam a mesma pergunta para o mesmo assistente ao mesmo tempo,
+so o primeiro (lider) chama a API; os outros (caronas) esperam e recebem o mesmo texto.
+
+- No mesmo worker: os caronas esperam num threading.Event do voo.
+- Entre workers: o lider segura uma linha em data/coalescencia.db (com prazo, para nao
+  travar se o worker morrer) e grava o resultado nela; o primeiro request de outro worker
+  acompanha essa linha e repassa o resultado aos caronas do seu processo.
+
+Se o lider falhar ou passar do prazo, os caronas recebem None (e respondem offline).
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+from cache_respostas import normalizar_pergunta
+from conexoes import conectar
+
+
+COALESCENCIA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'coalescencia.db')
+
+ATIVO = os.getenv("COALESCENCIA", "1") != "0"
+# Por quanto tempo o resultado do lider fica disponivel para quem chegou no fim do voo
+RESULTADO_S = float(os.getenv("COALESCENCIA_RESULTADO_S", "5"))
+
+
+def chave_pergunta(assistant_id, pergunta):
+    """Mesma chave para a mesma pergunta normalizada no mesmo assistente"""
+    base = f"{assistant_id}\0{normalizar_pergunta(pergunta)}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+class _Voo:
+    """Um pedido em andamento para uma chave, neste processo."""
+
+    def __init__(self, chave):
+        self.chave = chave
+        self.dono = uuid.uuid4().hex
+        self.evento = threading.Event()
+        self.resultado = None
+
+
+class Participacao:
+    """
+    Papel de um request num voo. O lider chama a API e depois `concluir(resultado)`;
+    os caronas chamam `aguardar(timeout)`.
+    """
+
+    def __init__(self, coalescedor, voo, lider, origem=None, resultado=None):
+        self._coalescedor = coalescedor
+        self._voo = voo
+        self._resultado = resultado
+        self.lider = lider
+        self.origem = origem          # carona: "local", "outro_worker" ou "recente"
+
+    def aguardar(self, timeout):
+        c = self._coalescedor
+        if self.origem == "recente":
+            resultado = self._resultado
+        elif self.origem == "outro_worker":
+            # Este request acompanha o banco e repassa o resultado aos caronas locais
+            resultado = c._aguardar_banco(self._voo, timeout)
+            c._publicar(self._voo, resultado)
+        else:
+            self._voo.evento.wait(timeout)
+            resultado = self._voo.resultado
+        c._contar("caronas" if resultado else "caronas_sem_resultado")
+        return resultado
+
+    def concluir(self, resultado):
+        if self.lider and self._voo is not None and not self._voo.evento.is_set():
+            self._coalescedor._concluir(self._voo, resultado)
+
+
+class Coalescedor:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or COALESCENCIA_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._voos = {}
+        self._ultima_limpeza = 0
+        conn = conectar(self.db_path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS voos (
+                chave TEXT PRIMARY KEY,
+                dono TEXT NOT NULL,
+                expira REAL NOT NULL,
+                resultado TEXT
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS contadores (
+                nome TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        conn.commit()
+
+    def participar(self, chave, duracao_s):
+        """Entra no voo da chave: como lider se ninguem estiver buscando, senao como carona."""
+        if not ATIVO:
+            return Participacao(self, None, lider=True)
+
+        with self._lock:
+            voo = self._voos.get(chave)
+            if voo is not None:
+                return Participacao(self, voo, lider=False, origem="local")
+            voo = self._voos[chave] = _Voo(chave)
+
+        try:
+            situacao = self._tomar(voo, duracao_s)
+        except Exception as e:
+            print(f"[AVISO] Coalescencia indisponivel: {e}")
+            situacao = "lider"
+
+        if situacao == "lider":
+            self._contar("lideres")
+            return Participacao(self, voo, lider=True)
+        if situacao == "aguardar":
+            return Participacao(self, voo, lider=False, origem="outro_worker")
+        # Outro worker acabou de responder a mesma pergunta
+        self._publicar(voo, situacao)
+        return Participacao(self, voo, lider=False, origem="recente", resultado=situacao)
+
+    # ------------------------------------------------------------ banco
+
+    def _tomar(self, voo, duracao_s):
+        """'lider' se pegou a linha, o resultado se ja existe um recente, ou 'aguardar'."""
+        agora = time.time()
+        self._limpar_vencidos(agora)
+        with conectar(self.db_path) as conn:
+            row = conn.execute(
+                """INSERT INTO voos (chave, dono, expira, resultado) VALUES (:chave, :dono, :expira, NULL)
+                   ON CONFLICT(chave) DO UPDATE SET dono = :dono, expira = :expira, resultado = NULL
+                   WHERE voos.expira <= :agora
+                   RETURNING dono""",
+                {"chave": voo.chave, "dono": voo.dono, "expira": agora + duracao_s, "agora": agora}
+            ).fetchone()
+            if row is not None:
+                return "lider"
+            row = conn.execute("SELECT resultado FROM voos WHERE chave = ?", (voo.chave,)).fetchone()
+        if row is not None and row["resultado"]:
+            return row["resultado"]
+        return "aguardar"
+
+    def _aguardar_banco(self, voo, timeout):
+        limite = time.monotonic() + timeout
+        dono = None
+        pausa = 0.05
+        while True:
+            try:
+                row = conectar(self.db_path).execute(
+                    "SELECT dono, expira, resultado FROM voos WHERE chave = ?", (voo.chave,)
+                ).fetchone()
+            except Exception as e:
+                print(f"[AVISO] Coalescencia indisponivel: {e}")
+                return None
+            # Linha apagada ou trocada de dono: o lider falhou
+            if row is None or (dono is not None and row["dono"] != dono):
+                return None
+            dono = row["dono"]
+            if row["resultado"]:
+                return row["resultado"]
+            if row["expira"] <= time.time() or time.monotonic() >= limite:
+                return None
+            time.sleep(pausa)
+            pausa = min(pausa * 1.5, 0.5)
+
+    def _concluir(self, voo, resultado):
+        try:
+            with conectar(self.db_path) as conn:
+                if resultado:
+                    conn.execute(
+                        "UPDATE voos SET resultado = ?, expira = ? WHERE chave = ? AND dono = ?",
+                        (resultado, time.time() + RESULTADO_S, voo.chave, voo.dono)
+                    )
+                else:
+                    conn.execute("DELETE FROM voos WHERE chave = ? AND dono = ?", (voo.chave, voo.dono))
+        except Exception as e:
+            print(f"[AVISO] Coalescencia: nao foi possivel publicar o resultado: {e}")
+        self._publicar(voo, resultado)
+
+    def _publicar(self, voo, resultado):
+        """Entrega o resultado aos caronas deste processo e encerra o voo local"""
+        voo.resultado = resultado
+        voo.evento.set()
+        with self._lock:
+            if self._voos.get(voo.chave) is voo:
+                del self._voos[voo.chave]
+
+    def _contar(self, nome):
+        try:
+            with conectar(self.db_path) as conn:
+                conn.execute(
+                    """INSERT INTO contadores (nome, valor) VALUES (?, 1)
+                       ON CONFLICT(nome) DO UPDATE SET valor = valor + 1""",
+                    (nome,)
+                )
+        except Exception as e:
+            print(f"[AVISO] Coalescencia: contador {nome}: {e}")
+
+    def _limpar_vencidos(self, agora):
+        if agora - self._ultima_limpeza < 300:
+            return
+        self._ultima_limpeza = agora
+        with conectar(self.db_path) as conn:
+            conn.execute("DELETE FROM voos WHERE expira < ?", (agora,))
+
+    def estatisticas(self):
+        conn = conectar(self.db_path)
+        contadores = {row["nome"]: row["valor"] for row in conn.execute("SELECT nome, valor FROM contadores")}
+        lideres = contadores.get("lideres", 0)
+        caronas = contadores.get("caronas", 0)
+        sem_resultado = contadores.get("caronas_sem_resultado", 0)
+        total = lideres + caronas + sem_resultado
+        with self._lock:
+            em_andamento = len(self._voos)
+        return {
+            "ativo": ATIVO,
+            "lideres": lideres,
+            "caronas": caronas,
+            "caronas_sem_resultado": sem_resultado,
+            "taxa_coalescencia": round(caronas / total * 100, 1) if total else 0,
+            "em_andamento_neste_processo": em_andamento,
+        }
+
+
+_coalescedor = None
+
+
+def obter_coalescedor():
+    """Instancia unica por processo (criada no primeiro uso)."""
+    global _coalescedor
+    if _coalescedor is None:
+        _coalescedor = Coalescedor()
+    return _coalescedor
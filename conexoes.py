@@ -0,0 +1,74 @@
+"""
+Conexoes SQLite reaproveitadas por thread.
+
+Cada thread de cada processo (worker do gunicorn) mantem uma conexao aberta por banco,
+ja configurada (WAL, synchronous, busy_timeout, cache, mmap) e com cache de statements.
+Usar como:
+
+    with conectar(DB_PATH) as conn:   # commit no fim, rollback se der erro
+        conn.execute(...)
+
+A conexao NAO deve ser fechada por quem usa.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "8192"))
+MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "64"))
+STATEMENTS_EM_CACHE = int(os.getenv("SQLITE_STATEMENTS_CACHE", "256"))
+
+_local = threading.local()
+# Conexoes herdadas de outro processo (fork): nao podem ser usadas nem fechadas aqui
+_herdadas = []
+
+
+def _abrir(db_path, foreign_keys):
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENTS_EM_CACHE
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def _conexoes_da_thread():
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        _herdadas.extend(getattr(_local, "conexoes", {}).values())
+        _local.conexoes = {}
+        _local.pid = pid
+    return _local.conexoes
+
+
+def conectar(db_path, foreign_keys=False):
+    """Conexao da thread atual para o banco (aberta e configurada no primeiro uso)."""
+    conexoes = _conexoes_da_thread()
+    chave = (os.path.abspath(db_path), foreign_keys)
+    conn = conexoes.get(chave)
+    if conn is None:
+        conn = _abrir(db_path, foreign_keys)
+        conexoes[chave] = conn
+    return conn
+
+
+def fechar_conexoes():
+    """Fecha as conexoes da thread atual (scripts, testes, fim de thread de fundo)."""
+    for conn in _conexoes_da_thread().values():
+        try:
+            conn.close()
+        except Exception:
+            pass
+    _local.conexoes = {}
@@ -0,0 +1,184 @@
+"""
+Consumo do Assistants API: tokens, tempo do run e uso do File Search por resposta.
+
+    consumo_assistente   uma linha por run concluido (run_id), com o chamado e o equipamento
+    consumo_diario       dia x equipamento -> somas, mantidas por triggers (painel admin)
+
+Respostas do cache, de carona (coalescencia) ou offline nao geram run e nao entram aqui.
+buscas_arquivo (chamadas do File Search) chega depois, consultando os passos do run em
+segundo plano; fica NULL se nao deu para consultar. citacoes conta as anotacoes
+file_citation da resposta.
+
+As linhas nao sao apagadas com o chamado: o custo continua valendo.
+
+Reconstruir o consolidado a partir das linhas:
+
+    python consumo.py [caminho/do/banco.db]
+"""
+
+import argparse
+import os
+import sqlite3
+
+
+TABELAS = """
+    CREATE TABLE IF NOT EXISTS consumo_assistente (
+        run_id TEXT PRIMARY KEY,
+        chamado_id INTEGER,
+        equipamento TEXT NOT NULL,
+        thread_id TEXT,
+        status TEXT,
+        tokens_entrada INTEGER NOT NULL DEFAULT 0,
+        tokens_saida INTEGER NOT NULL DEFAULT 0,
+        duracao_s REAL NOT NULL DEFAULT 0,
+        fila_s REAL,
+        buscas_arquivo INTEGER,
+        citacoes INTEGER NOT NULL DEFAULT 0,
+        criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_consumo_chamado ON consumo_assistente(chamado_id);
+
+    CREATE TABLE IF NOT EXISTS consumo_diario (
+        dia TEXT NOT NULL,
+        equipamento TEXT NOT NULL,
+        respostas INTEGER NOT NULL DEFAULT 0,
+        tokens_entrada INTEGER NOT NULL DEFAULT 0,
+        tokens_saida INTEGER NOT NULL DEFAULT 0,
+        soma_duracao REAL NOT NULL DEFAULT 0,
+        soma_fila REAL NOT NULL DEFAULT 0,
+        com_fila INTEGER NOT NULL DEFAULT 0,
+        buscas_arquivo INTEGER NOT NULL DEFAULT 0,
+        com_buscas INTEGER NOT NULL DEFAULT 0,
+        citacoes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, equipamento)
+    ) WITHOUT ROWID;
+"""
+
+TRIGGERS = ["consumo_insert", "consumo_update", "consumo_delete"]
+
+# (coluna do consolidado, expressao sobre a linha) somadas por dia x equipamento
+_SOMAS = [
+    ("respostas", "1"),
+    ("tokens_entrada", "{r}.tokens_entrada"),
+    ("tokens_saida", "{r}.tokens_saida"),
+    ("soma_duracao", "{r}.duracao_s"),
+    ("soma_fila", "COALESCE({r}.fila_s, 0)"),
+    ("com_fila", "({r}.fila_s IS NOT NULL)"),
+    ("buscas_arquivo", "COALESCE({r}.buscas_arquivo, 0)"),
+    ("com_buscas", "({r}.buscas_arquivo IS NOT NULL)"),
+    ("citacoes", "{r}.citacoes"),
+]
+
+
+def _upsert(linha, sinal):
+    colunas = ", ".join(c for c, _ in _SOMAS)
+    valores = ", ".join(f"{sinal}{e.format(r=linha)}" for _, e in _SOMAS)
+    somas = ", ".join(f"{c} = {c} + excluded.{c}" for c, _ in _SOMAS)
+    return f"""
+        INSERT INTO consumo_diario (dia, equipamento, {colunas})
+        VALUES (DATE({linha}.criado_em), {linha}.equipamento, {valores})
+        ON CONFLICT (dia, equipamento) DO UPDATE SET {somas};"""
+
+
+def _criar_triggers(conn):
+    for nome in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+    conn.execute(f"""
+        CREATE TRIGGER consumo_insert AFTER INSERT ON consumo_assistente
+        BEGIN {_upsert("NEW", "")} END""")
+    conn.execute(f"""
+        CREATE TRIGGER consumo_update AFTER UPDATE ON consumo_assistente
+        BEGIN {_upsert("OLD", "-")} {_upsert("NEW", "")} END""")
+    conn.execute(f"""
+        CREATE TRIGGER consumo_delete AFTER DELETE ON consumo_assistente
+        BEGIN {_upsert("OLD", "-")} END""")
+
+
+def instalar(conn):
+    """Cria tabelas e triggers (idempotente)."""
+    conn.executescript(TABELAS)
+    _criar_triggers(conn)
+    conn.commit()
+
+
+def reconstruir(conn):
+    """Recalcula consumo_diario a partir de consumo_assistente."""
+    colunas = ", ".join(c for c, _ in _SOMAS)
+    somas = ", ".join(f"SUM({e.format(r='c')})" for _, e in _SOMAS)
+    with conn:
+        conn.execute("DELETE FROM consumo_diario")
+        conn.execute(f"""
+            INSERT INTO consumo_diario (dia, equipamento, {colunas})
+            SELECT DATE(c.criado_em), c.equipamento, {somas}
+            FROM consumo_assistente c GROUP BY 1, 2""")
+
+
+def _medias(row):
+    """Totais + medias por resposta de uma linha agregada do consolidado"""
+    respostas = row["respostas"] or 0
+    return {
+        "respostas": respostas,
+        "tokens_entrada": row["tokens_entrada"] or 0,
+        "tokens_saida": row["tokens_saida"] or 0,
+        "tokens_por_resposta": round(((row["tokens_entrada"] or 0) + (row["tokens_saida"] or 0)) / respostas)
+        if respostas else 0,
+        "duracao_media_s": round(row["soma_duracao"] / respostas, 2) if respostas else 0,
+        "fila_media_s": round(row["soma_fila"] / row["com_fila"], 2) if row["com_fila"] else None,
+        "buscas_por_resposta": round(row["buscas_arquivo"] / row["com_buscas"], 2) if row["com_buscas"] else None,
+        "citacoes_por_resposta": round(row["citacoes"] / respostas, 2) if respostas else 0,
+    }
+
+
+_AGREGADO = """COALESCE(SUM(respostas), 0) AS respostas, SUM(tokens_entrada) AS tokens_entrada,
+               SUM(tokens_saida) AS tokens_saida, SUM(soma_duracao) AS soma_duracao,
+               SUM(soma_fila) AS soma_fila, SUM(com_fila) AS com_fila,
+               SUM(buscas_arquivo) AS buscas_arquivo, SUM(com_buscas) AS com_buscas,
+               SUM(citacoes) AS citacoes"""
+
+
+def resumo(conn, dias=30):
+    """Consumo dos ultimos `dias` (UTC): total, por equipamento e por dia."""
+    desde = f"-{int(dias) - 1} days"
+    total = conn.execute(f"""SELECT {_AGREGADO} FROM consumo_diario
+                             WHERE dia >= DATE('now', ?)""", (desde,)).fetchone()
+    por_equipamento = conn.execute(f"""SELECT equipamento, {_AGREGADO} FROM consumo_diario
+                                       WHERE dia >= DATE('now', ?)
+                                       GROUP BY equipamento ORDER BY SUM(tokens_entrada + tokens_saida) DESC""",
+                                   (desde,)).fetchall()
+    por_dia = conn.execute(f"""SELECT dia, {_AGREGADO} FROM consumo_diario
+                               WHERE dia >= DATE('now', ?)
+                               GROUP BY dia ORDER BY dia DESC""", (desde,)).fetchall()
+    return {
+        "dias": int(dias),
+        "total": _medias(total),
+        "por_equipamento": [dict(_medias(row), equipamento=row["equipamento"]) for row in por_equipamento],
+        "por_dia": [dict(_medias(row), dia=row["dia"]) for row in por_dia],
+    }
+
+
+def do_chamado(conn, chamado_id):
+    """Totais de um chamado (indice por chamado_id; nao passa pelo consolidado)."""
+    row = conn.execute("""SELECT COUNT(*) AS respostas, SUM(tokens_entrada) AS tokens_entrada,
+                                 SUM(tokens_saida) AS tokens_saida, SUM(duracao_s) AS soma_duracao,
+                                 SUM(COALESCE(fila_s, 0)) AS soma_fila, COUNT(fila_s) AS com_fila,
+                                 SUM(COALESCE(buscas_arquivo, 0)) AS buscas_arquivo,
+                                 COUNT(buscas_arquivo) AS com_buscas, SUM(citacoes) AS citacoes
+                          FROM consumo_assistente WHERE chamado_id = ?""", (chamado_id,)).fetchone()
+    return _medias(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db_path", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "storopack.db"))
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db_path)
+    instalar(conn)
+    reconstruir(conn)
+    total = conn.execute("SELECT COUNT(*) FROM consumo_diario").fetchone()[0]
+    print(f"[OK] consumo_diario reconstruido ({total} linha(s) dia x equipamento)")
+
+
+if __name__ == "__main__":
+    main()
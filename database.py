@@ -3,16 +3,35 @@ Banco de dados SQLite para o Assistente Storopack.
 Gerencia chamados, mensagens, feedback, manuais e logs.
 """
 
-import sqlite3
+import base64
 import os
 import uuid
 from datetime import datetime, timedelta
 import json
 
+from conexoes import conectar
+import estatisticas
+import indice_manuais
+
 
 DB_PATH = os.path.join(os.path.dirname(__file__), 'data', 'storopack.db')
 
 
+def _codificar_cursor(row):
+    """Cursor opaco com a posicao (criado_em, id) do ultimo chamado da pagina"""
+    bruto = json.dumps([row["criado_em"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+    """(criado_em, id) do cursor; ValueError se ele nao veio de _codificar_cursor"""
+    try:
+        criado_em, chamado_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError(f"Cursor invalido: {cursor!r}") from e
+    return criado_em, str(chamado_id)
+
+
 class Database:
     def __init__(self, db_path=None):
         self.db_path = db_path or DB_PATH
@@ -20,11 +39,8 @@ class Database:
         self.inicializar()
 
     def _conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA foreign_keys=ON")
-        return conn
+        """Conexao da thread (ja configurada). Nao fechar; usar `with` para escrever."""
+        return conectar(self.db_path, foreign_keys=True)
 
     def inicializar(self):
         """Cria as tabelas se nao existirem."""
@@ -46,6 +62,9 @@ class Database:
                 feedback_comentario TEXT DEFAULT '',
                 tecnico_acionado INTEGER DEFAULT 0,
                 tecnico_observacao TEXT DEFAULT '',
+                thread_id TEXT,
+                mensagens_thread INTEGER DEFAULT 0,
+                total_msgs INTEGER NOT NULL DEFAULT 0,
                 criado_em TEXT DEFAULT (datetime('now', 'localtime')),
                 atualizado_em TEXT DEFAULT (datetime('now', 'localtime')),
                 encerrado_em TEXT
@@ -89,124 +108,137 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_chamados_status ON chamados(status);
             CREATE INDEX IF NOT EXISTS idx_chamados_modulo ON chamados(modulo);
             CREATE INDEX IF NOT EXISTS idx_chamados_cidade ON chamados(cidade);
-            CREATE INDEX IF NOT EXISTS idx_chamados_criado ON chamados(criado_em);
+            DROP INDEX IF EXISTS idx_chamados_criado;
+            CREATE INDEX IF NOT EXISTS idx_chamados_criado_id ON chamados(criado_em, id);
             CREATE INDEX IF NOT EXISTS idx_mensagens_chamado ON mensagens(chamado_id);
             CREATE INDEX IF NOT EXISTS idx_localizacoes_session ON localizacoes(session_id);
         """)
 
+        self._migrar(cursor)
+
         conn.commit()
-        conn.close()
+        estatisticas.instalar(conn)
+
+    def _migrar(self, cursor):
+        """Adiciona colunas novas em bancos criados por versoes anteriores."""
+        colunas = [row["name"] for row in cursor.execute("PRAGMA table_info(chamados)")]
+        if "thread_id" not in colunas:
+            cursor.execute("ALTER TABLE chamados ADD COLUMN thread_id TEXT")
+        if "mensagens_thread" not in colunas:
+            cursor.execute("ALTER TABLE chamados ADD COLUMN mensagens_thread INTEGER DEFAULT 0")
 
     # ========================= CHAMADOS =========================
 
     def criar_chamado(self, session_id, modulo, cidade=""):
         """Cria um novo chamado e retorna o ID."""
         chamado_id = str(uuid.uuid4())[:8]
-        conn = self._conn()
-        conn.execute(
-            "INSERT INTO chamados (id, session_id, modulo, cidade) VALUES (?, ?, ?, ?)",
-            (chamado_id, session_id, modulo, cidade)
-        )
-        conn.commit()
-        conn.close()
-        self._log("chamado_criado", f"Chamado {chamado_id} criado", {
-            "modulo": modulo, "cidade": cidade
-        })
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO chamados (id, session_id, modulo, cidade) VALUES (?, ?, ?, ?)",
+                (chamado_id, session_id, modulo, cidade)
+            )
+            self._log("chamado_criado", f"Chamado {chamado_id} criado", {
+                "modulo": modulo, "cidade": cidade
+            }, conn=conn)
         return chamado_id
 
     def salvar_localizacao(self, session_id, latitude, longitude):
         """Salva a localizacao GPS do usuario"""
-        conn = self._conn()
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO localizacoes (session_id, latitude, longitude, criado_em)
-                VALUES (?, ?, ?, datetime('now', 'localtime'))
-            """, (session_id, latitude, longitude))
-            conn.commit()
-            self._log("info", f"Localizacao salva para session {session_id}")
+            with self._conn() as conn:
+                conn.execute("""
+                    INSERT INTO localizacoes (session_id, latitude, longitude, criado_em)
+                    VALUES (?, ?, ?, datetime('now', 'localtime'))
+                """, (session_id, latitude, longitude))
+                self._log("info", f"Localizacao salva para session {session_id}", conn=conn)
         except Exception as e:
-            conn.rollback()
             self._log("erro", f"Erro ao salvar localizacao: {e}")
             raise
-        finally:
-            conn.close()
 
     def atualizar_cidade(self, chamado_id, cidade):
         """Atualiza cidade do chamado."""
         # Removido import circular - distancia calculada externamente se necessario
-        conn = self._conn()
-        conn.execute(
-            "UPDATE chamados SET cidade = ?, atualizado_em = datetime('now','localtime') WHERE id = ?",
-            (cidade, chamado_id)
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE chamados SET cidade = ?, atualizado_em = datetime('now','localtime') WHERE id = ?",
+                (cidade, chamado_id)
+            )
 
     def registrar_mensagem(self, chamado_id, remetente, conteudo):
         """Registra uma mensagem no chamado."""
-        conn = self._conn()
-        conn.execute(
-            "INSERT INTO mensagens (chamado_id, remetente, conteudo) VALUES (?, ?, ?)",
-            (chamado_id, remetente, conteudo)
-        )
-        conn.execute(
-            "UPDATE chamados SET atualizado_em = datetime('now','localtime') WHERE id = ?",
-            (chamado_id,)
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO mensagens (chamado_id, remetente, conteudo) VALUES (?, ?, ?)",
+                (chamado_id, remetente, conteudo)
+            )
+            conn.execute(
+                "UPDATE chamados SET atualizado_em = datetime('now','localtime') WHERE id = ?",
+                (chamado_id,)
+            )
+
+    def get_conversa(self, chamado_id):
+        """Retorna a thread do OpenAI associada ao chamado."""
+        row = self._conn().execute(
+            "SELECT thread_id, mensagens_thread FROM chamados WHERE id = ?", (chamado_id,)
+        ).fetchone()
+        if not row:
+            return {}
+        return {"thread_id": row["thread_id"], "mensagens_thread": row["mensagens_thread"] or 0}
+
+    def salvar_conversa(self, chamado_id, conversa):
+        """Persiste a thread do chamado depois de uma resposta."""
+        if not conversa.get("thread_id"):
+            return
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE chamados SET thread_id = ?, mensagens_thread = ? WHERE id = ?",
+                (conversa["thread_id"], conversa.get("mensagens_thread", 0), chamado_id)
+            )
 
     def registrar_feedback(self, chamado_id, resolvido, comentario=""):
         """Registra feedback do cliente."""
         status = "resolvido" if resolvido else "nao_resolvido"
-        conn = self._conn()
-        conn.execute(
-            """UPDATE chamados 
-               SET resolvido_bot = ?, feedback_comentario = ?, status = ?,
-                   encerrado_em = datetime('now','localtime'),
-                   atualizado_em = datetime('now','localtime')
-               WHERE id = ?""",
-            (1 if resolvido else 0, comentario, status, chamado_id)
-        )
-        conn.commit()
-        conn.close()
-        self._log("feedback", f"Chamado {chamado_id}: {'resolvido' if resolvido else 'nao resolvido'}", {
-            "chamado_id": chamado_id, "resolvido": resolvido, "comentario": comentario
-        })
+        with self._conn() as conn:
+            conn.execute(
+                """UPDATE chamados 
+                   SET resolvido_bot = ?, feedback_comentario = ?, status = ?,
+                       encerrado_em = datetime('now','localtime'),
+                       atualizado_em = datetime('now','localtime')
+                   WHERE id = ?""",
+                (1 if resolvido else 0, comentario, status, chamado_id)
+            )
+            self._log("feedback", f"Chamado {chamado_id}: {'resolvido' if resolvido else 'nao resolvido'}", {
+                "chamado_id": chamado_id, "resolvido": resolvido, "comentario": comentario
+            }, conn=conn)
 
     def acionar_tecnico(self, chamado_id):
         """Marca chamado como pendente para tecnico."""
-        conn = self._conn()
-        conn.execute(
-            """UPDATE chamados 
-               SET tecnico_acionado = 1, status = 'pendente_tecnico',
-                   atualizado_em = datetime('now','localtime')
-               WHERE id = ?""",
-            (chamado_id,)
-        )
-        conn.commit()
-        conn.close()
-        self._log("tecnico_acionado", f"Tecnico acionado para chamado {chamado_id}", {
-            "chamado_id": chamado_id
-        })
+        with self._conn() as conn:
+            conn.execute(
+                """UPDATE chamados 
+                   SET tecnico_acionado = 1, status = 'pendente_tecnico',
+                       atualizado_em = datetime('now','localtime')
+                   WHERE id = ?""",
+                (chamado_id,)
+            )
+            self._log("tecnico_acionado", f"Tecnico acionado para chamado {chamado_id}", {
+                "chamado_id": chamado_id
+            }, conn=conn)
 
     def resolver_chamado_tecnico(self, chamado_id, observacao=""):
         """Tecnico resolve o chamado manualmente."""
-        conn = self._conn()
-        conn.execute(
-            """UPDATE chamados 
-               SET resolvido_tecnico = 1, tecnico_observacao = ?, status = 'resolvido_tecnico',
-                   encerrado_em = datetime('now','localtime'),
-                   atualizado_em = datetime('now','localtime')
-               WHERE id = ?""",
-            (observacao, chamado_id)
-        )
-        conn.commit()
-        conn.close()
-        self._log("tecnico_resolveu", f"Tecnico resolveu chamado {chamado_id}", {
-            "chamado_id": chamado_id, "observacao": observacao
-        })
+        with self._conn() as conn:
+            conn.execute(
+                """UPDATE chamados 
+                   SET resolvido_tecnico = 1, tecnico_observacao = ?, status = 'resolvido_tecnico',
+                       encerrado_em = datetime('now','localtime'),
+                       atualizado_em = datetime('now','localtime')
+                   WHERE id = ?""",
+                (observacao, chamado_id)
+            )
+            self._log("tecnico_resolveu", f"Tecnico resolveu chamado {chamado_id}", {
+                "chamado_id": chamado_id, "observacao": observacao
+            }, conn=conn)
 
     # ========================= CONSULTAS =========================
 
@@ -215,14 +247,12 @@ class Database:
         conn = self._conn()
         chamado = conn.execute("SELECT * FROM chamados WHERE id = ?", (chamado_id,)).fetchone()
         if not chamado:
-            conn.close()
             return None
 
         mensagens = conn.execute(
             "SELECT * FROM mensagens WHERE chamado_id = ? ORDER BY criado_em",
             (chamado_id,)
         ).fetchall()
-        conn.close()
 
         return {
             "chamado": dict(chamado),
@@ -230,7 +260,11 @@ class Database:
         }
 
     def listar_chamados(self, filtros=None):
-        """Lista chamados com filtros e paginacao."""
+        """
+        Lista chamados com filtros, do mais recente para o mais antigo.
+        Paginacao por cursor: passe o next_cursor do resultado anterior em filtros["cursor"]
+        (cada pagina le so as proprias linhas pelo indice, sem OFFSET nem COUNT).
+        """
         filtros = filtros or {}
         conn = self._conn()
 
@@ -253,45 +287,38 @@ class Database:
             where.append("criado_em <= ?")
             params.append(filtros["data_fim"] + " 23:59:59")
 
-        where_clause = " AND ".join(where) if where else "1=1"
-
-        total = conn.execute(f"SELECT COUNT(*) as total FROM chamados WHERE {where_clause}", params).fetchone()["total"]
+        if filtros.get("cursor"):
+            where.append("(criado_em, id) < (?, ?)")
+            params.extend(_decodificar_cursor(filtros["cursor"]))
 
-        page = filtros.get("page", 1)
+        where_clause = " AND ".join(where) if where else "1=1"
         per_page = filtros.get("per_page", 20)
-        offset = (page - 1) * per_page
 
-        chamados = conn.execute(
-            f"""SELECT * FROM chamados WHERE {where_clause} 
-                ORDER BY criado_em DESC LIMIT ? OFFSET ?""",
-            params + [per_page, offset]
+        linhas = conn.execute(
+            f"""SELECT * FROM chamados WHERE {where_clause}
+                ORDER BY criado_em DESC, id DESC LIMIT ?""",
+            params + [per_page + 1]
         ).fetchall()
-
-        conn.close()
+        pagina = linhas[:per_page]
 
         return {
-            "chamados": [dict(c) for c in chamados],
-            "total": total,
-            "page": page,
+            "chamados": [dict(c) for c in pagina],
             "per_page": per_page,
-            "total_pages": (total + per_page - 1) // per_page
+            "next_cursor": _codificar_cursor(pagina[-1]) if len(linhas) > per_page else None
         }
 
     def listar_pendentes_tecnico(self):
         """Lista chamados que precisam de atencao do tecnico."""
         conn = self._conn()
         chamados = conn.execute(
-            """SELECT c.*, 
-                      (SELECT COUNT(*) FROM mensagens WHERE chamado_id = c.id) as total_msgs
-               FROM chamados c 
+            """SELECT c.* FROM chamados c 
                WHERE c.status = 'pendente_tecnico' 
                ORDER BY c.criado_em DESC"""
         ).fetchall()
-        conn.close()
         return [dict(c) for c in chamados]
 
     def get_estatisticas(self):
-        """Retorna estatisticas gerais para o painel."""
+        """Retorna estatisticas gerais para o painel (das tabelas de contadores)."""
         conn = self._conn()
 
         hoje = datetime.now().strftime("%Y-%m-%d")
@@ -300,86 +327,93 @@ class Database:
 
         stats = {}
 
-        stats["total_chamados"] = conn.execute("SELECT COUNT(*) as c FROM chamados").fetchone()["c"]
-        stats["chamados_hoje"] = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE criado_em >= ?", (hoje,)
-        ).fetchone()["c"]
-        stats["chamados_semana"] = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE criado_em >= ?", (semana,)
-        ).fetchone()["c"]
-        stats["chamados_mes"] = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE criado_em >= ?", (mes,)
-        ).fetchone()["c"]
+        row = conn.execute(
+            """SELECT COALESCE(SUM(total), 0) as total,
+                      COALESCE(SUM(CASE WHEN dia >= ? THEN total END), 0) as hoje,
+                      COALESCE(SUM(CASE WHEN dia >= ? THEN total END), 0) as semana,
+                      COALESCE(SUM(CASE WHEN dia >= ? THEN total END), 0) as mes,
+                      COALESCE(SUM(resolvidos_bot), 0) as resolvidos_bot
+               FROM estatisticas_chamados""",
+            (hoje, semana, mes)
+        ).fetchone()
+        stats["total_chamados"] = row["total"]
+        stats["chamados_hoje"] = row["hoje"]
+        stats["chamados_semana"] = row["semana"]
+        stats["chamados_mes"] = row["mes"]
 
         stats["por_status"] = {}
-        for row in conn.execute("SELECT status, COUNT(*) as c FROM chamados GROUP BY status"):
-            stats["por_status"][row["status"]] = row["c"]
+        for row_status in conn.execute(
+            "SELECT status, SUM(total) as c FROM estatisticas_chamados GROUP BY status"
+        ):
+            stats["por_status"][row_status["status"] or None] = row_status["c"]
 
         stats["por_modulo"] = {}
-        for row in conn.execute("SELECT modulo, COUNT(*) as c FROM chamados GROUP BY modulo ORDER BY c DESC"):
-            stats["por_modulo"][row["modulo"] or "sem_modulo"] = row["c"]
+        for row_modulo in conn.execute(
+            "SELECT modulo, SUM(total) as c FROM estatisticas_chamados GROUP BY modulo ORDER BY c DESC"
+        ):
+            stats["por_modulo"][row_modulo["modulo"] or "sem_modulo"] = row_modulo["c"]
 
         stats["por_cidade"] = {}
-        for row in conn.execute(
-            "SELECT cidade, COUNT(*) as c FROM chamados WHERE cidade != '' GROUP BY cidade ORDER BY c DESC LIMIT 10"
+        for row_cidade in conn.execute(
+            "SELECT cidade, total as c FROM estatisticas_cidades ORDER BY total DESC LIMIT 10"
         ):
-            stats["por_cidade"][row["cidade"]] = row["c"]
-
-        resolvidos = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE resolvido_bot = 1"
-        ).fetchone()["c"]
-        total_com_feedback = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE status IN ('resolvido', 'nao_resolvido', 'resolvido_tecnico')"
-        ).fetchone()["c"]
+            stats["por_cidade"][row_cidade["cidade"]] = row_cidade["c"]
+
+        resolvidos = row["resolvidos_bot"]
+        total_com_feedback = sum(
+            stats["por_status"].get(s, 0) for s in ("resolvido", "nao_resolvido", "resolvido_tecnico")
+        )
         stats["taxa_resolucao_bot"] = round(
             (resolvidos / total_com_feedback * 100) if total_com_feedback > 0 else 0, 1
         )
 
-        stats["pendentes_tecnico"] = conn.execute(
-            "SELECT COUNT(*) as c FROM chamados WHERE status = 'pendente_tecnico'"
-        ).fetchone()["c"]
+        stats["pendentes_tecnico"] = stats["por_status"].get("pendente_tecnico", 0)
 
         stats["por_dia"] = []
-        for row in conn.execute(
-            """SELECT DATE(criado_em) as dia, COUNT(*) as c 
-               FROM chamados WHERE criado_em >= ? 
-               GROUP BY DATE(criado_em) ORDER BY dia""",
+        for row_dia in conn.execute(
+            """SELECT dia, SUM(total) as c
+               FROM estatisticas_chamados WHERE dia >= ?
+               GROUP BY dia ORDER BY dia""",
             (mes,)
         ):
-            stats["por_dia"].append({"dia": row["dia"], "total": row["c"]})
+            stats["por_dia"].append({"dia": row_dia["dia"], "total": row_dia["c"]})
 
-        stats["total_mensagens"] = conn.execute("SELECT COUNT(*) as c FROM mensagens").fetchone()["c"]
+        total_mensagens = conn.execute(
+            "SELECT valor FROM estatisticas_totais WHERE chave = 'mensagens'"
+        ).fetchone()
+        stats["total_mensagens"] = total_mensagens["valor"] if total_mensagens else 0
 
-        conn.close()
         return stats
 
     # ========================= MANUAIS =========================
 
     def registrar_manual(self, nome_arquivo, modulo, descricao, tipo, caminho):
-        conn = self._conn()
-        conn.execute(
-            "INSERT INTO manuais (nome_arquivo, modulo, descricao, tipo, caminho) VALUES (?, ?, ?, ?, ?)",
-            (nome_arquivo, modulo, descricao, tipo, caminho)
-        )
-        conn.commit()
-        conn.close()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO manuais (nome_arquivo, modulo, descricao, tipo, caminho) VALUES (?, ?, ?, ?, ?)",
+                (nome_arquivo, modulo, descricao, tipo, caminho)
+            )
+        # Busca offline passa a considerar o manual novo (so ele e extraido)
+        indice_manuais.reindexar_em_segundo_plano(modulo, self.db_path)
 
     def listar_manuais(self):
-        conn = self._conn()
-        manuais = conn.execute("SELECT * FROM manuais ORDER BY criado_em DESC").fetchall()
-        conn.close()
+        manuais = self._conn().execute("SELECT * FROM manuais ORDER BY criado_em DESC").fetchall()
         return [dict(m) for m in manuais]
 
     # ========================= LOGS =========================
 
-    def _log(self, tipo, mensagem, dados=None):
+    def _log(self, tipo, mensagem, dados=None, conn=None):
+        """
+        Registra um log. Com `conn`, entra na transacao da operacao (um commit so);
+        sem ela, grava numa transacao propria.
+        """
+        sql = "INSERT INTO logs (tipo, mensagem, dados) VALUES (?, ?, ?)"
+        params = (tipo, mensagem, json.dumps(dados or {}, ensure_ascii=False))
         try:
-            conn = self._conn()
-            conn.execute(
-                "INSERT INTO logs (tipo, mensagem, dados) VALUES (?, ?, ?)",
-                (tipo, mensagem, json.dumps(dados or {}, ensure_ascii=False))
-            )
-            conn.commit()
-            conn.close()
+            if conn is not None:
+                conn.execute(sql, params)
+                return
+            with self._conn() as conn:
+                conn.execute(sql, params)
         except Exception as e:
             print(f"Erro ao registrar log: {e}")
@@ -0,0 +1,142 @@
+"""
+Disjuntor (circuit breaker) por assistente do OpenAI.
+
+fechado     -> chamadas normais; falhas e chamadas lentas demais entram na janela.
+aberto      -> muitas falhas na janela: as chamadas nem saem, o chat responde offline na
+               hora. Fica assim por DISJUNTOR_ABERTO_S (dobrando a cada sonda que falha,
+               ate DISJUNTOR_ABERTO_MAX_S).
+meio_aberto -> vencido o prazo, UMA chamada real passa como sonda: se der certo fecha,
+               se falhar abre de novo.
+
+O estado e por processo (cada worker do gunicorn aprende sozinho, em poucas chamadas).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+
+JANELA = int(os.getenv("DISJUNTOR_JANELA", "10"))                 # ultimas chamadas consideradas
+MIN_CHAMADAS = int(os.getenv("DISJUNTOR_MIN_CHAMADAS", "4"))
+TAXA_FALHA = float(os.getenv("DISJUNTOR_TAXA_FALHA", "0.5"))
+FALHAS_SEGUIDAS = int(os.getenv("DISJUNTOR_FALHAS_SEGUIDAS", "3"))
+LENTO_S = float(os.getenv("DISJUNTOR_LENTO_S", "25"))              # acima disso conta como falha
+ABERTO_S = float(os.getenv("DISJUNTOR_ABERTO_S", "30"))
+ABERTO_MAX_S = float(os.getenv("DISJUNTOR_ABERTO_MAX_S", "300"))
+
+FECHADO, ABERTO, MEIO_ABERTO = "fechado", "aberto", "meio_aberto"
+
+
+class Disjuntor:
+    def __init__(self, nome):
+        self.nome = nome
+        self._lock = threading.Lock()
+        self._estado = FECHADO
+        self._janela = deque(maxlen=JANELA)      # (ok, duracao_s)
+        self._falhas_seguidas = 0
+        self._aberto_ate = 0
+        self._espera = ABERTO_S
+        self._sonda_em_andamento = False
+        self._sonda_desde = 0
+        self._ultima_falha = None
+        self._contadores = {"chamadas": 0, "falhas": 0, "recusadas": 0, "aberturas": 0}
+
+    def permitir(self):
+        """Pode chamar a API agora? (no meio_aberto so a sonda passa)"""
+        with self._lock:
+            if self._estado == ABERTO and time.monotonic() >= self._aberto_ate:
+                self._estado = MEIO_ABERTO
+                self._sonda_em_andamento = False
+            if self._estado == FECHADO:
+                return True
+            # Sonda sem resultado (ex.: cliente desconectou no meio do stream) nao trava o disjuntor
+            sonda_perdida = time.monotonic() - self._sonda_desde > LENTO_S * 2
+            if self._estado == MEIO_ABERTO and (not self._sonda_em_andamento or sonda_perdida):
+                self._sonda_em_andamento = True
+                self._sonda_desde = time.monotonic()
+                print(f"[INFO] Disjuntor {self.nome}: testando a API")
+                return True
+            self._contadores["recusadas"] += 1
+            return False
+
+    def desistir(self):
+        """A chamada permitida nem saiu (ex.: sem vaga no limitador): libera a sonda sem resultado"""
+        with self._lock:
+            self._sonda_em_andamento = False
+
+    def sucesso(self, duracao_s):
+        if duracao_s > LENTO_S:
+            self.falha(f"lenta ({duracao_s:.1f}s)", duracao_s)
+            return
+        with self._lock:
+            if self._estado != FECHADO:
+                print(f"[OK] Disjuntor {self.nome}: API respondeu, fechado")
+                self._estado = FECHADO
+                self._espera = ABERTO_S
+                self._janela.clear()
+            self._contadores["chamadas"] += 1
+            self._janela.append((True, duracao_s))
+            self._falhas_seguidas = 0
+            self._sonda_em_andamento = False
+
+    def falha(self, motivo="", duracao_s=None):
+        with self._lock:
+            self._contadores["chamadas"] += 1
+            self._contadores["falhas"] += 1
+            self._janela.append((False, duracao_s))
+            self._falhas_seguidas += 1
+            self._ultima_falha = motivo[:200]
+            if self._estado == MEIO_ABERTO:
+                # Sonda falhou: espera mais antes de tentar de novo
+                self._espera = min(self._espera * 2, ABERTO_MAX_S)
+                self._abrir()
+            elif self._estado == FECHADO and self._deve_abrir():
+                self._espera = ABERTO_S
+                self._abrir()
+
+    def _deve_abrir(self):
+        if self._falhas_seguidas >= FALHAS_SEGUIDAS:
+            return True
+        if len(self._janela) < MIN_CHAMADAS:
+            return False
+        falhas = sum(1 for ok, _ in self._janela if not ok)
+        return falhas / len(self._janela) >= TAXA_FALHA
+
+    def _abrir(self):
+        self._estado = ABERTO
+        self._aberto_ate = time.monotonic() + self._espera
+        self._sonda_em_andamento = False
+        self._contadores["aberturas"] += 1
+        print(f"[AVISO] Disjuntor {self.nome}: aberto por {self._espera:.0f}s ({self._ultima_falha})")
+
+    def estado(self):
+        with self._lock:
+            duracoes = sorted(d for ok, d in self._janela if ok)
+            dados = dict(self._contadores)
+            dados.update({
+                "estado": self._estado,
+                "reabre_em_s": round(max(0, self._aberto_ate - time.monotonic()), 1) if self._estado == ABERTO else 0,
+                "falhas_na_janela": sum(1 for ok, _ in self._janela if not ok),
+                "janela": len(self._janela),
+                "latencia_mediana_s": round(duracoes[len(duracoes) // 2], 2) if duracoes else None,
+                "ultima_falha": self._ultima_falha,
+            })
+        return dados
+
+
+_disjuntores = {}
+_lock = threading.Lock()
+
+
+def obter_disjuntor(nome):
+    with _lock:
+        disjuntor = _disjuntores.get(nome)
+        if disjuntor is None:
+            disjuntor = _disjuntores[nome] = Disjuntor(nome)
+        return disjuntor
+
+
+def estados():
+    """Estado de todos os disjuntores deste processo (para /health e admin)."""
+    return {nome: d.estado() for nome, d in list(_disjuntores.items())}
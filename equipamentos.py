@@ -0,0 +1,98 @@
+"""
+Registro de equipamentos e resolucao do modulo enviado pelo frontend.
+
+O registro vem de equipamentos.json (ou EQUIPAMENTOS_ARQUIVO) e e compilado uma vez num
+dict exato + trie de prefixos (vale o prefixo mais longo). Se o arquivo mudar, a proxima
+consulta depois de EQUIPAMENTOS_RECARREGAR_S recarrega sem reiniciar o gunicorn; um
+arquivo invalido e ignorado e o registro anterior continua valendo.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+ARQUIVO = os.getenv(
+    "EQUIPAMENTOS_ARQUIVO",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "equipamentos.json")
+)
+RECARREGAR_S = float(os.getenv("EQUIPAMENTOS_RECARREGAR_S", "2"))
+
+
+class Registro:
+    """Registro compilado (imutavel: uma recarga cria outro)."""
+
+    def __init__(self, equipamentos, prefixos, versao=None):
+        self.equipamentos = equipamentos
+        self.versao = versao
+        self._trie = {}
+        for prefixo, chave in prefixos.items():
+            if chave not in equipamentos:
+                raise ValueError(f"prefixo '{prefixo}' aponta para equipamento inexistente '{chave}'")
+            no = self._trie
+            for ch in prefixo.lower():
+                no = no.setdefault(ch, {})
+            no[None] = equipamentos[chave]
+
+    def resolver(self, modulo):
+        """Config do equipamento para o modulo (chave exata ou prefixo mais longo), ou None"""
+        modulo = (modulo or "").lower()
+        config = self.equipamentos.get(modulo)
+        if config is not None:
+            return config
+        no = self._trie
+        for ch in modulo:
+            no = no.get(ch)
+            if no is None:
+                break
+            config = no.get(None, config)
+        return config
+
+
+def carregar(caminho=ARQUIVO):
+    """Le e compila o arquivo. Levanta excecao se for invalido."""
+    with open(caminho, encoding="utf-8") as f:
+        dados = json.load(f)
+    equipamentos = {}
+    for chave, item in dados["equipamentos"].items():
+        equipamentos[chave.lower()] = {
+            "chave": chave.lower(),
+            "nome_completo": item["nome_completo"],
+            "assistant_id": item.get("assistant_id") or os.getenv(item.get("assistant_env", ""), ""),
+            "vector_store_id": item.get("vector_store_id") or os.getenv(item.get("vector_store_env", ""), ""),
+        }
+    return Registro(equipamentos, dados.get("prefixos", {}), versao=os.path.getmtime(caminho))
+
+
+_registro = None
+_proxima_verificacao = 0
+_lock = threading.Lock()
+
+
+def obter_registro():
+    """Registro atual, recarregado se o arquivo mudou (verifica no maximo a cada RECARREGAR_S)."""
+    global _registro, _proxima_verificacao
+    agora = time.monotonic()
+    if _registro is not None and agora < _proxima_verificacao:
+        return _registro
+    with _lock:
+        if _registro is not None and agora < _proxima_verificacao:
+            return _registro
+        _proxima_verificacao = agora + RECARREGAR_S
+        try:
+            mtime = os.path.getmtime(ARQUIVO)
+            if _registro is None or mtime != _registro.versao:
+                novo = carregar(ARQUIVO)
+                if _registro is not None:
+                    print(f"[INFO] Equipamentos recarregados ({len(novo.equipamentos)})")
+                _registro = novo
+        except Exception as e:
+            print(f"[ERRO] Registro de equipamentos ({ARQUIVO}): {e}")
+            if _registro is None:
+                _registro = Registro({}, {})
+    return _registro
+
+
+def resolver(modulo):
+    return obter_registro().resolver(modulo)
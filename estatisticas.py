@@ -0,0 +1,318 @@
+"""
+Contadores agregados dos chamados, mantidos por triggers.
+
+Em vez de COUNT(*)/GROUP BY na tabela inteira a cada abertura do painel, as estatisticas
+leem tabelas pequenas atualizadas a cada INSERT/UPDATE/DELETE:
+
+    estatisticas_chamados   dia x modulo x status -> total, resolvidos_bot, distancia
+    estatisticas_cidades    cidade -> total (so no schema que tem cidade)
+    estatisticas_totais     chave -> valor (ex.: 'mensagens')
+    estatisticas_mapa       celula de geohash x status -> total, soma das coordenadas (mapa do painel)
+    chamados.total_msgs     mensagens de cada chamado (evita COUNT correlacionado nas listagens)
+
+Funciona com os dois schemas (app.py e database.py): as colunas que nao existem
+(cidade, resolvido_bot, distancia_km, geohash) simplesmente contam zero.
+
+Reconstruir do zero e conferir com as contagens reais:
+
+    python estatisticas.py [caminho/do/banco.db] [--so-verificar]
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+
+
+TABELAS = """
+    CREATE TABLE IF NOT EXISTS estatisticas_chamados (
+        dia TEXT NOT NULL,
+        modulo TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        resolvidos_bot INTEGER NOT NULL DEFAULT 0,
+        soma_distancia REAL NOT NULL DEFAULT 0,
+        com_distancia INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (dia, modulo, status)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS estatisticas_cidades (
+        cidade TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS estatisticas_totais (
+        chave TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS estatisticas_mapa (
+        celula TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        soma_lat REAL NOT NULL DEFAULT 0,
+        soma_lon REAL NOT NULL DEFAULT 0,
+        soma_distancia REAL NOT NULL DEFAULT 0,
+        com_distancia INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (celula, status)
+    ) WITHOUT ROWID;
+"""
+
+TABELAS_AGREGADAS = ["estatisticas_chamados", "estatisticas_cidades", "estatisticas_totais", "estatisticas_mapa"]
+
+# Tamanho (caracteres de geohash) das celulas de estatisticas_mapa: ~39 x 20 km
+CELULA_MAPA = 4
+
+_TOTAL_MSGS_REAL = "(SELECT COUNT(*) FROM mensagens m WHERE m.chamado_id = chamados.id)"
+
+TRIGGERS = [
+    "estatisticas_chamados_insert", "estatisticas_chamados_update", "estatisticas_chamados_delete",
+    "estatisticas_mensagens_insert", "estatisticas_mensagens_delete",
+]
+
+
+def _colunas(conn, tabela):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _expressoes(colunas, ref):
+    """Valores de uma linha de chamados (NEW/OLD ou a propria tabela) para o agregado."""
+    prefixo = f"{ref}." if ref else ""
+    return {
+        "dia": f"COALESCE(DATE({prefixo}criado_em), '')",
+        "modulo": f"COALESCE({prefixo}modulo, '')",
+        "status": f"COALESCE({prefixo}status, '')",
+        "bot": f"({prefixo}resolvido_bot IS 1)" if "resolvido_bot" in colunas else "0",
+        "soma": f"COALESCE({prefixo}distancia_km, 0)" if "distancia_km" in colunas else "0",
+        "com": f"({prefixo}distancia_km IS NOT NULL)" if "distancia_km" in colunas else "0",
+        "cidade": f"COALESCE({prefixo}cidade, '')" if "cidade" in colunas else None,
+        "celula": f"substr({prefixo}geohash, 1, {CELULA_MAPA})" if "geohash" in colunas else None,
+        "tem_geo": f"{prefixo}geohash != ''",
+        "lat": f"{prefixo}latitude",
+        "lon": f"{prefixo}longitude",
+    }
+
+
+def _somar(e):
+    sql = f"""
+        INSERT INTO estatisticas_chamados
+            (dia, modulo, status, total, resolvidos_bot, soma_distancia, com_distancia)
+        VALUES ({e['dia']}, {e['modulo']}, {e['status']}, 1, {e['bot']}, {e['soma']}, {e['com']})
+        ON CONFLICT (dia, modulo, status) DO UPDATE SET
+            total = total + 1,
+            resolvidos_bot = resolvidos_bot + excluded.resolvidos_bot,
+            soma_distancia = soma_distancia + excluded.soma_distancia,
+            com_distancia = com_distancia + excluded.com_distancia;
+    """
+    if e["cidade"]:
+        sql += f"""
+        INSERT INTO estatisticas_cidades (cidade, total)
+        SELECT {e['cidade']}, 1 WHERE {e['cidade']} != ''
+        ON CONFLICT (cidade) DO UPDATE SET total = total + 1;
+        """
+    if e["celula"]:
+        sql += f"""
+        INSERT INTO estatisticas_mapa
+            (celula, status, total, soma_lat, soma_lon, soma_distancia, com_distancia)
+        SELECT {e['celula']}, {e['status']}, 1, {e['lat']}, {e['lon']}, {e['soma']}, {e['com']}
+        WHERE {e['tem_geo']}
+        ON CONFLICT (celula, status) DO UPDATE SET
+            total = total + 1,
+            soma_lat = soma_lat + excluded.soma_lat,
+            soma_lon = soma_lon + excluded.soma_lon,
+            soma_distancia = soma_distancia + excluded.soma_distancia,
+            com_distancia = com_distancia + excluded.com_distancia;
+        """
+    return sql
+
+
+def _subtrair(e):
+    chave = f"dia = {e['dia']} AND modulo = {e['modulo']} AND status = {e['status']}"
+    sql = f"""
+        UPDATE estatisticas_chamados SET
+            total = total - 1,
+            resolvidos_bot = resolvidos_bot - {e['bot']},
+            soma_distancia = soma_distancia - {e['soma']},
+            com_distancia = com_distancia - {e['com']}
+        WHERE {chave};
+        DELETE FROM estatisticas_chamados WHERE {chave} AND total <= 0;
+    """
+    if e["cidade"]:
+        sql += f"""
+        UPDATE estatisticas_cidades SET total = total - 1 WHERE cidade = {e['cidade']};
+        DELETE FROM estatisticas_cidades WHERE cidade = {e['cidade']} AND total <= 0;
+        """
+    if e["celula"]:
+        chave = f"{e['tem_geo']} AND celula = {e['celula']} AND status = {e['status']}"
+        sql += f"""
+        UPDATE estatisticas_mapa SET
+            total = total - 1,
+            soma_lat = soma_lat - {e['lat']},
+            soma_lon = soma_lon - {e['lon']},
+            soma_distancia = soma_distancia - {e['soma']},
+            com_distancia = com_distancia - {e['com']}
+        WHERE {chave};
+        DELETE FROM estatisticas_mapa WHERE {chave} AND total <= 0;
+        """
+    return sql
+
+
+def _criar_triggers(conn):
+    colunas = _colunas(conn, "chamados")
+    novo = _expressoes(colunas, "NEW")
+    velho = _expressoes(colunas, "OLD")
+    observadas = [c for c in ("criado_em", "modulo", "status", "resolvido_bot", "distancia_km", "cidade",
+                              "geohash", "latitude", "longitude")
+                  if c in colunas]
+    mudou = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in observadas)
+
+    for nome in TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+
+    conn.execute(f"""
+        CREATE TRIGGER estatisticas_chamados_insert AFTER INSERT ON chamados
+        BEGIN {_somar(novo)} END""")
+    conn.execute(f"""
+        CREATE TRIGGER estatisticas_chamados_update AFTER UPDATE OF {', '.join(observadas)} ON chamados
+        WHEN {mudou}
+        BEGIN {_subtrair(velho)} {_somar(novo)} END""")
+    conn.execute(f"""
+        CREATE TRIGGER estatisticas_chamados_delete AFTER DELETE ON chamados
+        BEGIN {_subtrair(velho)} END""")
+    conn.execute("""
+        CREATE TRIGGER estatisticas_mensagens_insert AFTER INSERT ON mensagens
+        BEGIN
+            INSERT INTO estatisticas_totais (chave, valor) VALUES ('mensagens', 1)
+            ON CONFLICT (chave) DO UPDATE SET valor = valor + 1;
+            UPDATE chamados SET total_msgs = total_msgs + 1 WHERE id = NEW.chamado_id;
+        END""")
+    conn.execute("""
+        CREATE TRIGGER estatisticas_mensagens_delete AFTER DELETE ON mensagens
+        BEGIN
+            UPDATE estatisticas_totais SET valor = valor - 1 WHERE chave = 'mensagens';
+            UPDATE chamados SET total_msgs = total_msgs - 1 WHERE id = OLD.chamado_id;
+        END""")
+
+
+def _agregados_reais(conn):
+    """Mesmas contagens, calculadas direto das tabelas (lento; so para reconstruir/conferir)."""
+    e = _expressoes(_colunas(conn, "chamados"), "")
+    chamados = conn.execute(f"""
+        SELECT {e['dia']}, {e['modulo']}, {e['status']}, COUNT(*), SUM({e['bot']}),
+               SUM({e['soma']}), SUM({e['com']})
+        FROM chamados GROUP BY 1, 2, 3""").fetchall()
+    cidades = conn.execute(f"""
+        SELECT {e['cidade']}, COUNT(*) FROM chamados
+        WHERE {e['cidade']} != '' GROUP BY 1""").fetchall() if e["cidade"] else []
+    mensagens = conn.execute("SELECT COUNT(*) FROM mensagens").fetchone()[0]
+    mapa = conn.execute(f"""
+        SELECT {e['celula']}, {e['status']}, COUNT(*), SUM({e['lat']}), SUM({e['lon']}),
+               SUM({e['soma']}), SUM({e['com']})
+        FROM chamados WHERE {e['tem_geo']} GROUP BY 1, 2""").fetchall() if e["celula"] else []
+    return (
+        {tuple(row)[:3]: tuple(row)[3:] for row in chamados},
+        {row[0]: (row[1],) for row in cidades},
+        {"mensagens": (mensagens,)} if mensagens else {},
+        {tuple(row)[:2]: tuple(row)[2:] for row in mapa},
+    )
+
+
+def _agregados_salvos(conn):
+    chamados = conn.execute("""
+        SELECT dia, modulo, status, total, resolvidos_bot, soma_distancia, com_distancia
+        FROM estatisticas_chamados""").fetchall()
+    cidades = conn.execute("SELECT cidade, total FROM estatisticas_cidades").fetchall()
+    totais = conn.execute("SELECT chave, valor FROM estatisticas_totais").fetchall()
+    mapa = conn.execute("""
+        SELECT celula, status, total, soma_lat, soma_lon, soma_distancia, com_distancia
+        FROM estatisticas_mapa""").fetchall()
+    return (
+        {tuple(row)[:3]: tuple(row)[3:] for row in chamados},
+        {row[0]: (row[1],) for row in cidades},
+        {row[0]: (row[1],) for row in totais if row[1]},
+        {tuple(row)[:2]: tuple(row)[2:] for row in mapa},
+    )
+
+
+def reconstruir(conn):
+    """Recalcula as tabelas de estatisticas a partir de chamados/mensagens."""
+    with conn:
+        for tabela in TABELAS_AGREGADAS:
+            conn.execute(f"DELETE FROM {tabela}")
+        chamados, cidades, totais, mapa = _agregados_reais(conn)
+        conn.executemany("""
+            INSERT INTO estatisticas_chamados
+                (dia, modulo, status, total, resolvidos_bot, soma_distancia, com_distancia)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [chave + valores for chave, valores in chamados.items()])
+        conn.executemany("INSERT INTO estatisticas_cidades (cidade, total) VALUES (?, ?)",
+                         [(chave,) + valores for chave, valores in cidades.items()])
+        conn.executemany("INSERT INTO estatisticas_totais (chave, valor) VALUES (?, ?)",
+                         [(chave,) + valores for chave, valores in totais.items()])
+        conn.executemany("""
+            INSERT INTO estatisticas_mapa
+                (celula, status, total, soma_lat, soma_lon, soma_distancia, com_distancia)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [chave + valores for chave, valores in mapa.items()])
+        conn.execute(f"UPDATE chamados SET total_msgs = {_TOTAL_MSGS_REAL}")
+
+
+def _iguais(a, b):
+    """Compara os valores agregados; somas de REAL acumulam erro de arredondamento."""
+    if a is None or b is None or len(a) != len(b):
+        return a == b
+    return all(math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-6) for x, y in zip(a, b))
+
+
+def verificar(conn):
+    """Lista de divergencias entre os contadores e as contagens reais (vazia = tudo certo)."""
+    divergencias = []
+    for nome, real, salvo in zip(TABELAS_AGREGADAS, _agregados_reais(conn), _agregados_salvos(conn)):
+        for chave in sorted(set(real) | set(salvo), key=repr):
+            if not _iguais(real.get(chave), salvo.get(chave)):
+                divergencias.append(f"{nome} {chave}: salvo={salvo.get(chave)} real={real.get(chave)}")
+    for row in conn.execute(f"""
+            SELECT id, total_msgs, {_TOTAL_MSGS_REAL} AS real FROM chamados
+            WHERE total_msgs IS NOT {_TOTAL_MSGS_REAL}"""):
+        divergencias.append(f"chamados.total_msgs {row[0]}: salvo={row[1]} real={row[2]}")
+    return divergencias
+
+
+def instalar(conn):
+    """Cria tabelas, coluna e triggers; na primeira vez, preenche a partir dos dados existentes."""
+    existentes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    existia = set(TABELAS_AGREGADAS) <= existentes
+    conn.executescript(TABELAS)
+    if "total_msgs" not in _colunas(conn, "chamados"):
+        conn.execute("ALTER TABLE chamados ADD COLUMN total_msgs INTEGER NOT NULL DEFAULT 0")
+        print("[INFO] Coluna chamados.total_msgs adicionada")
+        existia = False
+    _criar_triggers(conn)
+    conn.commit()
+    if not existia:
+        reconstruir(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("db_path", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "storopack.db"))
+    parser.add_argument("--so-verificar", action="store_true", help="nao reconstroi, so confere")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    if not args.so_verificar:
+        instalar(conn)
+        reconstruir(conn)
+        print("[OK] Estatisticas reconstruidas")
+
+    divergencias = verificar(conn)
+    for linha in divergencias:
+        print(f"[ERRO] {linha}")
+    if divergencias:
+        raise SystemExit(1)
+    print("[OK] Estatisticas conferem com as contagens reais")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Fila duravel (SQLite) para a analise de videos.
+
+/analyze-video grava o video em disco, enfileira um job e responde na hora com o id;
+um pool limitado de threads por processo executa as analises (que podem levar minutos
+no Gemini) fora do request. O cliente acompanha por GET /analyze-video/<job_id>.
+
+Varios workers do gunicorn dividem a mesma fila: cada job e reservado com um UPDATE
+atomico e um prazo (lease). Se o processo morrer no meio, o job volta para a fila quando
+o prazo vence, ate FILA_VIDEOS_TENTATIVAS vezes.
+"""
+
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+
+from conexoes import conectar
+
+
+WORKERS = int(os.getenv("FILA_VIDEOS_WORKERS", "2"))            # threads por processo
+LEASE_S = float(os.getenv("FILA_VIDEOS_LEASE_S", "900"))
+TENTATIVAS = int(os.getenv("FILA_VIDEOS_TENTATIVAS", "2"))
+INTERVALO_OCIOSO_S = float(os.getenv("FILA_VIDEOS_INTERVALO_S", "1"))
+RETENCAO_S = float(os.getenv("FILA_VIDEOS_RETENCAO_H", "168")) * 3600
+
+RESPOSTA_FALHA = (
+    "⚠️ Não foi possível analisar o vídeo automaticamente.\n\n"
+    "Por favor, descreva o problema por texto ou ligue: (11) 5677-4699"
+)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs_video (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'pendente',
+        video_path TEXT,
+        modulo TEXT,
+        descricao TEXT,
+        chamado_id TEXT,
+        hash_video TEXT,
+        resposta TEXT,
+        erro TEXT,
+        tentativas INTEGER NOT NULL DEFAULT 0,
+        dono TEXT,
+        lease_ate REAL,
+        criado_em REAL NOT NULL,
+        iniciado_em REAL,
+        concluido_em REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_video_status ON jobs_video(status, criado_em);
+"""
+
+
+class FilaVideos:
+    def __init__(self, db_path, processar, workers=WORKERS):
+        """`processar(job)` recebe o job (dict) e devolve o texto da resposta."""
+        self.db_path = db_path
+        self.processar = processar
+        self.workers = workers
+        self.pasta = os.path.join(os.path.dirname(os.path.abspath(db_path)), "videos")
+        self._cond = threading.Condition()
+        self._threads = []
+        self._pid = None
+        self._parar = False
+        self._ultima_limpeza = 0
+        with conectar(self.db_path) as conn:
+            conn.executescript(SCHEMA)
+            colunas = [row[1] for row in conn.execute("PRAGMA table_info(jobs_video)")]
+            if "hash_video" not in colunas:
+                conn.execute("ALTER TABLE jobs_video ADD COLUMN hash_video TEXT")
+
+    # ------------------------------------------------------------ API
+
+    def enfileirar(self, arquivo, modulo="", descricao="", chamado_id=None, hash_video=None):
+        """
+        Move o arquivo para a pasta da fila (rename, sem copiar, se estiver no mesmo disco)
+        e cria o job. hash_video (SHA-256 calculado no upload) vai junto para a analise.
+        Retorna o id do job.
+        """
+        os.makedirs(self.pasta, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        destino = os.path.join(self.pasta, job_id + os.path.splitext(arquivo)[1])
+        shutil.move(arquivo, destino)
+        with conectar(self.db_path) as conn:
+            conn.execute(
+                """INSERT INTO jobs_video (id, video_path, modulo, descricao, chamado_id, hash_video, criado_em)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (job_id, destino, modulo, descricao, chamado_id, hash_video, time.time())
+            )
+        self.iniciar()
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def consultar(self, job_id):
+        """Estado do job (None se nao existe), com a posicao na fila se ainda pendente."""
+        conn = conectar(self.db_path)
+        row = conn.execute("SELECT * FROM jobs_video WHERE id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = {"job_id": row["id"], "status": row["status"]}
+        if row["status"] == "pendente":
+            job["posicao"] = conn.execute(
+                "SELECT COUNT(*) FROM jobs_video WHERE status = 'pendente' AND criado_em <= ?",
+                (row["criado_em"],)
+            ).fetchone()[0]
+        if row["status"] in ("concluido", "erro"):
+            job["resposta"] = row["resposta"]
+        return job
+
+    def estatisticas(self):
+        """Profundidade da fila e tempos de espera/execucao (ultima hora)."""
+        conn = conectar(self.db_path)
+        agora = time.time()
+        por_status = {row[0]: row[1] for row in conn.execute(
+            "SELECT status, COUNT(*) FROM jobs_video GROUP BY status")}
+        mais_antigo = conn.execute(
+            "SELECT MIN(criado_em) FROM jobs_video WHERE status = 'pendente'").fetchone()[0]
+        tempos = conn.execute(
+            """SELECT COUNT(*), AVG(iniciado_em - criado_em), MAX(iniciado_em - criado_em),
+                      AVG(concluido_em - iniciado_em), MAX(concluido_em - iniciado_em)
+               FROM jobs_video WHERE status IN ('concluido', 'erro') AND concluido_em >= ?""",
+            (agora - 3600,)
+        ).fetchone()
+        return {
+            "pendentes": por_status.get("pendente", 0),
+            "executando": por_status.get("executando", 0),
+            "concluidos": por_status.get("concluido", 0),
+            "erros": por_status.get("erro", 0),
+            "espera_mais_antigo_s": round(agora - mais_antigo, 1) if mais_antigo else 0,
+            "ultima_hora": {
+                "finalizados": tempos[0],
+                "espera_media_s": round(tempos[1] or 0, 1),
+                "espera_max_s": round(tempos[2] or 0, 1),
+                "execucao_media_s": round(tempos[3] or 0, 1),
+                "execucao_max_s": round(tempos[4] or 0, 1),
+            },
+            "workers_por_processo": self.workers,
+        }
+
+    def iniciar(self):
+        """Sobe o pool deste processo (idempotente; refeito apos fork)."""
+        with self._cond:
+            if self._pid == os.getpid() and self._threads:
+                return
+            self._pid = os.getpid()
+            self._parar = False
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"fila-videos-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def encerrar(self):
+        """Para o pool e devolve para a fila os jobs que este processo estava executando."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._parar = True
+            self._cond.notify_all()
+        with conectar(self.db_path) as conn:
+            conn.execute(
+                """UPDATE jobs_video
+                   SET status = 'pendente', dono = NULL, lease_ate = NULL, tentativas = tentativas - 1
+                   WHERE status = 'executando' AND dono LIKE ?""",
+                (f"{os.getpid()}:%",)
+            )
+
+    # ------------------------------------------------------------ workers
+
+    def _reservar(self):
+        agora = time.time()
+        dono = f"{os.getpid()}:{threading.get_ident()}"
+        with conectar(self.db_path) as conn:
+            row = conn.execute(
+                """UPDATE jobs_video
+                   SET status = 'executando', dono = ?, lease_ate = ?, tentativas = tentativas + 1,
+                       iniciado_em = COALESCE(iniciado_em, ?)
+                   WHERE id = (
+                       SELECT id FROM jobs_video
+                       WHERE status = 'pendente' OR (status = 'executando' AND lease_ate < ?)
+                       ORDER BY criado_em LIMIT 1
+                   )
+                   RETURNING *""",
+                (dono, agora + LEASE_S, agora, agora)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def _finalizar(self, job, status, resposta=None, erro=None):
+        with conectar(self.db_path) as conn:
+            conn.execute(
+                """UPDATE jobs_video
+                   SET status = ?, resposta = ?, erro = ?, concluido_em = ?, dono = NULL, lease_ate = NULL
+                   WHERE id = ?""",
+                (status, resposta, erro, time.time(), job["id"])
+            )
+        try:
+            os.remove(job["video_path"])
+        except OSError:
+            pass
+
+    def _devolver(self, job, erro):
+        """Falhou, mas ainda tem tentativa: volta para a fila."""
+        with conectar(self.db_path) as conn:
+            conn.execute(
+                "UPDATE jobs_video SET status = 'pendente', erro = ?, dono = NULL, lease_ate = NULL WHERE id = ?",
+                (erro, job["id"])
+            )
+
+    def _executar(self, job):
+        if job["tentativas"] > TENTATIVAS:
+            # Processos morreram no meio deste job vezes demais
+            self._finalizar(job, "erro", erro="tentativas esgotadas", resposta=RESPOSTA_FALHA)
+            return
+        print(f"[INFO] Fila de videos: job {job['id']} (tentativa {job['tentativas']})")
+        try:
+            resposta = self.processar(job)
+            self._finalizar(job, "concluido", resposta=resposta)
+        except Exception as e:
+            print(f"[ERRO] Fila de videos: job {job['id']}: {e}")
+            traceback.print_exc()
+            if job["tentativas"] < TENTATIVAS:
+                self._devolver(job, str(e))
+            else:
+                self._finalizar(job, "erro", erro=str(e), resposta=RESPOSTA_FALHA)
+
+    def _limpar_antigos(self):
+        agora = time.time()
+        if agora - self._ultima_limpeza < 3600:
+            return
+        self._ultima_limpeza = agora
+        with conectar(self.db_path) as conn:
+            conn.execute(
+                "DELETE FROM jobs_video WHERE status IN ('concluido', 'erro') AND concluido_em < ?",
+                (agora - RETENCAO_S,)
+            )
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if self._parar or self._pid != os.getpid():
+                    return
+            try:
+                self._limpar_antigos()
+                job = self._reservar()
+            except Exception as e:
+                print(f"[ERRO] Fila de videos: {e}")
+                job = None
+            if job is None:
+                with self._cond:
+                    self._cond.wait(INTERVALO_OCIOSO_S)
+                continue
+            self._executar(job)
+
+
+_filas = {}
+_lock = threading.Lock()
+
+
+def obter_fila(db_path, processar):
+    """Instancia unica por banco."""
+    with _lock:
+        fila = _filas.get(db_path)
+        if fila is None:
+            fila = _filas[db_path] = FilaVideos(db_path, processar)
+        return fila
+
+
+def encerrar_todas():
+    """Chamado no worker_exit do gunicorn."""
+    for fila in list(_filas.values()):
+        try:
+            fila.encerrar()
+        except Exception as e:
+            print(f"[ERRO] Encerrar fila de videos: {e}")
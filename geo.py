@@ -0,0 +1,90 @@
+"""
+Geohash dos chamados, para agrupar pontos do mapa no servidor.
+
+Chamados proximos compartilham o prefixo do geohash. Assim, um indice em
+chamados(geohash) atende "tudo dentro deste retangulo" (faixas de prefixo) e
+"agrupar por celula" (substr(geohash, 1, p)) sem ler a tabela inteira.
+"""
+
+import math
+
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISAO = 9            # ~5 m; o agrupamento usa prefixos disso
+MAX_CELULAS_BUSCA = 32  # faixas de prefixo por consulta
+
+
+def codificar(lat, lon, precisao=PRECISAO):
+    """Geohash padrao (base32) de um ponto."""
+    lat_min, lat_max = -90.0, 90.0
+    lon_min, lon_max = -180.0, 180.0
+    bits = []
+    par = True
+    while len(bits) < precisao * 5:
+        if par:
+            meio = (lon_min + lon_max) / 2
+            if lon >= meio:
+                bits.append(1)
+                lon_min = meio
+            else:
+                bits.append(0)
+                lon_max = meio
+        else:
+            meio = (lat_min + lat_max) / 2
+            if lat >= meio:
+                bits.append(1)
+                lat_min = meio
+            else:
+                bits.append(0)
+                lat_max = meio
+        par = not par
+    return "".join(
+        _BASE32[int("".join(map(str, bits[i:i + 5])), 2)] for i in range(0, len(bits), 5)
+    )
+
+
+def tamanho_celula(precisao):
+    """(altura, largura) em graus de uma celula com esse numero de caracteres."""
+    bits = precisao * 5
+    bits_lon = (bits + 1) // 2
+    bits_lat = bits // 2
+    return 180.0 / (1 << bits_lat), 360.0 / (1 << bits_lon)
+
+
+def precisao_para_zoom(zoom):
+    """Celulas de ~1/4 de tile (256 px) no zoom do Leaflet: 3 no zoom 6, 7 no zoom 15."""
+    return max(1, min(PRECISAO, round(2 * (zoom + 2) / 5)))
+
+
+def _celulas(oeste, sul, leste, norte, precisao):
+    altura, largura = tamanho_celula(precisao)
+    i0 = int((sul + 90) // altura)
+    i1 = min(int((norte + 90) // altura), (1 << ((precisao * 5) // 2)) - 1)
+    j0 = int((oeste + 180) // largura)
+    j1 = min(int((leste + 180) // largura), (1 << ((precisao * 5 + 1) // 2)) - 1)
+    return [
+        codificar(-90 + (i + 0.5) * altura, -180 + (j + 0.5) * largura, precisao)
+        for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)
+    ]
+
+
+def cobrir(oeste, sul, leste, norte, max_celulas=MAX_CELULAS_BUSCA):
+    """
+    Prefixos que cobrem o retangulo, na maior precisao com no maximo `max_celulas`
+    celulas. Retangulo que cruza o antimeridiano (oeste > leste) vira dois.
+    """
+    sul, norte = max(-90.0, sul), min(90.0, norte)
+    if oeste > leste:
+        return cobrir(oeste, sul, 180.0, norte, max_celulas // 2) + \
+               cobrir(-180.0, sul, leste, norte, max_celulas // 2)
+    oeste, leste = max(-180.0, oeste), min(180.0, leste)
+
+    prefixos = [""]
+    for precisao in range(1, PRECISAO + 1):
+        altura, largura = tamanho_celula(precisao)
+        quantidade = (math.floor((norte + 90) / altura) - math.floor((sul + 90) / altura) + 1) * \
+                     (math.floor((leste + 180) / largura) - math.floor((oeste + 180) / largura) + 1)
+        if quantidade > max_celulas:
+            break
+        prefixos = _celulas(oeste, sul, leste, norte, precisao)
+    return prefixos
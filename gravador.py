@@ -0,0 +1,256 @@
+"""
+Gravacao em segundo plano (write-behind) das mensagens do chat.
+
+As rotas enfileiram INSERTs/UPDATEs e uma thread por processo grava tudo em lotes,
+num commit so a cada GRAVADOR_INTERVALO_MS. Assim varios requests (e workers) disputam
+o lock de escrita do SQLite uma vez por lote, e nao uma vez por mensagem.
+
+GRAVADOR_INTERVALO_MS=0 desliga a fila: cada escrita e gravada na hora (sincrono).
+O que precisa do ID gerado (INSERT do chamado) continua sincrono nas rotas.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+
+from conexoes import conectar
+
+
+INTERVALO_MS = int(os.getenv("GRAVADOR_INTERVALO_MS", "50"))
+MAX_LOTE = int(os.getenv("GRAVADOR_MAX_LOTE", "500"))
+# Quanto tempo insistir num lote quando o banco esta travado por outro processo
+MAX_ESPERA_LOCK_S = float(os.getenv("GRAVADOR_MAX_ESPERA_LOCK_S", "30"))
+
+
+def agora_sql():
+    """Mesmo formato do CURRENT_TIMESTAMP do SQLite (UTC), capturado na hora do request."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Gravador:
+    def __init__(self, db_path, intervalo_ms=INTERVALO_MS, max_lote=MAX_LOTE):
+        self.db_path = db_path
+        self.intervalo = intervalo_ms / 1000
+        self.max_lote = max_lote
+        self._cond = threading.Condition()
+        self._fila = []
+        self._substituiveis = {}    # chave -> posicao na fila (UPDATEs que so valem pelo ultimo)
+        self._grupos = {}           # grupo -> posicao da ultima escrita do grupo na fila
+        self._chaves_gravando = set()
+        self._thread = None
+        self._pid = None
+        self._encerrando = False
+        self._gravando = False
+        self._contadores = {"enfileiradas": 0, "gravadas": 0, "lotes": 0, "descartadas": 0, "erros": 0}
+
+    @property
+    def sincrono(self):
+        return self.intervalo <= 0
+
+    # ------------------------------------------------------------ API
+
+    def executar(self, sql, params=(), chave=None, grupo=None):
+        """
+        Enfileira uma escrita. Com `chave`, uma escrita pendente com a mesma chave e
+        substituida (ex.: atualizado_em do mesmo chamado duas vezes no mesmo lote).
+        Com `grupo`, nada e substituido: o grupo so marca as escritas para aguardar().
+        """
+        if self.sincrono or (self._encerrando and self._pid == os.getpid()):
+            with conectar(self.db_path) as conn:
+                conn.execute(sql, params)
+            return
+
+        with self._cond:
+            self._garantir_thread()
+            self._contadores["enfileiradas"] += 1
+            if chave is not None and chave in self._substituiveis:
+                self._fila[self._substituiveis[chave]] = None
+                self._contadores["descartadas"] += 1
+            if chave is not None:
+                self._substituiveis[chave] = len(self._fila)
+            if grupo is not None:
+                self._grupos[grupo] = len(self._fila)
+            self._fila.append((sql, params))
+            if len(self._fila) >= self.max_lote:
+                self._cond.notify_all()
+
+    def pendente(self, chave):
+        """Ha escrita com essa chave (ou grupo) ainda nao gravada neste processo?"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return False
+            return self._pendente(chave)
+
+    def _pendente(self, chave):
+        return chave in self._substituiveis or chave in self._grupos or chave in self._chaves_gravando
+
+    def aguardar(self, chave, timeout=None):
+        """
+        Espera so as escritas com essa chave (ou grupo) serem gravadas. Adianta o lote
+        em que elas estao, sem esperar o resto da fila.
+        """
+        if self.sincrono:
+            return True
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            while self._pendente(chave):
+                self._cond.notify_all()
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+        return True
+
+    def descarregar(self, timeout=None):
+        """Espera a fila atual ser gravada (ex.: antes de excluir um chamado)."""
+        if self.sincrono:
+            return True
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            self._cond.notify_all()
+            while self._fila or self._gravando:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return False
+                self._cond.wait(restante)
+        return True
+
+    def encerrar(self, timeout=None):
+        """Grava o que estiver pendente e para a thread (shutdown do worker)."""
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            self._encerrando = True
+            self._cond.notify_all()
+            thread = self._thread
+        thread.join(timeout)
+        with self._cond:
+            pendentes = len([op for op in self._fila if op])
+        if pendentes:
+            print(f"[AVISO] Gravador encerrado com {pendentes} escrita(s) pendente(s)")
+
+    def estatisticas(self):
+        with self._cond:
+            dados = dict(self._contadores)
+            dados["pendentes"] = len([op for op in self._fila if op]) if self._pid == os.getpid() else 0
+        dados["intervalo_ms"] = int(self.intervalo * 1000)
+        dados["media_por_lote"] = round(dados["gravadas"] / dados["lotes"], 1) if dados["lotes"] else 0
+        return dados
+
+    # ------------------------------------------------------------ thread
+
+    def _garantir_thread(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        # Processo novo (fork do gunicorn): a fila e a thread do pai nao valem aqui
+        self._pid = pid
+        self._fila = []
+        self._substituiveis = {}
+        self._grupos = {}
+        self._chaves_gravando = set()
+        self._encerrando = False
+        self._gravando = False
+        self._thread = threading.Thread(target=self._loop, name="gravador", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._fila and not self._encerrando:
+                    self._cond.wait(self.intervalo)
+                if not self._fila:
+                    if self._encerrando:
+                        return
+                    continue
+                lote = [op for op in self._fila[:self.max_lote] if op]
+                del self._fila[:self.max_lote]
+                self._chaves_gravando = {
+                    chave for marcas in (self._substituiveis, self._grupos)
+                    for chave, pos in marcas.items() if pos < self.max_lote
+                }
+                self._substituiveis = self._restantes(self._substituiveis)
+                self._grupos = self._restantes(self._grupos)
+                self._gravando = True
+
+            try:
+                self._gravar(lote)
+            finally:
+                with self._cond:
+                    self._gravando = False
+                    self._chaves_gravando = set()
+                    self._cond.notify_all()
+
+    def _restantes(self, marcas):
+        """Posicoes das marcas que ficaram na fila depois de tirar um lote"""
+        return {chave: pos - self.max_lote for chave, pos in marcas.items() if pos >= self.max_lote}
+
+    def _gravar(self, lote):
+        inicio = time.monotonic()
+        while True:
+            try:
+                with conectar(self.db_path) as conn:
+                    for sql, params in lote:
+                        conn.execute(sql, params)
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) and time.monotonic() - inicio < MAX_ESPERA_LOCK_S:
+                    time.sleep(0.05)
+                    continue
+                print(f"[ERRO] Gravador: lote de {len(lote)} falhou ({e}), gravando um a um")
+                self._gravar_um_a_um(lote)
+                return
+            except Exception as e:
+                print(f"[ERRO] Gravador: lote de {len(lote)} falhou ({e}), gravando um a um")
+                self._gravar_um_a_um(lote)
+                return
+
+        with self._cond:
+            self._contadores["gravadas"] += len(lote)
+            self._contadores["lotes"] += 1
+
+    def _gravar_um_a_um(self, lote):
+        for sql, params in lote:
+            try:
+                with conectar(self.db_path) as conn:
+                    conn.execute(sql, params)
+                with self._cond:
+                    self._contadores["gravadas"] += 1
+            except Exception as e:
+                print(f"[ERRO] Gravador: escrita perdida: {e}")
+                traceback.print_exc()
+                with self._cond:
+                    self._contadores["erros"] += 1
+
+
+_gravadores = {}
+_lock = threading.Lock()
+
+
+def obter_gravador(db_path):
+    """Instancia unica por banco (a thread de gravacao nasce no primeiro uso de cada processo)."""
+    with _lock:
+        gravador = _gravadores.get(db_path)
+        if gravador is None:
+            gravador = _gravadores[db_path] = Gravador(db_path)
+        return gravador
+
+
+def encerrar_todos(timeout=None):
+    """Drena todos os gravadores. Chamado no atexit e no worker_exit do gunicorn."""
+    for gravador in list(_gravadores.values()):
+        try:
+            gravador.encerrar(timeout)
+        except Exception as e:
+            print(f"[ERRO] Encerrar gravador: {e}")
+
+
+atexit.register(encerrar_todos)
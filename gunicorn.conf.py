@@ -0,0 +1,34 @@
+"""
+Configuracao do gunicorn (carregada automaticamente do diretorio atual).
+
+Define o tipo de worker e os ganchos; bind, workers etc. continuam vindo da linha de
+comando / ambiente (GUNICORN_CMD_ARGS, WEB_CONCURRENCY).
+"""
+
+import os
+
+
+# /chat/stream (SSE) fica aberto enquanto o assistente escreve. No worker sync cada stream
+# prende o processo inteiro e o timeout de 30s derruba as respostas longas; com gthread o
+# stream ocupa uma thread e o worker continua avisando o master que esta vivo, entao o
+# timeout so pega worker travado de verdade.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Tempo para os streams em andamento terminarem num restart (worker_exit grava a fila depois)
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+
+def worker_exit(server, worker):
+    """
+    Grava as mensagens que ainda estao na fila antes do worker morrer, devolve
+    para a fila de videos as analises que este worker estava executando e grava
+    as metricas ainda nao somadas.
+    """
+    from gravador import encerrar_todos
+    from fila_videos import encerrar_todas
+    import metricas
+    encerrar_todos(timeout=10)
+    encerrar_todas()
+    metricas.encerrar()
@@ -0,0 +1,389 @@
+"""
+Busca local (BM25) nos manuais dos equipamentos, para o modo offline.
+
+Indexacao: os manuais de cada equipamento (tabela `manuais` e pasta uploads/pdfs/<modulo>/)
+tem o texto extraido (PDF via pypdf, ou .txt), sao divididos em trechos de ~PALAVRAS_TRECHO
+palavras e viram um indice invertido num arquivo so por equipamento
+(data/indice_manuais/<chave>.idx), trocado atomicamente a cada reindexacao.
+
+Layout do arquivo (inteiros uint32 little-endian, alinhados em 4 bytes):
+
+    MAGICO | tamanho do cabecalho | cabecalho JSON (vocabulario termo -> [inicio, df],
+    arquivos, fontes dos trechos, media de tamanho) | docs[P] | tfs[P] | tamanhos[N] |
+    offsets_texto[N+1] | textos utf-8
+
+A busca abre o arquivo com mmap e le as listas de postings como memoryview, sem copiar
+(numa maquina big-endian elas sao copiadas e convertidas); so o vocabulario fica em
+memoria. O texto extraido de cada arquivo fica guardado em data/indice_manuais/textos/,
+entao incluir um manual so extrai o arquivo novo.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+
+from cache_respostas import normalizar_pergunta
+from equipamentos import resolver
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDICE_DIR = os.getenv("INDICE_MANUAIS_DIR", os.path.join(BASE_DIR, "data", "indice_manuais"))
+PDFS_DIR = os.path.join(BASE_DIR, "uploads", "pdfs")
+DB_PATH = os.path.join(BASE_DIR, "data", "storopack.db")
+
+ATIVO = os.getenv("INDICE_MANUAIS", "1") != "0"
+PALAVRAS_TRECHO = int(os.getenv("INDICE_PALAVRAS_TRECHO", "80"))
+SOBREPOSICAO = int(os.getenv("INDICE_SOBREPOSICAO", "20"))
+K1, B = 1.2, 0.75
+
+MAGICO = b"BM25IDX1"
+# O arquivo e sempre little-endian, como o tamanho do cabecalho (struct "<I")
+LITTLE_ENDIAN = sys.byteorder == "little"
+EXTENSOES = (".pdf", ".txt", ".md")
+
+STOPWORDS = set("""
+a ao aos as com como da das de do dos e em entre esta este isso isto ja mais mas me meu
+minha na nas nao no nos o os ou para pela pelas pelo pelos por qual quando que se sem ser
+seu sua tem um uma umas uns vai voce esta estao foi sao the and of to
+""".split())
+
+
+def termos(texto):
+    """Texto -> termos do indice (normalizado como o cache, sem stopwords, plural simples)"""
+    saida = []
+    for palavra in normalizar_pergunta(texto).split():
+        if palavra in STOPWORDS or (len(palavra) < 2 and not palavra.isdigit()):
+            continue
+        if len(palavra) > 4 and palavra.endswith("s"):
+            palavra = palavra[:-1]
+        saida.append(palavra)
+    return saida
+
+
+def chave_modulo(modulo):
+    """Mesmo equipamento para os apelidos do frontend (airmove1, paper...)"""
+    config = resolver(modulo)
+    return config["chave"] if config else (modulo or "").lower()
+
+
+# ============================ EXTRACAO ============================
+
+def _extrair(caminho):
+    """[(pagina, texto)] do arquivo"""
+    if caminho.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"[AVISO] pypdf nao instalado, manual ignorado: {caminho}")
+            return []
+        leitor = PdfReader(caminho)
+        return [(i + 1, pagina.extract_text() or "") for i, pagina in enumerate(leitor.pages)]
+    with open(caminho, encoding="utf-8", errors="replace") as f:
+        return [(1, f.read())]
+
+
+def _paginas(caminho):
+    """Texto do arquivo, reaproveitando a extracao anterior se o arquivo nao mudou"""
+    info = os.stat(caminho)
+    base = f"{os.path.abspath(caminho)}|{info.st_mtime_ns}|{info.st_size}"
+    guardado = os.path.join(INDICE_DIR, "textos", hashlib.sha1(base.encode("utf-8")).hexdigest() + ".json")
+    if os.path.exists(guardado):
+        with open(guardado, encoding="utf-8") as f:
+            return json.load(f)
+    paginas = _extrair(caminho)
+    os.makedirs(os.path.dirname(guardado), exist_ok=True)
+    with open(guardado + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(paginas, f, ensure_ascii=False)
+    os.replace(guardado + ".tmp", guardado)
+    return paginas
+
+
+def _trechos(texto):
+    """Janelas de PALAVRAS_TRECHO palavras com SOBREPOSICAO entre vizinhas"""
+    palavras = texto.split()
+    passo = max(PALAVRAS_TRECHO - SOBREPOSICAO, 1)
+    for inicio in range(0, max(len(palavras) - SOBREPOSICAO, 1), passo):
+        trecho = " ".join(palavras[inicio:inicio + PALAVRAS_TRECHO])
+        if trecho:
+            yield trecho
+
+
+def arquivos_do_modulo(chave, db_path=DB_PATH):
+    """Manuais registrados na tabela `manuais` e os que estao em uploads/pdfs/<chave>/"""
+    arquivos = []
+    if os.path.exists(db_path):
+        from conexoes import conectar
+        try:
+            for row in conectar(db_path).execute("SELECT modulo, caminho FROM manuais WHERE caminho IS NOT NULL"):
+                if chave_modulo(row["modulo"]) == chave:
+                    arquivos.append(row["caminho"])
+        except Exception as e:
+            print(f"[AVISO] Tabela de manuais: {e}")
+    pasta = os.path.join(PDFS_DIR, chave)
+    if os.path.isdir(pasta):
+        arquivos += [os.path.join(pasta, nome) for nome in sorted(os.listdir(pasta))]
+    unicos = {}
+    for caminho in arquivos:
+        if caminho.lower().endswith(EXTENSOES) and os.path.isfile(caminho):
+            unicos.setdefault(os.path.abspath(caminho), caminho)
+    return list(unicos.values())
+
+
+def resumo(texto, pergunta, limite=400):
+    """Pedaco do trecho em volta das frases que mais citam os termos da pergunta"""
+    if len(texto) <= limite:
+        return texto
+    procurados = set(termos(pergunta))
+    frases = [f.strip() for f in re.split(r"(?<=[.!?;])\s+", texto) if f.strip()]
+    pontos = [len(procurados.intersection(termos(f))) for f in frases]
+    melhor = max(range(len(frases)), key=lambda i: pontos[i])
+    inicio = fim = melhor
+    # Cresce para os lados enquanto couber
+    while True:
+        tamanho = sum(len(f) + 1 for f in frases[inicio:fim + 1])
+        if fim + 1 < len(frases) and tamanho + len(frases[fim + 1]) <= limite:
+            fim += 1
+        elif inicio > 0 and tamanho + len(frases[inicio - 1]) <= limite:
+            inicio -= 1
+        else:
+            break
+    recorte = " ".join(frases[inicio:fim + 1])
+    cortado = len(recorte) > limite
+    if cortado:
+        recorte = recorte[:limite].rsplit(" ", 1)[0]
+    if cortado or fim < len(frases) - 1:
+        recorte = recorte.rstrip(".") + "..."
+    return ("..." if inicio > 0 else "") + recorte
+
+
+# ============================ INDEXACAO ============================
+
+def _caminho_indice(chave):
+    return os.path.join(INDICE_DIR, f"{chave}.idx")
+
+
+def construir(chave, arquivos):
+    """Extrai, divide e grava o indice do equipamento. Retorna o numero de trechos."""
+    textos, fontes, tamanhos = [], [], []
+    postings = {}
+    nomes = [os.path.basename(a) for a in arquivos]
+    for i, caminho in enumerate(arquivos):
+        try:
+            paginas = _paginas(caminho)
+        except Exception as e:
+            print(f"[ERRO] Extrair texto de {caminho}: {e}")
+            continue
+        for pagina, texto in paginas:
+            for trecho in _trechos(texto):
+                doc = len(textos)
+                contagem = {}
+                for termo in termos(trecho):
+                    contagem[termo] = contagem.get(termo, 0) + 1
+                if not contagem:
+                    continue
+                for termo, tf in contagem.items():
+                    postings.setdefault(termo, []).append((doc, tf))
+                textos.append(trecho)
+                fontes.append([i, pagina])
+                tamanhos.append(sum(contagem.values()))
+
+    docs, tfs = array("I"), array("I")
+    vocabulario = {}
+    for termo in sorted(postings):
+        lista = postings[termo]
+        vocabulario[termo] = [len(docs), len(lista)]
+        for doc, tf in lista:
+            docs.append(doc)
+            tfs.append(tf)
+
+    blob = bytearray()
+    offsets = array("I", [0])
+    for trecho in textos:
+        blob += trecho.encode("utf-8")
+        offsets.append(len(blob))
+
+    cabecalho = json.dumps({
+        "chave": chave,
+        "criado_em": time.time(),
+        "trechos": len(textos),
+        "postings": len(docs),
+        "media_tamanho": sum(tamanhos) / len(tamanhos) if tamanhos else 0,
+        "arquivos": nomes,
+        "fontes": fontes,
+        "vocabulario": vocabulario,
+    }, ensure_ascii=False).encode("utf-8")
+    cabecalho += b" " * (-(len(MAGICO) + 4 + len(cabecalho)) % 4)
+
+    os.makedirs(INDICE_DIR, exist_ok=True)
+    destino = _caminho_indice(chave)
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(MAGICO)
+        f.write(struct.pack("<I", len(cabecalho)))
+        f.write(cabecalho)
+        for dados in (docs, tfs, array("I", tamanhos), offsets):
+            f.write(_uint32_le(dados))
+        f.write(blob)
+    os.replace(temporario, destino)
+    return len(textos)
+
+
+def _uint32_le(valores):
+    """array("I") -> bytes little-endian"""
+    if not LITTLE_ENDIAN:
+        valores = array("I", valores)
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def _ler_uint32_le(visao):
+    """Bytes little-endian -> sequencia de uint32 (sem copiar na maquina little-endian)"""
+    if LITTLE_ENDIAN:
+        return visao.cast("I")
+    valores = array("I", bytes(visao))
+    valores.byteswap()
+    return valores
+
+
+_lock_reindexar = threading.Lock()
+
+
+def reindexar(modulo, db_path=DB_PATH):
+    """Reconstroi o indice de um equipamento (so extrai os arquivos novos ou alterados)."""
+    chave = chave_modulo(modulo)
+    with _lock_reindexar:
+        inicio = time.monotonic()
+        arquivos = arquivos_do_modulo(chave, db_path)
+        total = construir(chave, arquivos)
+    print(f"[OK] Indice de manuais de {chave}: {len(arquivos)} arquivo(s), {total} trechos "
+          f"em {time.monotonic() - inicio:.1f}s")
+    return total
+
+
+def reindexar_em_segundo_plano(modulo, db_path=DB_PATH):
+    """Para chamar depois de registrar um manual sem segurar o request"""
+    if not ATIVO:
+        return
+
+    def rodar():
+        try:
+            reindexar(modulo, db_path)
+        except Exception as e:
+            print(f"[ERRO] Reindexar manuais de {modulo}: {e}")
+
+    threading.Thread(target=rodar, name="reindexar-manuais", daemon=True).start()
+
+
+# ============================ BUSCA ============================
+
+class Indice:
+    """Indice de um equipamento aberto com mmap (somente leitura)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.versao = os.path.getmtime(caminho)
+        with open(caminho, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGICO)] != MAGICO:
+            raise ValueError(f"arquivo de indice invalido: {caminho}")
+        tamanho_cabecalho = struct.unpack_from("<I", self._mmap, len(MAGICO))[0]
+        pos = len(MAGICO) + 4
+        meta = json.loads(bytes(self._mmap[pos:pos + tamanho_cabecalho]))
+        pos += tamanho_cabecalho
+
+        self.chave = meta["chave"]
+        self.arquivos = meta["arquivos"]
+        self.fontes = meta["fontes"]
+        self.vocabulario = meta["vocabulario"]
+        self.total = meta["trechos"]
+        media = meta["media_tamanho"] or 1
+
+        visao = memoryview(self._mmap)
+        secoes = []
+        for quantidade in (meta["postings"], meta["postings"], self.total, self.total + 1):
+            secoes.append(_ler_uint32_le(visao[pos:pos + quantidade * 4]))
+            pos += quantidade * 4
+        self._docs, self._tfs, tamanhos, self._offsets = secoes
+        self._inicio_textos = pos
+        # Parte do denominador do BM25 que so depende do tamanho do trecho
+        self._norma = array("d", (K1 * (1 - B + B * t / media) for t in tamanhos))
+
+    def texto(self, doc):
+        inicio = self._inicio_textos + self._offsets[doc]
+        fim = self._inicio_textos + self._offsets[doc + 1]
+        return self._mmap[inicio:fim].decode("utf-8")
+
+    def buscar(self, pergunta, limite=3):
+        """[(pontuacao, doc)] dos trechos mais relevantes"""
+        pontos = {}
+        norma = self._norma
+        for termo in set(termos(pergunta)):
+            posicao = self.vocabulario.get(termo)
+            if posicao is None:
+                continue
+            inicio, df = posicao
+            idf = math.log(1 + (self.total - df + 0.5) / (df + 0.5))
+            fator = idf * (K1 + 1)
+            for doc, tf in zip(self._docs[inicio:inicio + df], self._tfs[inicio:inicio + df]):
+                pontos[doc] = pontos.get(doc, 0.0) + fator * tf / (tf + norma[doc])
+        return heapq.nlargest(limite, ((p, d) for d, p in pontos.items()))
+
+
+_indices = {}
+_proxima_verificacao = {}
+_lock = threading.Lock()
+
+
+def obter_indice(modulo):
+    """Indice do equipamento (reaberto se o arquivo foi trocado), ou None se nao existe"""
+    chave = chave_modulo(modulo)
+    agora = time.monotonic()
+    if agora < _proxima_verificacao.get(chave, 0):
+        return _indices.get(chave)
+    with _lock:
+        _proxima_verificacao[chave] = agora + 2
+        caminho = _caminho_indice(chave)
+        try:
+            atual = _indices.get(chave)
+            if not os.path.exists(caminho):
+                _indices.pop(chave, None)
+            elif atual is None or os.path.getmtime(caminho) != atual.versao:
+                _indices[chave] = Indice(caminho)
+        except Exception as e:
+            print(f"[ERRO] Abrir indice de manuais ({chave}): {e}")
+        return _indices.get(chave)
+
+
+def buscar_trechos(pergunta, modulo, limite=3):
+    """Trechos do manual mais relevantes: [{texto, arquivo, pagina, pontuacao}]"""
+    if not ATIVO:
+        return []
+    indice = obter_indice(modulo)
+    if indice is None:
+        return []
+    resultados = []
+    for pontuacao, doc in indice.buscar(pergunta, limite):
+        arquivo, pagina = indice.fontes[doc]
+        resultados.append({
+            "texto": indice.texto(doc),
+            "arquivo": indice.arquivos[arquivo],
+            "pagina": pagina,
+            "pontuacao": round(pontuacao, 3),
+        })
+    return resultados
+
+
+if __name__ == "__main__":
+    # python indice_manuais.py [modulo ...]   (sem argumentos: todos os equipamentos)
+    from equipamentos import obter_registro
+    for modulo in sys.argv[1:] or list(obter_registro().equipamentos):
+        reindexar(modulo)
@@ -0,0 +1,240 @@
+"""
+Controle de admissao do chat.
+
+- Balde de tokens por session_id e por IP: cada mensagem gasta um token; o balde enche a
+  LIMITE_*_POR_MIN por minuto ate LIMITE_*_RAJADA. Sem token, o request recebe 429 com
+  Retry-After na hora.
+- Vagas globais para runs do assistente (LIMITE_EXECUCOES ao mesmo tempo, somando
+  todos os workers). So o run ocupa vaga (cache, carona e offline nao): o assistente.py
+  reserva antes de criar o run e devolve quando ele termina, inclusive em segundo plano.
+  Sem vaga, espera numa fila limitada (LIMITE_FILA por processo, ate LIMITE_ESPERA_S);
+  se nao couber ou nao der tempo, Sobrecarga.
+
+O estado fica em SQLite (data/limitador.db) para valer entre os workers do gunicorn.
+As vagas tem prazo (lease): se o worker morrer segurando uma, ela volta sozinha. Run
+longo (stream, segundo plano) renova o lease com Vaga.manter().
+"""
+
+import math
+import os
+import threading
+import time
+import uuid
+
+from conexoes import conectar
+
+
+LIMITADOR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'limitador.db')
+
+ATIVO = os.getenv("LIMITADOR", "1") != "0"
+SESSAO_POR_MIN = float(os.getenv("LIMITE_SESSAO_POR_MIN", "12"))
+SESSAO_RAJADA = float(os.getenv("LIMITE_SESSAO_RAJADA", "5"))
+IP_POR_MIN = float(os.getenv("LIMITE_IP_POR_MIN", "60"))
+IP_RAJADA = float(os.getenv("LIMITE_IP_RAJADA", "20"))
+MAX_EXECUCOES = int(os.getenv("LIMITE_EXECUCOES", "4"))
+MAX_NA_FILA = int(os.getenv("LIMITE_FILA", "8"))
+ESPERA_MAX_S = float(os.getenv("LIMITE_ESPERA_S", "10"))
+LEASE_S = float(os.getenv("LIMITE_LEASE_S", "120"))
+
+# Baldes parados ha mais que isso estao cheios de novo: podem ser apagados
+_BALDE_OCIOSO_S = 3600
+
+
+class Sobrecarga(Exception):
+    """Request recusado; `retry_after` em segundos."""
+
+    def __init__(self, motivo, retry_after):
+        super().__init__(motivo)
+        self.motivo = motivo
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Limitador:
+    def __init__(self, db_path=None):
+        self.db_path = db_path or LIMITADOR_PATH
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._na_fila = 0
+        self._ultima_limpeza = 0
+        self._contadores = {"admitidos": 0, "recusados_taxa": 0, "recusados_fila": 0, "esperaram": 0}
+        conn = conectar(self.db_path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS baldes (
+                chave TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                atualizado REAL NOT NULL
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS execucoes (
+                token TEXT PRIMARY KEY,
+                expira REAL NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        conn.commit()
+
+    # ------------------------------------------------------------ baldes
+
+    def consumir(self, chave, por_min, rajada):
+        """Gasta um token do balde. Retorna 0 se admitido ou os segundos ate o proximo token."""
+        taxa = por_min / 60
+        agora = time.time()
+        with conectar(self.db_path) as conn:
+            row = conn.execute(
+                """INSERT INTO baldes (chave, tokens, atualizado) VALUES (:chave, :rajada - 1, :agora)
+                   ON CONFLICT(chave) DO UPDATE SET
+                       tokens = MIN(:rajada, tokens + (:agora - atualizado) * :taxa) - 1,
+                       atualizado = :agora
+                   WHERE MIN(:rajada, tokens + (:agora - atualizado) * :taxa) >= 1
+                   RETURNING tokens""",
+                {"chave": chave, "rajada": rajada, "agora": agora, "taxa": taxa}
+            ).fetchone()
+            if row is not None:
+                return 0
+            atual = conn.execute(
+                "SELECT MIN(?, tokens + (? - atualizado) * ?) FROM baldes WHERE chave = ?",
+                (rajada, agora, taxa, chave)
+            ).fetchone()[0]
+        return (1 - atual) / taxa if taxa > 0 else ESPERA_MAX_S
+
+    def admitir(self, session_id=None, ip=None):
+        """Confere os baldes da sessao e do IP; levanta Sobrecarga se algum estiver vazio."""
+        if not ATIVO:
+            return
+        self._limpar_ociosos()
+        for chave, por_min, rajada in (
+            (session_id and f"s:{session_id}", SESSAO_POR_MIN, SESSAO_RAJADA),
+            (ip and f"ip:{ip}", IP_POR_MIN, IP_RAJADA),
+        ):
+            if not chave:
+                continue
+            espera = self.consumir(chave, por_min, rajada)
+            if espera:
+                with self._lock:
+                    self._contadores["recusados_taxa"] += 1
+                raise Sobrecarga("muitas mensagens seguidas", espera)
+        with self._lock:
+            self._contadores["admitidos"] += 1
+
+    # ------------------------------------------------------------ vagas
+
+    def _tentar_vaga(self, token):
+        agora = time.time()
+        with conectar(self.db_path) as conn:
+            cur = conn.execute(
+                """INSERT INTO execucoes (token, expira)
+                   SELECT ?, ? WHERE (SELECT COUNT(*) FROM execucoes WHERE expira > ?) < ?""",
+                (token, agora + LEASE_S, agora, MAX_EXECUCOES)
+            )
+            return cur.rowcount == 1
+
+    def reservar_execucao(self, espera_s=None):
+        """
+        Reserva uma vaga global, esperando na fila se preciso (ate espera_s, no maximo
+        LIMITE_ESPERA_S). Retorna o token da vaga (devolver com liberar_execucao) ou
+        levanta Sobrecarga.
+        """
+        if not ATIVO:
+            return None
+        token = uuid.uuid4().hex
+        if self._tentar_vaga(token):
+            return token
+
+        with self._lock:
+            if self._na_fila >= MAX_NA_FILA:
+                self._contadores["recusados_fila"] += 1
+                raise Sobrecarga("fila do assistente cheia", ESPERA_MAX_S)
+            self._na_fila += 1
+            self._contadores["esperaram"] += 1
+        try:
+            limite = time.monotonic() + (ESPERA_MAX_S if espera_s is None else min(espera_s, ESPERA_MAX_S))
+            pausa = 0.02
+            while time.monotonic() < limite:
+                time.sleep(pausa)
+                if self._tentar_vaga(token):
+                    return token
+                pausa = min(pausa * 2, 0.25)
+        finally:
+            with self._lock:
+                self._na_fila -= 1
+        with self._lock:
+            self._contadores["recusados_fila"] += 1
+        raise Sobrecarga("assistente ocupado", ESPERA_MAX_S)
+
+    def renovar_execucao(self, token):
+        """Estende o lease da vaga (run que passa de LIMITE_LEASE_S)"""
+        if not token:
+            return
+        try:
+            with conectar(self.db_path) as conn:
+                conn.execute("UPDATE execucoes SET expira = ? WHERE token = ?", (time.time() + LEASE_S, token))
+        except Exception as e:
+            print(f"[AVISO] Renovar vaga do assistente: {e}")
+
+    def vaga(self, espera_s=None):
+        """reservar_execucao embrulhado em Vaga (manter/liberar)"""
+        return Vaga(self, self.reservar_execucao(espera_s))
+
+    def liberar_execucao(self, token):
+        if not token:
+            return
+        try:
+            with conectar(self.db_path) as conn:
+                conn.execute("DELETE FROM execucoes WHERE token = ?", (token,))
+        except Exception as e:
+            print(f"[ERRO] Liberar vaga do assistente: {e}")
+
+    # ------------------------------------------------------------ manutencao
+
+    def _limpar_ociosos(self):
+        agora = time.time()
+        if agora - self._ultima_limpeza < 300:
+            return
+        self._ultima_limpeza = agora
+        with conectar(self.db_path) as conn:
+            conn.execute("DELETE FROM baldes WHERE atualizado < ?", (agora - _BALDE_OCIOSO_S,))
+            conn.execute("DELETE FROM execucoes WHERE expira < ?", (agora,))
+
+    def estatisticas(self):
+        conn = conectar(self.db_path)
+        em_execucao = conn.execute(
+            "SELECT COUNT(*) FROM execucoes WHERE expira > ?", (time.time(),)).fetchone()[0]
+        with self._lock:
+            dados = dict(self._contadores)
+            dados["na_fila_neste_processo"] = self._na_fila
+        dados.update({
+            "ativo": ATIVO,
+            "em_execucao": em_execucao,
+            "max_execucoes": MAX_EXECUCOES,
+            "sessao_por_min": SESSAO_POR_MIN,
+            "ip_por_min": IP_POR_MIN,
+        })
+        return dados
+
+
+class Vaga:
+    """Vaga de um run: manter() renova o lease antes de vencer, liberar() devolve (uma vez)."""
+
+    def __init__(self, limitador, token):
+        self.limitador = limitador
+        self.token = token
+        self._renovada = time.monotonic()
+
+    def manter(self):
+        if self.token and time.monotonic() - self._renovada > LEASE_S / 3:
+            self._renovada = time.monotonic()
+            self.limitador.renovar_execucao(self.token)
+
+    def liberar(self):
+        token, self.token = self.token, None
+        self.limitador.liberar_execucao(token)
+
+
+_limitador = None
+
+
+def obter_limitador():
+    """Instancia unica por processo (criada no primeiro uso)."""
+    global _limitador
+    if _limitador is None:
+        _limitador = Limitador()
+    return _limitador
@@ -0,0 +1,293 @@
+"""
+Tempo de cada etapa do chat, em histogramas no formato do Prometheus (/metrics).
+
+Cada request do chat abre uma medicao (iniciar) e as etapas somam seu tempo nela
+(etapa / somar). No fim (concluir) cada etapa vira uma observacao do histograma
+storopack_chat_etapa_segundos{rota, etapa, equipamento, resultado}, mais a etapa "total".
+
+Etapas: banco, equipamento, limitador, thread_criar, mensagem_criar, run_fila, run_execucao,
+mensagens_listar, pos_processamento, offline, primeiro_trecho (stream) e total.
+Resultados: api, cache, carona, rapida, offline, fallback, prazo, invalido, recusado, erro.
+
+Cada processo acumula as contagens em memoria e uma thread soma os incrementos em
+data/metricas.db a cada METRICAS_INTERVALO_S. Assim o /metrics de qualquer worker do
+gunicorn mostra o total de todos (um worker que morre perde no maximo esse intervalo).
+Fora de uma medicao (ex.: run em segundo plano) etapa/somar nao fazem nada.
+"""
+
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from conexoes import conectar
+
+
+METRICAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'metricas.db')
+
+INTERVALO_S = float(os.getenv("METRICAS_INTERVALO_S", "10"))
+# Limites (segundos) dos baldes: de SQLite (ms) ate runs lentos do assistente
+LIMITES = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+HISTOGRAMA_CHAT = "storopack_chat_etapa_segundos"
+_AJUDA = {HISTOGRAMA_CHAT: "Duracao de cada etapa das mensagens do chat"}
+
+
+def _valor_rotulo(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def rotulos_texto(rotulos):
+    """{'a': 1, 'b': 'x'} -> 'a="1",b="x"' (ordem das chaves)"""
+    return ",".join(f'{nome}="{_valor_rotulo(valor)}"' for nome, valor in sorted(rotulos.items()))
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def formatar(nome, tipo, ajuda, amostras):
+    """Bloco do formato texto do Prometheus; amostras = [(rotulos_dict, valor)]"""
+    linhas = [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+    for rotulos, valor in amostras:
+        texto = rotulos_texto(rotulos)
+        linhas.append(f"{nome}{{{texto}}} {_numero(valor)}" if texto else f"{nome} {_numero(valor)}")
+    return "\n".join(linhas) + "\n"
+
+
+# ============================ MEDICAO POR REQUEST ============================
+
+_atual = threading.local()
+
+
+class Medicao:
+    """Tempos das etapas de um request do chat (soma quando a etapa se repete)."""
+
+    def __init__(self, rota):
+        self.rota = rota
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+        self.rotulos = {"equipamento": "nenhum", "resultado": "erro"}
+        self.concluida = False
+
+    def somar(self, etapa, segundos):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+
+    def retomar(self):
+        """Volta a ser a medicao da thread (ex.: no gerador do stream)"""
+        _atual.medicao = self
+
+    def concluir(self, **rotulos):
+        """Registra as etapas e o total nos histogramas (so na primeira vez)"""
+        if getattr(_atual, "medicao", None) is self:
+            _atual.medicao = None
+        if self.concluida:
+            return
+        self.concluida = True
+        self.rotulos.update(rotulos)
+        self.etapas["total"] = time.perf_counter() - self.inicio
+        metricas = obter_metricas()
+        for etapa, segundos in self.etapas.items():
+            metricas.observar(HISTOGRAMA_CHAT, dict(self.rotulos, rota=self.rota, etapa=etapa), segundos)
+
+
+def iniciar(rota):
+    """Abre a medicao do request atual (substitui alguma esquecida na thread)"""
+    medicao = _atual.medicao = Medicao(rota)
+    return medicao
+
+
+def suspender():
+    """Solta a medicao da thread sem registrar (continua depois com retomar)"""
+    _atual.medicao = None
+
+
+def atual():
+    return getattr(_atual, "medicao", None)
+
+
+def anotar(**rotulos):
+    """Rotulos da medicao atual (equipamento, resultado); o ultimo valor vale"""
+    medicao = atual()
+    if medicao is not None:
+        medicao.rotulos.update(rotulos)
+
+
+def somar(etapa, segundos):
+    medicao = atual()
+    if medicao is not None:
+        medicao.somar(etapa, segundos)
+
+
+@contextmanager
+def etapa(nome):
+    """Soma o tempo do bloco na etapa (tambem serve de decorador)"""
+    medicao = atual()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.somar(nome, time.perf_counter() - inicio)
+
+
+# ============================ HISTOGRAMAS ENTRE WORKERS ============================
+
+class Metricas:
+    def __init__(self, db_path=None, intervalo_s=INTERVALO_S):
+        self.db_path = db_path or METRICAS_PATH
+        self.intervalo = intervalo_s
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._pendentes = {}        # (nome, rotulos) -> [contagem por balde..., soma]
+        self._thread = None
+        self._pid = None
+        conn = conectar(self.db_path)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS baldes (
+                nome TEXT NOT NULL,
+                rotulos TEXT NOT NULL,
+                limite REAL NOT NULL,
+                contagem INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (nome, rotulos, limite)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS somas (
+                nome TEXT NOT NULL,
+                rotulos TEXT NOT NULL,
+                soma REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (nome, rotulos)
+            ) WITHOUT ROWID;
+        """)
+        conn.commit()
+
+    def observar(self, nome, rotulos, valor):
+        chave = (nome, rotulos_texto(rotulos))
+        with self._lock:
+            self._garantir_thread()
+            contagens = self._pendentes.get(chave)
+            if contagens is None:
+                contagens = self._pendentes[chave] = [0] * (len(LIMITES) + 1) + [0.0]
+            contagens[bisect.bisect_left(LIMITES, valor)] += 1
+            contagens[-1] += valor
+
+    def descarregar(self):
+        """Soma no banco o que este processo observou desde a ultima vez"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pendentes = {}
+            pendentes, self._pendentes = self._pendentes, {}
+        if not pendentes:
+            return
+        baldes, somas = [], []
+        for (nome, rotulos), contagens in pendentes.items():
+            for limite, contagem in zip(LIMITES + (float("inf"),), contagens):
+                if contagem:
+                    baldes.append((nome, rotulos, limite, contagem))
+            somas.append((nome, rotulos, contagens[-1]))
+        try:
+            with conectar(self.db_path) as conn:
+                conn.executemany(
+                    """INSERT INTO baldes (nome, rotulos, limite, contagem) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(nome, rotulos, limite) DO UPDATE SET contagem = contagem + excluded.contagem""",
+                    baldes)
+                conn.executemany(
+                    """INSERT INTO somas (nome, rotulos, soma) VALUES (?, ?, ?)
+                       ON CONFLICT(nome, rotulos) DO UPDATE SET soma = soma + excluded.soma""",
+                    somas)
+        except Exception as e:
+            print(f"[AVISO] Metricas: nao foi possivel gravar ({e}), tentando de novo depois")
+            with self._lock:
+                for chave, contagens in pendentes.items():
+                    atuais = self._pendentes.setdefault(chave, [0] * (len(LIMITES) + 1) + [0.0])
+                    for i, valor in enumerate(contagens):
+                        atuais[i] += valor
+
+    def exportar(self):
+        """Histogramas de todos os workers no formato texto do Prometheus"""
+        self.descarregar()
+        conn = conectar(self.db_path)
+        somas = {(row["nome"], row["rotulos"]): row["soma"]
+                 for row in conn.execute("SELECT nome, rotulos, soma FROM somas")}
+        series = {}
+        for row in conn.execute("SELECT nome, rotulos, limite, contagem FROM baldes ORDER BY nome, rotulos, limite"):
+            series.setdefault((row["nome"], row["rotulos"]), []).append((row["limite"], row["contagem"]))
+
+        blocos = []
+        for nome in sorted({nome for nome, _ in series}):
+            linhas = [f"# HELP {nome} {_AJUDA.get(nome, nome)}", f"# TYPE {nome} histogram"]
+            for (serie, rotulos), contagens in sorted(series.items()):
+                if serie != nome:
+                    continue
+                prefixo = rotulos + "," if rotulos else ""
+                acumulado = 0
+                existentes = dict(contagens)
+                for limite in LIMITES:
+                    acumulado += existentes.pop(limite, 0)
+                    linhas.append(f'{nome}_bucket{{{prefixo}le="{_numero(float(limite))}"}} {acumulado}')
+                # Limites antigos (se LIMITES mudou) entram so no +Inf
+                acumulado += sum(existentes.values())
+                linhas.append(f'{nome}_bucket{{{prefixo}le="+Inf"}} {acumulado}')
+                linhas.append(f"{nome}_sum{{{rotulos}}} {_numero(somas.get((nome, rotulos), 0.0))}")
+                linhas.append(f"{nome}_count{{{rotulos}}} {acumulado}")
+            blocos.append("\n".join(linhas) + "\n")
+        return "".join(blocos)
+
+    def limpar(self):
+        """Zera os histogramas (todos os workers)"""
+        with self._lock:
+            self._pendentes = {}
+        with conectar(self.db_path) as conn:
+            conn.execute("DELETE FROM baldes")
+            conn.execute("DELETE FROM somas")
+
+    # ------------------------------------------------------------ thread
+
+    def _garantir_thread(self):
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None:
+            return
+        # Processo novo (fork do gunicorn): o que o pai acumulou nao e deste worker
+        self._pid = pid
+        self._pendentes = {}
+        self._thread = threading.Thread(target=self._loop, name="metricas", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.descarregar()
+            except Exception as e:
+                print(f"[AVISO] Metricas: {e}")
+
+
+_metricas = None
+_lock_instancia = threading.Lock()
+
+
+def obter_metricas():
+    """Instancia unica por processo (criada no primeiro uso)."""
+    global _metricas
+    with _lock_instancia:
+        if _metricas is None:
+            _metricas = Metricas()
+        return _metricas
+
+
+def encerrar():
+    """Grava o que falta. Chamado no atexit e no worker_exit do gunicorn."""
+    if _metricas is not None:
+        try:
+            _metricas.descarregar()
+        except Exception as e:
+            print(f"[ERRO] Encerrar metricas: {e}")
+
+
+atexit.register(encerrar)
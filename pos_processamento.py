@@ -0,0 +1,249 @@
+"""
+Pós-processamento das respostas do assistente.
+
+Equivale a processar_videos(limpar_formatacao(texto)) do assistente seguido da injeção do
+marcador [SIM_VIDEO_EX], mas junta as etapas em poucas passadas compiladas e aceita a resposta
+em trechos (streaming) sem reprocessar o que já saiu.
+"""
+
+import re
+
+from cache_respostas import PADRAO_CODIGO_ERRO
+
+
+# Citações 【...】 (na mesma linha) e asteriscos somem antes da remoção de ```; # some depois
+_RE_CITACAO = re.compile('【[^】\\n]*】')
+_RE_QUEBRAS = re.compile(r'\n\n\n+')
+
+# Marcadores de vídeo (aplicados sobre o texto já limpo, como em processar_videos).
+# [VIDEO_CALIBRACAO] é removido antes de [VIDEO_SELAGEM], então um [VIDEO_SELAGEM]
+# "montado" pela remoção do primeiro também some.
+_CALIBRACAO = r'\[VIDEO_CALIBRACAO\]'
+_SELAGEM = r'\[' + ''.join(f'(?:{_CALIBRACAO})*' + re.escape(ch) for ch in 'VIDEO_SELAGEM]')
+_RE_MARCADORES = re.compile(f'\\[VIDEO_E(\\d+)\\]|{_SELAGEM}|{_CALIBRACAO}')
+_RE_CALIBRACAO = re.compile(_CALIBRACAO)
+_RE_PREFIXO_E = re.compile(r'\[VIDEO_E\d*')
+_PREFIXOS_MARCADOR = {m[:i] for m in ('[VIDEO_CALIBRACAO]', '[VIDEO_SELAGEM]') for i in range(1, len(m))}
+
+# Citações de erro na resposta final (vale o maior código entre E1 e E11). Mesmo padrão do
+# cache e do roteador: 'erro e12' é o E12, não o E1. Sem IGNORECASE (o texto vai em
+# minúsculas), que deixaria a varredura várias vezes mais lenta
+_RE_CODIGO = re.compile(PADRAO_CODIGO_ERRO)
+_MAIOR_CODIGO = 11
+_TAM_CAUDA = 16
+
+
+def codigos_citados(texto: str, ate_o_fim: bool = True):
+    """
+    Códigos E1-E11 citados no texto. Com ate_o_fim=False ignora o código que encosta no
+    fim do texto, porque o próximo trecho pode continuá-lo ('e1' + '2')
+    """
+    texto = texto.lower()
+    codigos = []
+    for m in _RE_CODIGO.finditer(texto):
+        if not ate_o_fim and m.end() == len(texto):
+            continue
+        codigo = int(m.group('num_erro') or m.group('num_e'))
+        if codigo <= _MAIOR_CODIGO:
+            codigos.append(codigo)
+    return codigos
+
+
+def _inicio_citacao(texto: str, fim: int) -> int:
+    """Onde começa a citação que o regex acharia terminando antes de `fim` (-1 se nenhuma)"""
+    limite = max(texto.rfind('\n', 0, fim), texto.rfind('】', 0, fim))
+    return texto.find('【', limite + 1, fim)
+
+
+def _corte_limpeza(texto: str) -> int:
+    """
+    Até onde o texto pode ser limpo sem depender do próximo trecho: segura uma citação
+    ainda aberta e a sequência de crases/asteriscos/citações do final (pode virar ```).
+    """
+    corte = len(texto)
+    abre = _inicio_citacao(texto, corte)
+    if abre != -1:
+        corte = abre
+    while corte:
+        ch = texto[corte - 1]
+        if ch == '`' or ch == '*':
+            corte -= 1
+        elif ch == '】':
+            abre = _inicio_citacao(texto, corte - 1)
+            if abre == -1:
+                break
+            corte = abre
+        else:
+            break
+    return corte
+
+
+def _trocar_marcador(m):
+    return f'[SIM_VIDEO_E{m.group(1)}]' if m.group(1) is not None else ''
+
+
+def _prefixo_de_marcador(trecho: str) -> bool:
+    """Se o trecho (sem [VIDEO_CALIBRACAO] completos) ainda pode virar um marcador"""
+    if trecho in _PREFIXOS_MARCADOR or _RE_PREFIXO_E.fullmatch(trecho):
+        return True
+    # [VIDEO_CALIBRACAO] ainda incompleto no meio de outro marcador
+    i = trecho.rfind('[')
+    return i > 0 and trecho[i:] in _PREFIXOS_MARCADOR and _prefixo_de_marcador(trecho[:i])
+
+
+def _corte_marcador(texto: str):
+    """Posição a partir da qual o texto pode ser o começo de um marcador (ou None)"""
+    corte = None
+    i = texto.rfind('[')
+    while i != -1:
+        resto = _RE_CALIBRACAO.sub('', texto[i:])
+        if ']' in resto:
+            break
+        if _prefixo_de_marcador(resto):
+            corte = i
+        i = texto.rfind('[', 0, i)
+    return corte
+
+
+class PosProcessador:
+    """
+    Limpa a resposta do assistente conforme os trechos chegam.
+
+    alimentar(trecho) devolve o texto que já pode ser exibido; finalizar() devolve o restante
+    (incluindo o marcador [SIM_VIDEO_EX] injetado, se for o caso). A concatenação das saídas é
+    idêntica ao pipeline antigo aplicado ao texto inteiro.
+    """
+
+    def __init__(self, injetar_marcador: bool = True):
+        self.injetar_marcador = injetar_marcador
+        self._pendente = ''      # entrada ainda não processada (token possivelmente incompleto)
+        # Etapa 1: limpeza + colapso de quebras de linha + strip
+        self._iniciado = False
+        self._espaco = ''        # espaço em branco retido (só sai se vier texto depois)
+        self._quebras = 0        # quebras de linha seguidas ainda não colapsadas
+        # Etapa 2: marcadores de vídeo + strip
+        self._marcador = ''      # possível marcador incompleto
+        self._iniciado_saida = False
+        self._espaco_saida = ''
+        # Etapa 3: códigos de erro citados no que já saiu
+        self._cauda = ''
+        self._tem_marcador = False
+        self._maior_codigo = 0
+
+    # ------------------------------------------------------------ etapa 1
+
+    def _fechar_quebras(self):
+        if self._quebras:
+            self._espaco += '\n\n' if self._quebras >= 3 else '\n' * self._quebras
+            self._quebras = 0
+
+    def _acumular_espaco(self, espaco):
+        partes = espaco.split('\n')
+        if partes[0]:
+            self._fechar_quebras()
+            self._espaco += partes[0]
+        for parte in partes[1:]:
+            self._quebras += 1
+            if parte:
+                self._fechar_quebras()
+                self._espaco += parte
+
+    def _visivel(self, texto):
+        nucleo = texto.rstrip()
+        if not nucleo:
+            self._acumular_espaco(texto)
+            return ''
+        cauda = texto[len(nucleo):]
+        inicio = len(nucleo) - len(nucleo.lstrip())
+        if inicio:
+            self._acumular_espaco(nucleo[:inicio])
+            nucleo = nucleo[inicio:]
+        if '\n\n\n' in nucleo:
+            nucleo = _RE_QUEBRAS.sub('\n\n', nucleo)
+        self._fechar_quebras()
+        if self._iniciado:
+            saida = self._espaco + nucleo
+        else:
+            saida = nucleo
+            self._iniciado = True
+        self._espaco = ''
+        if cauda:
+            self._acumular_espaco(cauda)
+        return saida
+
+    def _limpar(self, final):
+        buf = self._pendente
+        corte = len(buf) if final else _corte_limpeza(buf)
+        self._pendente = buf[corte:]
+        texto = buf[:corte]
+        if '【' in texto:
+            texto = _RE_CITACAO.sub('', texto)
+        if '*' in texto:
+            texto = texto.replace('*', '')
+        if '```' in texto:
+            texto = texto.replace('```', '')
+        if '#' in texto:
+            texto = texto.replace('#', '')
+        return self._visivel(texto) if texto else ''
+
+    # ------------------------------------------------------------ etapa 2
+
+    def _marcadores(self, texto, final):
+        texto = self._marcador + texto
+        self._marcador = ''
+        if '[' in texto:
+            corte = None if final else _corte_marcador(texto)
+            if corte is not None:
+                texto, self._marcador = texto[:corte], texto[corte:]
+            texto = _RE_MARCADORES.sub(_trocar_marcador, texto)
+
+        if not self._iniciado_saida:
+            texto = texto.lstrip()
+            if not texto:
+                return ''
+            self._iniciado_saida = True
+        nucleo = texto.rstrip()
+        if not nucleo:
+            self._espaco_saida += texto
+            return ''
+        saida = self._espaco_saida + nucleo
+        self._espaco_saida = texto[len(nucleo):]
+        return saida
+
+    # ------------------------------------------------------------ etapa 3
+
+    def _observar(self, saida, final=False):
+        if not self.injetar_marcador or not (saida or final):
+            return
+        janela = self._cauda + saida
+        if '[SIM_VIDEO_E' in janela:
+            self._tem_marcador = True
+        self._maior_codigo = max(self._maior_codigo, max(codigos_citados(janela, final), default=0))
+        self._cauda = janela[-_TAM_CAUDA:]
+
+    # ------------------------------------------------------------ API
+
+    def alimentar(self, trecho: str) -> str:
+        """Processa mais um trecho e devolve o texto que já pode ser exibido"""
+        if not trecho:
+            return ''
+        self._pendente += trecho
+        saida = self._marcadores(self._limpar(final=False), final=False)
+        self._observar(saida)
+        return saida
+
+    def finalizar(self) -> str:
+        """Processa o que sobrou e devolve o final da resposta"""
+        saida = self._marcadores(self._limpar(final=True), final=True)
+        self._observar(saida, final=True)
+        if self.injetar_marcador and not self._tem_marcador and self._maior_codigo:
+            saida += f'\n\n[SIM_VIDEO_E{self._maior_codigo}]'
+        return saida
+
+
+def pos_processar(texto: str, injetar_marcador: bool = True) -> str:
+    """Resposta completa limpa de uma vez"""
+    if not texto:
+        return ""
+    processador = PosProcessador(injetar_marcador)
+    return processador.alimentar(texto) + processador.finalizar()
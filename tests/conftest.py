@@ -0,0 +1,53 @@
+"""
+Configuração comum dos testes: os módulos ficam na raiz do repositório e o banco do
+app vai para uma pasta temporária (o import do app já inicializa o banco).
+"""
+
+import math
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="storopack_testes_"), "storopack.db"))
+os.environ.setdefault("AQUECIMENTO", "0")
+os.environ.setdefault("CACHE_RESPOSTAS", "0")
+
+
+@pytest.fixture
+def app_teste(tmp_path, monkeypatch):
+    """App Flask com um banco novo em tmp_path"""
+    import app as modulo
+    monkeypatch.setattr(modulo, "DB_PATH", str(tmp_path / "storopack.db"))
+    modulo.init_db()
+    yield modulo
+    modulo._gravador().encerrar(timeout=5)
+
+
+def _linhas(conn, tabela):
+    """Linhas da tabela, sem as zeradas (o trigger pode deixar a linha com tudo 0)"""
+    return sorted(tuple(row) for row in conn.execute(f"SELECT * FROM {tabela}")
+                  if any(v for v in tuple(row) if not isinstance(v, str)))
+
+
+def _iguais(a, b):
+    """Mesmas linhas; somas de REAL acumulam erro de arredondamento"""
+    return len(a) == len(b) and all(
+        x == y if isinstance(x, str) or isinstance(y, str) else math.isclose(x, y, abs_tol=1e-9)
+        for la, lb in zip(a, b) for x, y in zip(la, lb))
+
+
+@pytest.fixture
+def confere_com_reconstruir():
+    """Confere que os triggers deixaram nas tabelas o mesmo que reconstruir() calcula do zero"""
+    def conferir(conn, modulo, tabelas):
+        salvo = {t: _linhas(conn, t) for t in tabelas}
+        modulo.reconstruir(conn)
+        for tabela in tabelas:
+            recalculado = _linhas(conn, tabela)
+            assert _iguais(salvo[tabela], recalculado), (tabela, salvo[tabela], recalculado)
+    return conferir
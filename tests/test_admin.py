@@ -0,0 +1,50 @@
+from conexoes import conectar
+
+
+def _criar_chamados(app_teste, quantos):
+    """Chamados com atualizado_em repetido de dois em dois (o id desempata)"""
+    with conectar(app_teste.DB_PATH) as conn:
+        for i in range(quantos):
+            conn.execute("""INSERT INTO chamados (modulo, status, atualizado_em)
+                            VALUES ('airplus', ?, ?)""",
+                         (['aberto', 'pendente_tecnico', 'resolvido'][i % 3],
+                          f"2024-01-{1 + i // 2:02d} 10:00:00"))
+
+
+def _paginas(cliente, url):
+    ids, cursor = [], None
+    while True:
+        dados = cliente.get(url + (f"&cursor={cursor}" if cursor else "")).json
+        ids += [c['id'] for c in dados['chamados']]
+        cursor = dados['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_chamados_por_cursor(app_teste):
+    _criar_chamados(app_teste, 11)
+    cliente = app_teste.app.test_client()
+    assert _paginas(cliente, '/admin/chamados?per_page=4') == list(range(11, 0, -1))
+    # Vários status: cada um anda pelo próprio índice e as páginas se juntam na ordem
+    assert _paginas(cliente, '/admin/chamados?status=aberto,pendente_tecnico&per_page=3') == \
+        [i for i in range(11, 0, -1) if (i - 1) % 3 != 2]
+
+
+def test_cursor_invalido(app_teste):
+    resposta = app_teste.app.test_client().get('/admin/chamados?cursor=xyz')
+    assert resposta.status_code == 400
+
+
+def test_pendentes_mantem_a_lista_e_pagina_pelo_cabecalho(app_teste):
+    _criar_chamados(app_teste, 12)
+    cliente = app_teste.app.test_client()
+    resposta = cliente.get('/admin/pendentes-tecnico')
+    assert [c['id'] for c in resposta.json] == [11, 8, 5, 2]
+    assert 'X-Next-Cursor' not in resposta.headers
+
+    primeira = cliente.get('/admin/pendentes-tecnico?per_page=3')
+    assert [c['id'] for c in primeira.json] == [11, 8, 5]
+    cursor = primeira.headers['X-Next-Cursor']
+    segunda = cliente.get(f'/admin/pendentes-tecnico?per_page=3&cursor={cursor}')
+    assert [c['id'] for c in segunda.json] == [2]
+    assert 'X-Next-Cursor' not in segunda.headers
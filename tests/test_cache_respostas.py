@@ -0,0 +1,77 @@
+import pytest
+
+import cache_respostas
+from cache_respostas import CacheRespostas, normalizar_pergunta, versao_equipamento
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 1_000_000.0
+
+    def time(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cache_respostas, "time", relogio)
+    return relogio
+
+
+@pytest.fixture
+def cache(tmp_path, relogio):
+    return CacheRespostas(str(tmp_path / "cache.db"), ttl=60, max_entradas=3)
+
+
+@pytest.mark.parametrize("pergunta", ["Erro E9?", "erro 9", "  ERRO: e-09 ", "érro e09"])
+def test_normalizacao_junta_variantes(pergunta):
+    assert normalizar_pergunta(pergunta) == "e9"
+
+
+def test_mesma_pergunta_normalizada_acerta(cache):
+    cache.salvar("asst", "v1", "Erro E9?", "Troque o fio")
+    assert cache.obter("asst", "v1", "erro 9") == "Troque o fio"
+    assert cache.obter("outro_asst", "v1", "erro 9") is None
+    estat = cache.estatisticas()
+    assert (estat["hits"], estat["misses"]) == (1, 1)
+
+
+def test_ttl_vence_a_entrada(cache, relogio):
+    cache.salvar("asst", "v1", "erro e9", "Troque o fio")
+    relogio.agora += 59
+    assert cache.obter("asst", "v1", "erro e9") == "Troque o fio"
+    relogio.agora += 2
+    assert cache.obter("asst", "v1", "erro e9") is None
+    assert cache.estatisticas()["entradas"] == 0
+
+
+def test_lru_remove_a_menos_usada(cache, relogio):
+    for i in range(3):
+        cache.salvar("asst", "v1", f"pergunta {i}", f"resposta {i}")
+        relogio.agora += 1
+    # A mais antiga foi lida: a vítima passa a ser a 1
+    assert cache.obter("asst", "v1", "pergunta 0") == "resposta 0"
+    relogio.agora += 1
+    cache.salvar("asst", "v1", "pergunta 3", "resposta 3")
+    assert cache.obter("asst", "v1", "pergunta 1") is None
+    assert cache.obter("asst", "v1", "pergunta 0") == "resposta 0"
+    assert cache.obter("asst", "v1", "pergunta 3") == "resposta 3"
+    estat = cache.estatisticas()
+    assert estat["entradas"] == 3 and estat["removidas_lru"] == 1
+
+
+def test_troca_de_versao_invalida(cache):
+    v1 = versao_equipamento({"assistant_id": "asst", "vector_store_id": "vs1"})
+    v2 = versao_equipamento({"assistant_id": "asst", "vector_store_id": "vs2"})
+    assert v1 != v2
+    cache.salvar("asst", v1, "erro e9", "Resposta do manual antigo")
+    # Vector store trocado: a entrada antiga não vale e sai do cache
+    assert cache.obter("asst", v2, "erro e9") is None
+    assert cache.obter("asst", v1, "erro e9") is None
+
+    cache.salvar("asst", v1, "erro e9", "antiga")
+    cache.salvar("asst", v2, "erro e5", "nova")
+    assert cache.invalidar_versoes([v2]) == 1
+    assert cache.obter("asst", v2, "erro e5") == "nova"
+    assert cache.estatisticas()["entradas"] == 1
@@ -0,0 +1,101 @@
+import hashlib
+import io
+import time
+
+import pytest
+
+import cache_videos
+import video_analyzer
+from cache_videos import ArquivoComHash, CacheVideos, hash_arquivo
+from conexoes import conectar
+
+RESULTADO = {"erro_identificado": None, "confianca": "media", "sinais_detectados": [], "descricao": "ok"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheVideos(str(tmp_path / "cache_videos.db"), ttl=60, max_entradas=2)
+
+
+def test_arquivo_com_hash_calcula_enquanto_grava(tmp_path):
+    blocos = [b"a" * 1000, b"b" * 5000, b"", b"c"]
+    with open(tmp_path / "video.mp4", "wb") as bruto:
+        arquivo = ArquivoComHash(bruto)
+        for bloco in blocos:
+            arquivo.write(bloco)
+        arquivo.flush()
+        assert arquivo.name == bruto.name
+    esperado = hashlib.sha256(b"".join(blocos)).hexdigest()
+    assert arquivo.hexdigest() == esperado
+    assert hash_arquivo(str(tmp_path / "video.mp4")) == esperado
+
+
+def test_chave_e_video_modulo_e_versao(cache):
+    cache.salvar("h1", "airplus", "v1", RESULTADO)
+    assert cache.obter("h1", "airplus", "v1") == RESULTADO
+    assert cache.obter("h1", "airmove", "v1") is None
+    assert cache.obter("h2", "airplus", "v1") is None
+
+
+class Relogio:
+    agora = 1000.0
+
+    def time(self):
+        return self.agora
+
+
+def test_ttl_e_lru(cache, monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cache_videos, "time", relogio)
+    cache.salvar("h1", "airplus", "v1", RESULTADO)
+    relogio.agora += 1
+    cache.salvar("h2", "airplus", "v1", RESULTADO)
+    relogio.agora += 1
+    assert cache.obter("h1", "airplus", "v1")
+    relogio.agora += 1
+    cache.salvar("h3", "airplus", "v1", RESULTADO)
+    assert cache.obter("h2", "airplus", "v1") is None
+    assert cache.estatisticas()["removidas_lru"] == 1
+    relogio.agora += 61
+    assert cache.obter("h1", "airplus", "v1") is None
+
+
+def test_nova_versao_descarta_as_antigas(cache):
+    cache.salvar("h1", "airplus", "v1", RESULTADO)
+    cache.salvar("h2", "airplus", "v2", RESULTADO)
+    assert cache.obter("h1", "airplus", "v1") is None
+    assert cache.estatisticas()["entradas"] == 1
+
+
+def test_mesmo_video_nao_chama_o_gemini_de_novo(tmp_path, cache, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(video_analyzer, "CACHE_ATIVO", True)
+    monkeypatch.setattr(video_analyzer, "obter_cache_videos", lambda: cache)
+    monkeypatch.setattr(video_analyzer, "analisar_com_gemini",
+                        lambda *args: chamadas.append(args) or (RESULTADO, None))
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\x01" * 4096)
+    primeira = video_analyzer.analisar_video_erro(video_path=str(video), modulo="airplus")
+    segunda = video_analyzer.analisar_video_erro(video_path=str(video), modulo="airplus",
+                                                 hash_video=hash_arquivo(str(video)))
+    assert primeira == segunda
+    assert len(chamadas) == 1
+
+
+def test_upload_leva_o_hash_para_o_job(app_teste, monkeypatch):
+    monkeypatch.setattr(app_teste, "_analisar_job", lambda job: "ok")
+    conteudo = b"\x02" * (300 * 1024)
+    resposta = app_teste.app.test_client().post(
+        "/analyze-video", content_type="multipart/form-data",
+        data={"video": (io.BytesIO(conteudo), "falha.mp4"), "modulo": "airplus"})
+    assert resposta.status_code == 202
+    job_id = resposta.json["job_id"]
+    hash_video = conectar(app_teste.DB_PATH).execute(
+        "SELECT hash_video FROM jobs_video WHERE id = ?", (job_id,)).fetchone()[0]
+    assert hash_video == hashlib.sha256(conteudo).hexdigest()
+    fila = app_teste._fila_videos()
+    fim = time.monotonic() + 5
+    while fila.consultar(job_id)["status"] != "concluido" and time.monotonic() < fim:
+        time.sleep(0.02)
+    assert fila.consultar(job_id)["resposta"] == "ok"
+    fila.encerrar()
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+import coalescencia
+from coalescencia import Coalescedor, chave_pergunta
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(coalescencia, "ATIVO", True)
+    monkeypatch.setattr(coalescencia, "RESULTADO_S", 5)
+    return str(tmp_path / "coalescencia.db")
+
+
+def _aguardar_em_thread(participacao, timeout):
+    """Carona esperando em outra thread; o resultado fica em saida[0]"""
+    saida = []
+    thread = threading.Thread(target=lambda: saida.append(participacao.aguardar(timeout)))
+    thread.start()
+    return thread, saida
+
+
+CHAVE = chave_pergunta("asst_1", "Erro E05 na máquina")
+
+
+def test_chave_normaliza_a_pergunta():
+    assert chave_pergunta("asst_1", "  erro e05 na máquina? ") == CHAVE
+    assert chave_pergunta("asst_2", "Erro E05 na máquina") != CHAVE
+
+
+def test_carona_no_mesmo_processo(banco):
+    c = Coalescedor(banco)
+    lider = c.participar(CHAVE, 5)
+    carona = c.participar(CHAVE, 5)
+    assert lider.lider and not carona.lider and carona.origem == "local"
+    thread, saida = _aguardar_em_thread(carona, 5)
+    lider.concluir("resposta")
+    thread.join(5)
+    assert saida == ["resposta"]
+    assert c.estatisticas()["caronas"] == 1
+
+
+def test_carona_de_outro_worker(banco):
+    worker_a, worker_b = Coalescedor(banco), Coalescedor(banco)
+    lider = worker_a.participar(CHAVE, 5)
+    carona = worker_b.participar(CHAVE, 5)
+    assert lider.lider and carona.origem == "outro_worker"
+    thread, saida = _aguardar_em_thread(carona, 5)
+    time.sleep(0.1)
+    lider.concluir("resposta")
+    thread.join(5)
+    assert saida == ["resposta"]
+    # Quem chega logo depois pega o resultado recente, sem chamar a API
+    recente = Coalescedor(banco).participar(CHAVE, 5)
+    assert not recente.lider and recente.origem == "recente"
+    assert recente.aguardar(0) == "resposta"
+
+
+def test_lider_sem_resultado_libera_o_voo(banco):
+    worker_a, worker_b = Coalescedor(banco), Coalescedor(banco)
+    lider = worker_a.participar(CHAVE, 5)
+    carona = worker_b.participar(CHAVE, 5)
+    thread, saida = _aguardar_em_thread(carona, 5)
+    time.sleep(0.1)
+    lider.concluir(None)
+    thread.join(5)
+    assert saida == [None]
+    assert worker_b.participar(CHAVE, 5).lider
+
+
+def test_lease_vencido_quando_o_lider_morre(banco):
+    worker_a, worker_b = Coalescedor(banco), Coalescedor(banco)
+    assert worker_a.participar(CHAVE, 0.3).lider        # nunca conclui
+    carona = worker_b.participar(CHAVE, 5)
+    assert carona.origem == "outro_worker"
+    inicio = time.monotonic()
+    assert carona.aguardar(5) is None
+    assert time.monotonic() - inicio < 2
+    # Prazo vencido: o próximo assume o voo
+    assert worker_b.participar(CHAVE, 5).lider
+
+
+def test_carona_local_com_prazo_esgotado(banco):
+    c = Coalescedor(banco)
+    lider = c.participar(CHAVE, 5)
+    carona = c.participar(CHAVE, 5)
+    assert carona.aguardar(0.1) is None
+    lider.concluir("resposta")
+    assert c.estatisticas()["caronas_sem_resultado"] == 1
+
+
+def test_desativado_todo_mundo_e_lider(banco, monkeypatch):
+    monkeypatch.setattr(coalescencia, "ATIVO", False)
+    c = Coalescedor(banco)
+    assert c.participar(CHAVE, 5).lider
+    assert c.participar(CHAVE, 5).lider
@@ -0,0 +1,29 @@
+import consumo
+from conexoes import conectar
+
+
+def test_triggers_batem_com_reconstruir(tmp_path, confere_com_reconstruir):
+    conn = conectar(str(tmp_path / "consumo.db"))
+    consumo.instalar(conn)
+    linhas = [
+        ("run_1", 1, "airplus", 1200, 300, 4.5, 0.4, 2, 3, "2026-10-01 10:00:00"),
+        ("run_2", 1, "airplus", 900, 250, 3.0, None, None, 0, "2026-10-01 23:59:59"),
+        ("run_3", 2, "airmove2", 1500, 500, 6.1, 1.2, 1, 1, "2026-10-02 08:00:00"),
+        ("run_4", 3, "airplus", 700, 100, 2.2, 0.1, 0, 0, "2026-10-02 09:00:00"),
+    ]
+    with conn:
+        conn.executemany("""INSERT INTO consumo_assistente
+                            (run_id, chamado_id, equipamento, tokens_entrada, tokens_saida, duracao_s,
+                             fila_s, buscas_arquivo, citacoes, criado_em)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", linhas)
+    # As buscas do File Search chegam depois (UPDATE); run apagado sai do consolidado
+    with conn:
+        conn.execute("UPDATE consumo_assistente SET buscas_arquivo = 4 WHERE run_id = 'run_2'")
+        conn.execute("UPDATE consumo_assistente SET equipamento = 'airmove2' WHERE run_id = 'run_4'")
+        conn.execute("DELETE FROM consumo_assistente WHERE run_id = 'run_3'")
+
+    diario = {(row["dia"], row["equipamento"]): row["respostas"]
+              for row in conn.execute("SELECT * FROM consumo_diario WHERE respostas > 0")}
+    assert diario == {("2026-10-01", "airplus"): 2, ("2026-10-02", "airmove2"): 1}
+    confere_com_reconstruir(conn, consumo, ["consumo_diario"])
+    assert consumo.do_chamado(conn, 1)["buscas_por_resposta"] == 3.0
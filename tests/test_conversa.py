@@ -0,0 +1,27 @@
+import time
+
+from conexoes import conectar
+
+
+def test_historico_sem_thread_espera_so_as_mensagens_do_chamado(app_teste):
+    with conectar(app_teste.DB_PATH) as conn:
+        chamado_id = conn.execute("INSERT INTO chamados (modulo) VALUES ('airplus')").lastrowid
+        outro_id = conn.execute("INSERT INTO chamados (modulo) VALUES ('airplus')").lastrowid
+    # Thread de gravação parada no intervalo: as mensagens do chat ficam na fila
+    gravador = app_teste._gravador()
+    gravador.intervalo = 10
+    app_teste._tocar_chamado(chamado_id)
+    assert gravador.descarregar(timeout=5)
+    time.sleep(0.05)
+
+    app_teste._registrar_mensagem(outro_id, 'user', 'Outra pergunta')
+    conn = conectar(app_teste.DB_PATH)
+    assert 'historico' not in app_teste._carregar_conversa(conn, chamado_id)
+    # Nada do chamado na fila: a mensagem do outro chamado continua esperando o lote
+    assert gravador.pendente(('mensagens', outro_id))
+
+    app_teste._registrar_mensagem(chamado_id, 'user', 'A máquina mostra erro E05')
+    app_teste._registrar_mensagem(chamado_id, 'assistant', 'Troque a bobina de filme')
+    conversa = app_teste._carregar_conversa(conn, chamado_id)
+    assert conversa['historico'] == [('user', 'A máquina mostra erro E05'),
+                                     ('assistant', 'Troque a bobina de filme')]
@@ -0,0 +1,50 @@
+import pytest
+
+from database import Database
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(str(tmp_path / "storopack.db"))
+
+
+def test_log_entra_na_transacao_da_operacao(db):
+    comandos = []
+    db._conn().set_trace_callback(comandos.append)
+    chamado_id = db.criar_chamado("s1", "airplus")
+    db.acionar_tecnico(chamado_id)
+    db.registrar_feedback(chamado_id, True, "ok")
+    db._conn().set_trace_callback(None)
+
+    assert sum(1 for c in comandos if c.startswith("COMMIT")) == 3
+    tipos = [row["tipo"] for row in db._conn().execute("SELECT tipo FROM logs ORDER BY id")]
+    assert tipos == ["chamado_criado", "tecnico_acionado", "feedback"]
+
+
+
+def test_listar_chamados_por_cursor(db):
+    with db._conn() as conn:
+        for i in range(7):
+            # Mesmo criado_em em pares: o id desempata
+            conn.execute("INSERT INTO chamados (id, modulo, status, criado_em) VALUES (?, 'airplus', ?, ?)",
+                         (f"c{i}", "aberto" if i % 3 else "resolvido", f"2024-01-0{1 + i // 2} 10:00:00"))
+    vistos = []
+    cursor = None
+    while True:
+        pagina = db.listar_chamados({"per_page": 3, "cursor": cursor})
+        vistos += [c["id"] for c in pagina["chamados"]]
+        cursor = pagina["next_cursor"]
+        if not cursor:
+            break
+    assert vistos == ["c6", "c5", "c4", "c3", "c2", "c1", "c0"]
+
+    abertos = db.listar_chamados({"status": "aberto", "per_page": 2})
+    assert [c["id"] for c in abertos["chamados"]] == ["c5", "c4"]
+    resto = db.listar_chamados({"status": "aberto", "per_page": 2, "cursor": abertos["next_cursor"]})
+    assert [c["id"] for c in resto["chamados"]] == ["c2", "c1"]
+    assert resto["next_cursor"] is None
+
+
+def test_cursor_invalido(db):
+    with pytest.raises(ValueError):
+        db.listar_chamados({"cursor": "nao-e-um-cursor"})
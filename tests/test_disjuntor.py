@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+import disjuntor
+from disjuntor import ABERTO, FECHADO, MEIO_ABERTO, Disjuntor
+
+
+@pytest.fixture
+def dj(monkeypatch):
+    monkeypatch.setattr(disjuntor, "JANELA", 10)
+    monkeypatch.setattr(disjuntor, "MIN_CHAMADAS", 4)
+    monkeypatch.setattr(disjuntor, "TAXA_FALHA", 0.5)
+    monkeypatch.setattr(disjuntor, "FALHAS_SEGUIDAS", 3)
+    monkeypatch.setattr(disjuntor, "LENTO_S", 1)
+    monkeypatch.setattr(disjuntor, "ABERTO_S", 0.1)
+    monkeypatch.setattr(disjuntor, "ABERTO_MAX_S", 0.4)
+    return Disjuntor("teste")
+
+
+def _estado(dj):
+    return dj.estado()["estado"]
+
+
+def test_abre_com_falhas_seguidas(dj):
+    dj.falha("x")
+    dj.falha("x")
+    assert _estado(dj) == FECHADO and dj.permitir()
+    dj.falha("x")
+    assert _estado(dj) == ABERTO
+    assert not dj.permitir()
+
+
+def test_abre_pela_taxa_de_falha_na_janela(dj):
+    dj.sucesso(0.1)
+    dj.falha("x")
+    dj.sucesso(0.1)
+    assert _estado(dj) == FECHADO
+    dj.falha("x")
+    assert _estado(dj) == ABERTO
+
+
+def test_resposta_lenta_conta_como_falha(dj):
+    for _ in range(3):
+        dj.sucesso(2)
+    assert _estado(dj) == ABERTO
+    assert dj.estado()["ultima_falha"].startswith("lenta")
+
+
+def test_meio_aberto_deixa_so_a_sonda_passar(dj):
+    for _ in range(3):
+        dj.falha("x")
+    time.sleep(0.15)
+    assert dj.permitir()
+    assert _estado(dj) == MEIO_ABERTO
+    assert not dj.permitir()
+    dj.sucesso(0.1)
+    assert _estado(dj) == FECHADO
+    assert dj.permitir() and dj.permitir()
+
+
+def test_sonda_que_falha_dobra_a_espera(dj):
+    for _ in range(3):
+        dj.falha("x")
+    time.sleep(0.15)
+    assert dj.permitir()
+    dj.falha("sonda")
+    assert _estado(dj) == ABERTO
+    assert 0.1 < dj.estado()["reabre_em_s"] <= 0.2
+    time.sleep(0.25)
+    assert dj.permitir()
+    dj.falha("sonda")
+    estado = dj.estado()
+    assert estado["aberturas"] == 3
+    # Limitada por ABERTO_MAX_S
+    assert 0.3 < estado["reabre_em_s"] <= 0.4
+
+
+def test_sonda_que_desiste_libera_a_proxima(dj):
+    for _ in range(3):
+        dj.falha("x")
+    time.sleep(0.15)
+    assert dj.permitir()
+    assert not dj.permitir()
+    # Sem vaga no limitador: a sonda nem saiu, o disjuntor continua esperando uma
+    dj.desistir()
+    assert _estado(dj) == MEIO_ABERTO
+    assert dj.permitir()
+    dj.sucesso(0.1)
+    assert _estado(dj) == FECHADO
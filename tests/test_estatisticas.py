@@ -0,0 +1,66 @@
+"""Contadores do painel mantidos por triggers contra o recálculo completo (reconstruir)"""
+
+import pytest
+
+import estatisticas
+from conexoes import conectar
+
+
+@pytest.fixture(params=["app", "database"])
+def banco_chamados(request, tmp_path, monkeypatch):
+    """Os dois schemas de chamados: o do app.py e o do database.py (com cidade e resolvido_bot)"""
+    if request.param == "app":
+        import app
+        monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "app.db"))
+        app.init_db()
+        return conectar(app.DB_PATH)
+    from database import Database
+    return Database(str(tmp_path / "database.db"))._conn()
+
+
+def _inserir_chamado(conn, id_, modulo, status, **extras):
+    colunas = estatisticas._colunas(conn, "chamados")
+    valores = {"modulo": modulo, "status": status, **{k: v for k, v in extras.items() if k in colunas}}
+    if "cidade" in colunas:
+        valores["id"] = str(id_)
+    elif id_ is not None:
+        valores["id"] = id_
+    nomes = ", ".join(valores)
+    conn.execute(f"INSERT INTO chamados ({nomes}) VALUES ({', '.join('?' * len(valores))})",
+                 list(valores.values()))
+    return valores.get("id", id_)
+
+
+def _inserir_mensagem(conn, chamado_id, texto):
+    coluna = "tipo" if "tipo" in estatisticas._colunas(conn, "mensagens") else "remetente"
+    conn.execute(f"INSERT INTO mensagens (chamado_id, {coluna}, conteudo) VALUES (?, 'user', ?)",
+                 (chamado_id, texto))
+
+
+def test_triggers_batem_com_reconstruir(banco_chamados, confere_com_reconstruir):
+    conn = banco_chamados
+    with conn:
+        a = _inserir_chamado(conn, 1, "airplus", "aberto", cidade="Curitiba", resolvido_bot=1,
+                             latitude=-25.43, longitude=-49.27, distancia_km=12.5, geohash="6gkzwgjz")
+        b = _inserir_chamado(conn, 2, "airmove2", "aberto", cidade="Joinville",
+                             latitude=-26.30, longitude=-48.85, geohash="6gkxsh00")
+        c = _inserir_chamado(conn, 3, "airplus", "resolvido", cidade="Curitiba")
+        for chamado, n in ((a, 3), (b, 2), (c, 1)):
+            for i in range(n):
+                _inserir_mensagem(conn, chamado, f"mensagem {i}")
+
+    with conn:
+        conn.execute("UPDATE chamados SET status = 'resolvido' WHERE id = ?", (a,))
+        conn.execute("UPDATE chamados SET modulo = 'airplus' WHERE id = ?", (b,))
+        # Coluna que não entra nos contadores: não mexe nos agregados
+        conn.execute("UPDATE chamados SET session_id = 'x' WHERE id = ?", (c,))
+        conn.execute("DELETE FROM mensagens WHERE chamado_id = ? AND conteudo = 'mensagem 0'", (a,))
+    with conn:
+        conn.execute("DELETE FROM mensagens WHERE chamado_id = ?", (c,))
+        conn.execute("DELETE FROM chamados WHERE id = ?", (c,))
+
+    assert estatisticas.verificar(conn) == []
+    total = conn.execute("SELECT valor FROM estatisticas_totais WHERE chave = 'mensagens'").fetchone()[0]
+    assert total == 4
+    confere_com_reconstruir(conn, estatisticas, estatisticas.TABELAS_AGREGADAS)
+    assert estatisticas.verificar(conn) == []
@@ -0,0 +1,45 @@
+import time
+
+from conexoes import conectar
+
+
+def test_comentario_fica_depois_da_resposta_avaliada(app_teste):
+    with conectar(app_teste.DB_PATH) as conn:
+        chamado_id = conn.execute("INSERT INTO chamados (modulo) VALUES ('airplus')").lastrowid
+    # Thread de gravação parada no intervalo: as mensagens do chat ficam na fila
+    gravador = app_teste._gravador()
+    gravador.intervalo = 10
+    app_teste._tocar_chamado(chamado_id)
+    assert gravador.descarregar(timeout=5)
+    time.sleep(0.05)
+    app_teste._registrar_mensagem(chamado_id, 'user', 'A máquina mostra erro E05')
+    app_teste._registrar_mensagem(chamado_id, 'assistant', 'Troque a bobina de filme')
+    assert gravador.estatisticas()['pendentes'] == 2
+
+    cliente = app_teste.app.test_client()
+    resposta = cliente.post('/feedback', json={
+        'chamado_id': chamado_id, 'resolvido': True, 'comentario': 'Funcionou'
+    })
+    assert resposta.status_code == 200 and resposta.json['sucesso']
+
+    assert gravador.descarregar(timeout=5)
+    conn = conectar(app_teste.DB_PATH)
+    tipos = [row['tipo'] for row in conn.execute(
+        "SELECT tipo FROM mensagens WHERE chamado_id = ? ORDER BY id", (chamado_id,))]
+    assert tipos == ['user', 'assistant', 'feedback']
+    status = conn.execute("SELECT status FROM chamados WHERE id = ?", (chamado_id,)).fetchone()[0]
+    assert status == 'resolvido'
+
+
+def test_feedback_sem_comentario_nao_grava_mensagem(app_teste):
+    with conectar(app_teste.DB_PATH) as conn:
+        chamado_id = conn.execute("INSERT INTO chamados (modulo) VALUES ('airplus')").lastrowid
+
+    resposta = app_teste.app.test_client().post('/feedback', json={'chamado_id': chamado_id, 'resolvido': False})
+    assert resposta.status_code == 200
+
+    assert app_teste._gravador().descarregar(timeout=5)
+    conn = conectar(app_teste.DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM mensagens WHERE chamado_id = ?", (chamado_id,)).fetchone()[0] == 0
+    status = conn.execute("SELECT status FROM chamados WHERE id = ?", (chamado_id,)).fetchone()[0]
+    assert status == 'nao_resolvido'
@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+
+import fila_videos
+from conexoes import conectar
+from fila_videos import RESPOSTA_FALHA, FilaVideos
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_videos, "TENTATIVAS", 2)
+    monkeypatch.setattr(fila_videos, "INTERVALO_OCIOSO_S", 0.05)
+    return str(tmp_path / "fila.db")
+
+
+def _video(tmp_path, nome="video.mp4"):
+    caminho = tmp_path / nome
+    caminho.write_bytes(b"\x00" * 1024)
+    return str(caminho)
+
+
+def _fila_parada(banco, processar):
+    """Fila sem threads: os testes reservam e executam os jobs na mão"""
+    fila = FilaVideos(banco, processar, workers=0)
+    fila.iniciar = lambda: None
+    return fila
+
+
+def _aguardar(fila, job_id, timeout=5):
+    fim = time.monotonic() + timeout
+    while time.monotonic() < fim:
+        job = fila.consultar(job_id)
+        if job["status"] in ("concluido", "erro"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} não terminou")
+
+
+def test_job_executado_pelo_pool(banco, tmp_path):
+    recebidos = []
+    fila = FilaVideos(banco, lambda job: recebidos.append(job) or "Troque o sensor", workers=1)
+    origem = _video(tmp_path)
+    job_id = fila.enfileirar(origem, modulo="airplus", descricao="barulho", hash_video="abc")
+    assert not os.path.exists(origem)
+    job = _aguardar(fila, job_id)
+    assert job == {"job_id": job_id, "status": "concluido", "resposta": "Troque o sensor"}
+    assert recebidos[0]["hash_video"] == "abc" and recebidos[0]["modulo"] == "airplus"
+    # O vídeo sai do disco quando o job termina
+    assert not os.path.exists(recebidos[0]["video_path"])
+    fila.encerrar()
+
+
+def test_posicao_na_fila(banco, tmp_path):
+    fila = _fila_parada(banco, lambda job: "ok")
+    ids = [fila.enfileirar(_video(tmp_path, f"v{i}.mp4")) for i in range(3)]
+    assert [fila.consultar(i)["posicao"] for i in ids] == [1, 2, 3]
+    fila._executar(fila._reservar())
+    assert fila.consultar(ids[0])["status"] == "concluido"
+    assert fila.consultar(ids[2])["posicao"] == 2
+    assert fila.consultar("nao-existe") is None
+
+
+def test_falha_volta_para_a_fila_ate_esgotar(banco, tmp_path):
+    tentativas = []
+
+    def processar(job):
+        tentativas.append(job["tentativas"])
+        raise RuntimeError("Gemini fora do ar")
+
+    fila = _fila_parada(banco, processar)
+    job_id = fila.enfileirar(_video(tmp_path))
+    fila._executar(fila._reservar())
+    assert fila.consultar(job_id)["status"] == "pendente"
+    fila._executar(fila._reservar())
+    job = fila.consultar(job_id)
+    assert job["status"] == "erro" and job["resposta"] == RESPOSTA_FALHA
+    assert tentativas == [1, 2]
+    assert fila._reservar() is None
+
+
+def test_segunda_tentativa_conclui(banco, tmp_path):
+    falhas = [RuntimeError("timeout")]
+
+    def processar(job):
+        if falhas:
+            raise falhas.pop()
+        return "ok"
+
+    fila = _fila_parada(banco, processar)
+    job_id = fila.enfileirar(_video(tmp_path))
+    fila._executar(fila._reservar())
+    fila._executar(fila._reservar())
+    assert fila.consultar(job_id)["resposta"] == "ok"
+
+
+def test_lease_vencido_passa_o_job_para_outro_worker(banco, tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_videos, "LEASE_S", 0.1)
+    worker_a = _fila_parada(banco, lambda job: "a")
+    worker_b = _fila_parada(banco, lambda job: "b")
+    job_id = worker_a.enfileirar(_video(tmp_path))
+    assert worker_a._reservar()["id"] == job_id     # morre sem concluir
+    assert worker_b._reservar() is None             # lease ainda valendo
+    time.sleep(0.15)
+    job = worker_b._reservar()
+    assert job["id"] == job_id and job["tentativas"] == 2
+    worker_b._executar(job)
+    assert worker_b.consultar(job_id)["resposta"] == "b"
+
+
+def test_lease_vencido_vezes_demais_desiste(banco, tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_videos, "LEASE_S", 0)
+    fila = _fila_parada(banco, lambda job: "ok")
+    job_id = fila.enfileirar(_video(tmp_path))
+    for _ in range(2):
+        fila._reservar()
+        time.sleep(0.01)
+    fila._executar(fila._reservar())
+    job = fila.consultar(job_id)
+    assert job["status"] == "erro" and job["resposta"] == RESPOSTA_FALHA
+    erro = conectar(banco).execute("SELECT erro FROM jobs_video WHERE id = ?", (job_id,)).fetchone()[0]
+    assert erro == "tentativas esgotadas"
+
+
+def test_encerrar_devolve_o_job_sem_gastar_tentativa(banco, tmp_path):
+    fila = _fila_parada(banco, lambda job: "ok")
+    fila._pid = os.getpid()
+    job_id = fila.enfileirar(_video(tmp_path))
+    fila._reservar()
+    fila.encerrar()
+    row = conectar(banco).execute("SELECT status, tentativas, dono FROM jobs_video WHERE id = ?",
+                                  (job_id,)).fetchone()
+    assert tuple(row) == ("pendente", 0, None)
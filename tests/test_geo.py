@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+import geo
+from conexoes import conectar
+
+
+def test_codificar_geohash_padrao():
+    assert geo.codificar(57.64911, 10.40744) == "u4pruydqq"
+    assert geo.codificar(-23.5505, -46.6333, 5) == "6gyf4"
+
+
+@pytest.mark.parametrize("oeste, sul, leste, norte", [
+    (-46.8, -23.7, -46.4, -23.4),       # São Paulo
+    (-75.0, -35.0, -34.0, 6.0),         # Brasil
+    (170.0, -20.0, -170.0, 10.0),       # cruza o antimeridiano
+    (179.9, 64.0, -179.9, 66.0),        # faixa fina no antimeridiano
+    (-180.0, -90.0, 180.0, 90.0),       # mundo
+])
+def test_cobrir_contem_todo_ponto_do_retangulo(oeste, sul, leste, norte):
+    prefixos = geo.cobrir(oeste, sul, leste, norte)
+    assert 0 < len(prefixos) <= geo.MAX_CELULAS_BUSCA
+    largura = (leste - oeste) % 360 or 360
+    sorteio = random.Random(0)
+    for _ in range(500):
+        lon = oeste + sorteio.random() * largura
+        lon = lon - 360 if lon >= 180 else lon
+        lat = sul + sorteio.random() * (norte - sul)
+        geohash = geo.codificar(lat, lon)
+        assert any(geohash.startswith(p) for p in prefixos), (lat, lon, prefixos)
+
+
+def test_cobrir_antimeridiano_nao_pega_o_resto_do_mundo():
+    prefixos = geo.cobrir(170.0, -20.0, -170.0, 10.0)
+    assert not any(geo.codificar(0.0, lon).startswith(p) for p in prefixos for lon in (-100.0, 0.0, 100.0))
+
+
+def _inserir(app_teste, pontos):
+    with conectar(app_teste.DB_PATH) as conn:
+        for lat, lon, status in pontos:
+            conn.execute("""INSERT INTO chamados (modulo, status, latitude, longitude, geohash)
+                            VALUES ('airplus', ?, ?, ?, ?)""", (status, lat, lon, geo.codificar(lat, lon)))
+
+
+@pytest.mark.parametrize("zoom", [3, 14])
+def test_mapa_atravessando_o_antimeridiano(app_teste, zoom):
+    _inserir(app_teste, [(-17.0, 179.5, 'aberto'), (-17.5, -179.5, 'resolvido'), (-17.2, 178.0, 'aberto'),
+                         (-23.5, -46.6, 'aberto')])
+    dados = app_teste.app.test_client().get(f'/admin/mapa?bbox=170,-20,-170,-10&zoom={zoom}').json
+    assert dados['total'] == 3
+    assert dados['por_status'] == {'aberto': 2, 'resolvido': 1}
+    for feature in dados['features']:
+        lon = feature['geometry']['coordinates'][0]
+        assert lon >= 170 or lon <= -170
+
+
+def test_mapa_agrupa_por_celula_e_filtra_status(app_teste):
+    _inserir(app_teste, [(-23.55, -46.63, 'aberto'), (-23.551, -46.631, 'aberto'),
+                         (-23.552, -46.632, 'resolvido'), (-22.9, -43.2, 'aberto')])
+    cliente = app_teste.app.test_client()
+    dados = cliente.get('/admin/mapa?bbox=-50,-25,-40,-20&zoom=6').json
+    grupos = [f['properties'] for f in dados['features'] if 'n' in f['properties']]
+    sozinhos = [f['properties'] for f in dados['features'] if 'id' in f['properties']]
+    assert grupos == [{'n': 3, 'status': {'aberto': 2, 'resolvido': 1}}]
+    assert len(sozinhos) == 1 and sozinhos[0]['status'] == 'aberto'
+
+    dados = cliente.get('/admin/mapa?bbox=-50,-25,-40,-20&zoom=6&status=resolvido').json
+    assert dados['total'] == 1 and dados['features'][0]['properties']['status'] == 'resolvido'
+
+
+def test_mapa_bbox_invalido(app_teste):
+    assert app_teste.app.test_client().get('/admin/mapa?bbox=1,2,3').status_code == 400
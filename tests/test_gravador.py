@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from conexoes import conectar
+from gravador import Gravador
+
+
+@pytest.fixture
+def banco(tmp_path):
+    caminho = str(tmp_path / "gravador.db")
+    with conectar(caminho) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, valor TEXT)")
+    return caminho
+
+
+def _valores(banco):
+    return [row[0] for row in conectar(banco).execute("SELECT valor FROM t ORDER BY id")]
+
+
+def _parado(banco):
+    """Gravador com a thread já esperando o intervalo (a primeira escrita não espera)"""
+    gravador = Gravador(banco, intervalo_ms=10_000)
+    gravador.executar("SELECT 1")
+    assert gravador.descarregar(timeout=5)
+    time.sleep(0.05)
+    return gravador
+
+
+def test_grava_na_ordem_de_chegada_em_varios_lotes(banco):
+    gravador = Gravador(banco, intervalo_ms=20, max_lote=3)
+    for i in range(10):
+        gravador.executar("INSERT INTO t (valor) VALUES (?)", (str(i),))
+    assert gravador.descarregar(timeout=5)
+    assert _valores(banco) == [str(i) for i in range(10)]
+    assert gravador.estatisticas()["lotes"] >= 4
+    gravador.encerrar(timeout=5)
+
+
+def test_nada_e_gravado_antes_do_intervalo(banco):
+    gravador = _parado(banco)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')")
+    assert _valores(banco) == []
+    assert gravador.estatisticas()["pendentes"] == 1
+    assert gravador.descarregar(timeout=5)
+    assert _valores(banco) == ["a"]
+    gravador.encerrar(timeout=5)
+
+
+def test_chave_substitui_a_escrita_pendente(banco):
+    gravador = _parado(banco)
+    gravador.executar("INSERT INTO t (valor) VALUES ('velho')", chave="x")
+    gravador.executar("INSERT INTO t (valor) VALUES ('outro')")
+    gravador.executar("INSERT INTO t (valor) VALUES ('novo')", chave="x")
+    assert gravador.pendente("x")
+    assert gravador.descarregar(timeout=5)
+    assert not gravador.pendente("x")
+    # A substituta entra na posição dela, depois do que chegou antes
+    assert _valores(banco) == ["outro", "novo"]
+    assert gravador.estatisticas()["descartadas"] == 1
+    gravador.encerrar(timeout=5)
+
+
+def test_sincrono_grava_na_hora(banco):
+    gravador = Gravador(banco, intervalo_ms=0)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')")
+    assert _valores(banco) == ["a"]
+
+
+def test_encerrar_grava_o_pendente_e_depois_grava_na_hora(banco):
+    gravador = Gravador(banco, intervalo_ms=10_000)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')")
+    gravador.encerrar(timeout=5)
+    assert _valores(banco) == ["a"]
+    gravador.executar("INSERT INTO t (valor) VALUES ('b')")
+    assert _valores(banco) == ["a", "b"]
+
+
+def test_escrita_invalida_nao_derruba_o_lote(banco):
+    gravador = Gravador(banco, intervalo_ms=10_000)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')")
+    gravador.executar("INSERT INTO tabela_que_nao_existe (valor) VALUES ('x')")
+    gravador.executar("INSERT INTO t (valor) VALUES ('b')")
+    assert gravador.descarregar(timeout=5)
+    assert _valores(banco) == ["a", "b"]
+    assert gravador.estatisticas()["erros"] == 1
+    gravador.encerrar(timeout=5)
+
+
+def test_aguardar_grava_o_grupo_sem_substituir(banco):
+    gravador = _parado(banco)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')", grupo="g")
+    gravador.executar("INSERT INTO t (valor) VALUES ('b')", grupo="g")
+    assert gravador.pendente("g")
+    inicio = time.monotonic()
+    assert gravador.aguardar("g", timeout=5)
+    assert time.monotonic() - inicio < 1
+    assert not gravador.pendente("g")
+    assert _valores(banco) == ["a", "b"]
+    assert gravador.estatisticas()["descartadas"] == 0
+    gravador.encerrar(timeout=5)
+
+
+def test_aguardar_nao_adianta_a_fila_dos_outros(banco):
+    gravador = _parado(banco)
+    gravador.executar("INSERT INTO t (valor) VALUES ('a')", grupo="outro")
+    assert gravador.aguardar("g", timeout=0)
+    assert _valores(banco) == []
+    assert gravador.pendente("outro")
+    gravador.encerrar(timeout=5)
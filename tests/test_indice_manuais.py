@@ -0,0 +1,134 @@
+import math
+import random
+
+import pytest
+
+import indice_manuais
+from indice_manuais import Indice, buscar_trechos, construir, termos
+
+
+PALAVRAS = ("bobina filme selagem temperatura sensor motor correia rolo ajuste pressao "
+            "ventilador painel tela alarme limpeza lamina guia tensao velocidade").split()
+
+
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.setattr(indice_manuais, "INDICE_DIR", str(tmp_path / "indice"))
+    monkeypatch.setattr(indice_manuais, "PALAVRAS_TRECHO", 12)
+    monkeypatch.setattr(indice_manuais, "SOBREPOSICAO", 3)
+    monkeypatch.setattr(indice_manuais, "ATIVO", True)
+    monkeypatch.setattr(indice_manuais, "_indices", {})
+    monkeypatch.setattr(indice_manuais, "_proxima_verificacao", {})
+    return tmp_path
+
+
+def _manual(pasta, nome, texto):
+    caminho = pasta / nome
+    caminho.write_text(texto, encoding="utf-8")
+    return str(caminho)
+
+
+def _manuais(pasta):
+    aleatorio = random.Random(7)
+    filler = " ".join(aleatorio.choice(PALAVRAS) for _ in range(200))
+    return [
+        _manual(pasta, "geral.txt", filler),
+        _manual(pasta, "erros.txt", filler[:300] + " O erro E05 indica falha no aquecedor da "
+                "resistencia; troque o fusivel do aquecedor. " + filler[300:600]),
+    ]
+
+
+def _bm25(indice, pergunta):
+    """BM25 calculado direto dos textos dos trechos, para comparar com o indice"""
+    docs = [termos(indice.texto(d)) for d in range(indice.total)]
+    media = sum(map(len, docs)) / len(docs)
+    pontos = {}
+    for termo in set(termos(pergunta)):
+        df = sum(termo in doc for doc in docs)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for d, doc in enumerate(docs):
+            tf = doc.count(termo)
+            if tf:
+                norma = indice_manuais.K1 * (1 - indice_manuais.B + indice_manuais.B * len(doc) / media)
+                pontos[d] = pontos.get(d, 0.0) + idf * tf * (indice_manuais.K1 + 1) / (tf + norma)
+    return pontos
+
+
+def test_termos_normaliza_e_tira_stopwords():
+    assert termos("Os Sensores da máquina NÃO ligam; erro E-05") == ["sensore", "maquina", "ligam", "e5"]
+    assert termos("a e o 7") == ["7"]
+
+
+def test_construir_e_abrir(pasta):
+    arquivos = _manuais(pasta)
+    total = construir("airplus", arquivos)
+    indice = Indice(indice_manuais._caminho_indice("airplus"))
+    assert indice.total == total > 2
+    assert indice.arquivos == ["geral.txt", "erros.txt"]
+    assert {tuple(f) for f in indice.fontes} == {(0, 1), (1, 1)}
+    # Os trechos guardados reconstroem o texto (janelas com sobreposicao)
+    geral = [indice.texto(d).split() for d in range(total) if indice.fontes[d][0] == 0]
+    passo = indice_manuais.PALAVRAS_TRECHO - indice_manuais.SOBREPOSICAO
+    palavras = [p for trecho in geral[:-1] for p in trecho[:passo]] + geral[-1]
+    assert palavras == open(arquivos[0], encoding="utf-8").read().split()
+
+
+def test_trecho_relevante_vem_primeiro(pasta):
+    construir("airplus", _manuais(pasta))
+    indice = Indice(indice_manuais._caminho_indice("airplus"))
+    (pontuacao, doc), *_ = indice.buscar("erro E05 no aquecedor", limite=3)
+    assert "aquecedor" in indice.texto(doc)
+    assert indice.fontes[doc][0] == 1
+    # Termo raro pesa mais que termo comum
+    assert pontuacao > max(p for p, _ in indice.buscar("bobina", limite=1))
+    assert indice.buscar("palavra inexistente") == []
+
+
+def test_pontuacao_igual_ao_bm25_calculado(pasta):
+    construir("airplus", _manuais(pasta))
+    indice = Indice(indice_manuais._caminho_indice("airplus"))
+    for pergunta in ("erro E05 aquecedor", "sensor motor", "tensao da correia", "bobinas de filme"):
+        esperado = _bm25(indice, pergunta)
+        obtido = indice.buscar(pergunta, limite=indice.total)
+        assert len(obtido) == len(esperado)
+        for pontuacao, doc in obtido:
+            assert pontuacao == pytest.approx(esperado[doc])
+
+
+def test_caminho_big_endian_le_o_que_grava(pasta, monkeypatch):
+    arquivos = _manuais(pasta)
+    construir("airplus", arquivos)
+    nativo = Indice(indice_manuais._caminho_indice("airplus"))
+
+    # Forca a conversao (byteswap ao gravar e ao ler), como numa maquina big-endian
+    monkeypatch.setattr(indice_manuais, "LITTLE_ENDIAN", False)
+    construir("outro", arquivos)
+    convertido = Indice(indice_manuais._caminho_indice("outro"))
+    for pergunta in ("sensor do motor", "erro E05 aquecedor"):
+        assert convertido.buscar(pergunta, limite=5) == nativo.buscar(pergunta, limite=5)
+    assert [convertido.texto(d) for d in range(convertido.total)] == \
+        [nativo.texto(d) for d in range(nativo.total)]
+
+
+def test_texto_extraido_e_reaproveitado(pasta, monkeypatch):
+    arquivos = _manuais(pasta)
+    construir("airplus", arquivos)
+    extraidos = []
+    extrair = indice_manuais._extrair
+    monkeypatch.setattr(indice_manuais, "_extrair", lambda c: extraidos.append(c) or extrair(c))
+    novo = _manual(pasta, "novo.txt", "Limpeza semanal do bico de ar.")
+    construir("airplus", arquivos + [novo])
+    assert extraidos == [novo]
+
+
+def test_buscar_trechos_pelo_apelido_do_modulo(pasta):
+    construir(indice_manuais.chave_modulo("airmove1"), _manuais(pasta))
+    resultados = buscar_trechos("aquecedor com erro E05", "airmove1", limite=2)
+    assert len(resultados) == 2
+    assert resultados[0]["arquivo"] == "erros.txt"
+    assert resultados[0]["pagina"] == 1
+    assert "aquecedor" in resultados[0]["texto"]
+    assert resultados[0]["pontuacao"] >= resultados[1]["pontuacao"]
+    assert buscar_trechos("aquecedor", "modulo_sem_indice") == []
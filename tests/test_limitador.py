@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+import limitador
+from limitador import Limitador, Sobrecarga
+
+
+@pytest.fixture
+def lim(tmp_path, monkeypatch):
+    monkeypatch.setattr(limitador, "ATIVO", True)
+    monkeypatch.setattr(limitador, "MAX_EXECUCOES", 2)
+    monkeypatch.setattr(limitador, "MAX_NA_FILA", 4)
+    monkeypatch.setattr(limitador, "ESPERA_MAX_S", 2)
+    monkeypatch.setattr(limitador, "LEASE_S", 60)
+    return Limitador(str(tmp_path / "limitador.db"))
+
+
+def _em_execucao(lim):
+    return lim.estatisticas()["em_execucao"]
+
+
+def test_vagas_limitadas_e_devolvidas(lim):
+    a = lim.reservar_execucao()
+    b = lim.reservar_execucao()
+    assert a and b and a != b
+    with pytest.raises(Sobrecarga) as erro:
+        lim.reservar_execucao(espera_s=0.1)
+    assert erro.value.motivo == "assistente ocupado"
+    lim.liberar_execucao(a)
+    assert _em_execucao(lim) == 1
+    assert lim.reservar_execucao(espera_s=0.1)
+
+
+def test_espera_na_fila_ate_liberar(lim):
+    a = lim.reservar_execucao()
+    lim.reservar_execucao()
+    threading.Timer(0.2, lim.liberar_execucao, (a,)).start()
+    inicio = time.monotonic()
+    assert lim.reservar_execucao(espera_s=2)
+    assert 0.15 < time.monotonic() - inicio < 1.5
+    assert lim.estatisticas()["esperaram"] == 1
+
+
+def test_fila_cheia_recusa_sem_esperar(lim, monkeypatch):
+    monkeypatch.setattr(limitador, "MAX_NA_FILA", 0)
+    lim.reservar_execucao()
+    lim.reservar_execucao()
+    inicio = time.monotonic()
+    with pytest.raises(Sobrecarga) as erro:
+        lim.reservar_execucao()
+    assert erro.value.motivo == "fila do assistente cheia"
+    assert time.monotonic() - inicio < 0.1
+
+
+def test_lease_vencido_devolve_a_vaga(lim, monkeypatch):
+    monkeypatch.setattr(limitador, "LEASE_S", 0.2)
+    lim.reservar_execucao()
+    lim.reservar_execucao()
+    time.sleep(0.3)
+    assert _em_execucao(lim) == 0
+    assert lim.reservar_execucao(espera_s=0)
+
+
+def test_vaga_mantida_nao_vence(lim, monkeypatch):
+    monkeypatch.setattr(limitador, "MAX_EXECUCOES", 1)
+    monkeypatch.setattr(limitador, "LEASE_S", 0.3)
+    vaga = lim.vaga()
+    fim = time.monotonic() + 0.8
+    while time.monotonic() < fim:
+        vaga.manter()
+        time.sleep(0.02)
+    assert _em_execucao(lim) == 1
+    with pytest.raises(Sobrecarga):
+        lim.reservar_execucao(espera_s=0.05)
+    vaga.liberar()
+    vaga.liberar()
+    assert _em_execucao(lim) == 0
+    assert lim.reservar_execucao(espera_s=0)
+
+
+def test_balde_da_sessao(lim, monkeypatch):
+    monkeypatch.setattr(limitador, "SESSAO_RAJADA", 2)
+    monkeypatch.setattr(limitador, "SESSAO_POR_MIN", 6)
+    lim.admitir(session_id="s1")
+    lim.admitir(session_id="s1")
+    with pytest.raises(Sobrecarga) as erro:
+        lim.admitir(session_id="s1")
+    assert 1 <= erro.value.retry_after <= 10
+    # Outra sessão tem o próprio balde
+    lim.admitir(session_id="s2")
+
+
+def test_desativado_nao_limita(lim, monkeypatch):
+    monkeypatch.setattr(limitador, "ATIVO", False)
+    assert lim.reservar_execucao() is None
+    for _ in range(50):
+        lim.admitir(session_id="s1")
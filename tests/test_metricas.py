@@ -0,0 +1,109 @@
+import re
+
+import pytest
+
+import coalescencia
+import metricas
+from metricas import HISTOGRAMA_CHAT, LIMITES, Metricas
+
+
+@pytest.fixture
+def met(tmp_path, monkeypatch):
+    instancia = Metricas(str(tmp_path / "metricas.db"), intervalo_s=3600)
+    monkeypatch.setattr(metricas, "_metricas", instancia)
+    yield instancia
+    metricas.suspender()
+
+
+def _amostras(texto):
+    """{(serie, rotulos): valor} do formato texto do Prometheus"""
+    amostras = {}
+    for linha in texto.splitlines():
+        if linha.startswith("#"):
+            continue
+        serie, rotulos, valor = re.fullmatch(r"(\w+)\{(.*)\} (\S+)", linha).groups()
+        amostras[serie, rotulos] = float(valor)
+    return amostras
+
+
+def _rotulos(**rotulos):
+    return metricas.rotulos_texto(rotulos)
+
+
+def test_baldes_acumulados_soma_e_contagem(met):
+    rotulos = {"rota": "chat", "etapa": "banco"}
+    for valor in (0.0005, 0.003, 0.003, 0.7, 100):
+        met.observar(HISTOGRAMA_CHAT, rotulos, valor)
+    texto = met.exportar()
+    assert f"# TYPE {HISTOGRAMA_CHAT} histogram" in texto
+    amostras = _amostras(texto)
+    base = _rotulos(**rotulos)
+    baldes = [amostras[f"{HISTOGRAMA_CHAT}_bucket", f'{base},le="{float(limite)!r}"'] for limite in LIMITES]
+    assert baldes == [sum(v <= limite for v in (0.0005, 0.003, 0.003, 0.7, 100)) for limite in LIMITES]
+    assert amostras[f"{HISTOGRAMA_CHAT}_bucket", f'{base},le="+Inf"'] == 5
+    assert amostras[f"{HISTOGRAMA_CHAT}_count", base] == 5
+    assert amostras[f"{HISTOGRAMA_CHAT}_sum", base] == pytest.approx(100.7065)
+
+
+def test_valor_no_limite_cai_no_proprio_balde(met):
+    met.observar(HISTOGRAMA_CHAT, {"etapa": "x"}, 0.5)
+    amostras = _amostras(met.exportar())
+    assert amostras[f"{HISTOGRAMA_CHAT}_bucket", 'etapa="x",le="0.25"'] == 0
+    assert amostras[f"{HISTOGRAMA_CHAT}_bucket", 'etapa="x",le="0.5"'] == 1
+
+
+def test_workers_somam_no_mesmo_banco(met):
+    outro = Metricas(met.db_path, intervalo_s=3600)
+    met.observar(HISTOGRAMA_CHAT, {"etapa": "x"}, 0.01)
+    outro.observar(HISTOGRAMA_CHAT, {"etapa": "x"}, 0.02)
+    outro.descarregar()
+    amostras = _amostras(met.exportar())
+    assert amostras[f"{HISTOGRAMA_CHAT}_count", 'etapa="x"'] == 2
+    assert amostras[f"{HISTOGRAMA_CHAT}_sum", 'etapa="x"'] == pytest.approx(0.03)
+    # Exportar de novo nao conta duas vezes
+    assert _amostras(outro.exportar()) == amostras
+    met.limpar()
+    assert met.exportar() == ""
+
+
+def test_medicao_registra_etapas_e_total(met):
+    medicao = metricas.iniciar("chat")
+    with metricas.etapa("banco"):
+        pass
+    metricas.somar("run_execucao", 0.3)
+    metricas.somar("run_execucao", 0.4)
+    metricas.anotar(equipamento="airplus", resultado="cache")
+    medicao.concluir(resultado="api")
+    medicao.concluir(resultado="erro")
+    assert metricas.atual() is None
+    amostras = _amostras(met.exportar())
+    contagens = {rotulos: valor for (serie, rotulos), valor in amostras.items()
+                 if serie == f"{HISTOGRAMA_CHAT}_count"}
+    comuns = dict(rota="chat", equipamento="airplus", resultado="api")
+    assert contagens == {_rotulos(etapa=nome, **comuns): 1 for nome in ("banco", "run_execucao", "total")}
+    assert amostras[f"{HISTOGRAMA_CHAT}_sum", _rotulos(etapa="run_execucao", **comuns)] == pytest.approx(0.7)
+
+
+def test_fora_de_medicao_nao_registra(met):
+    metricas.suspender()
+    with metricas.etapa("banco"):
+        pass
+    metricas.somar("banco", 1)
+    metricas.anotar(resultado="api")
+    assert met.exportar() == ""
+
+
+def test_rotulos_escapados():
+    assert metricas.rotulos_texto({"b": 'a"b', "a": "x\\y\nz"}) == 'a="x\\\\y\\nz",b="a\\"b"'
+    assert metricas.formatar("n", "counter", "ajuda", [({}, 3)]) == "# HELP n ajuda\n# TYPE n counter\nn 3\n"
+
+
+def test_endpoint_metrics(app_teste, met, tmp_path, monkeypatch):
+    monkeypatch.setattr(coalescencia, "_coalescedor", coalescencia.Coalescedor(str(tmp_path / "coalescencia.db")))
+    met.observar(HISTOGRAMA_CHAT, {"rota": "chat", "etapa": "total"}, 1.5)
+    resposta = app_teste.app.test_client().get("/metrics")
+    assert resposta.status_code == 200
+    assert resposta.mimetype == "text/plain"
+    texto = resposta.get_data(as_text=True)
+    assert f'{HISTOGRAMA_CHAT}_bucket{{etapa="total",rota="chat",le="2.5"}} 1' in texto
+    assert 'storopack_coalescencia_total{papel="lideres"} 0' in texto
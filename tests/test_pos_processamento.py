@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from assistente import limpar_formatacao, processar_videos
+from pos_processamento import PosProcessador, codigos_citados, pos_processar
+
+
+@pytest.mark.parametrize("texto, codigos", [
+    ("O erro E9 indica calibração fora do limite", [9]),
+    ("Se aparecer erro e9: repita", [9]),
+    ("Veja o E11 e depois o E2.", [11, 2]),
+    ("O erro e12 não existe nesta máquina", []),
+    ("Códigos E05 e E-7", [5, 7]),
+    ("Entre 2800 e 5200, e-mail, VIDEO_E3", []),
+])
+def test_codigos_citados(texto, codigos):
+    assert codigos_citados(texto) == codigos
+
+
+def test_codigo_no_fim_do_trecho_espera_o_proximo():
+    assert codigos_citados("aparece o e1", ate_o_fim=False) == []
+    assert codigos_citados("aparece o e1") == [1]
+
+
+def test_e12_nao_injeta_o_video_do_e1():
+    assert pos_processar("Esse é o erro e12 da placa") == "Esse é o erro e12 da placa"
+    assert pos_processar("Esse é o erro E1 do sensor").endswith("\n\n[SIM_VIDEO_E1]")
+
+
+def test_codigo_partido_entre_trechos():
+    processador = PosProcessador()
+    saida = "".join(processador.alimentar(t) for t in ["Veja o erro e1", "2 no painel"])
+    saida += processador.finalizar()
+    assert "[SIM_VIDEO_E" not in saida
+    processador = PosProcessador()
+    saida = processador.alimentar("Veja o erro e1") + processador.finalizar()
+    assert saida.endswith("\n\n[SIM_VIDEO_E1]")
+
+
+def _em_trechos(texto, sorteio, injetar_marcador=True):
+    processador = PosProcessador(injetar_marcador)
+    saida, pos = "", 0
+    while pos < len(texto):
+        tam = sorteio.randint(1, 6)
+        saida += processador.alimentar(texto[pos:pos + tam])
+        pos += tam
+    return saida + processador.finalizar()
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("### Erro E9\n\nO **erro** indica【4:0†manual.pdf】 falha.", "Erro E9\n\nO erro indica falha.\n\n[SIM_VIDEO_E9]"),
+    ("Veja:\n```\ncodigo\n```\n\n\n\nFim", "Veja:\n\ncodigo\n\nFim"),
+    ("Calibre [VIDEO_CALIBRACAO] e sele [VIDEO_SELAGEM]", "Calibre  e sele"),
+    ("[VIDEO_SELA[VIDEO_CALIBRACAO]GEM] ok", "ok"),
+    ("Resposta com [VIDEO_E3] pronta", "Resposta com [SIM_VIDEO_E3] pronta"),
+    ("", ""),
+])
+def test_pos_processar(texto, esperado):
+    assert pos_processar(texto) == esperado
+
+
+def test_igual_ao_pipeline_antigo_de_uma_vez_e_em_trechos():
+    pedacos = ["a", "b ", " ", "\n", "*", "**", "`", "```", "#", "##", "【", "】", "【4:0†x.pdf】", "[", "]",
+               "[VIDEO_E9]", "[VIDEO_E", "9]", "[VIDEO_CALIBRACAO]", "[VIDEO_SELAGEM]", "[VIDEO_SEL", "AGEM]"]
+    sorteio = random.Random(0)
+    for _ in range(2000):
+        texto = "".join(sorteio.choice(pedacos) for _ in range(sorteio.randint(0, 25)))
+        antigo = processar_videos(limpar_formatacao(texto))
+        assert pos_processar(texto, injetar_marcador=False) == antigo, texto
+        assert _em_trechos(texto, sorteio, injetar_marcador=False) == antigo, texto
+
+
+def test_marcador_partido_entre_trechos_nao_aparece_pela_metade():
+    processador = PosProcessador()
+    saidas = [processador.alimentar(t) for t in ["Veja [VIDEO_", "E9", "] e **o", "k**"]]
+    saidas.append(processador.finalizar())
+    assert all("[VIDEO_" not in s for s in saidas)
+    assert "".join(saidas) == "Veja [SIM_VIDEO_E9] e ok"
@@ -0,0 +1,36 @@
+import pytest
+
+import assistente
+from assistente import classificar_mensagem, resposta_rapida
+from cache_respostas import normalizar_pergunta
+
+
+@pytest.mark.parametrize("pergunta, tipo, chave, confianca", [
+    ("erro E9", "erro", "e9", "alta"),
+    ("Erro: E-09 na máquina", "erro", "e9", "alta"),
+    ("deu e05", "erro", "e5", "alta"),
+    ("erro e12 na tela", "erro", "e12", "baixa"),
+    ("apareceu erro e1 e depois erro e2", "erro", "e1", "baixa"),
+    ("a máquina mostra o erro e3 sempre que eu ligo de manhã", "erro", "e3", "baixa"),
+    ("Como faço a calibração?", "calibracao", "calibracao", "baixa"),
+    ("bom dia", "saudacao", None, "baixa"),
+    ("Oi, erro E4", "erro", "e4", "alta"),
+    ("qual o preço do filme", None, None, "baixa"),
+])
+def test_classificar_mensagem(pergunta, tipo, chave, confianca):
+    assert classificar_mensagem(pergunta) == {"tipo": tipo, "chave": chave, "confianca": confianca}
+
+
+def test_roteador_e_cache_leem_o_mesmo_codigo():
+    for pergunta in ["erro 9", "erro e9", "erro: E-09", "e-9", "E09"]:
+        assert classificar_mensagem(pergunta)["chave"] == "e9"
+        assert normalizar_pergunta(pergunta).split()[-1] == "e9"
+
+
+def test_fast_path_so_com_confianca_alta(monkeypatch):
+    monkeypatch.setattr(assistente, "FAST_PATH_ERROS", True)
+    resposta = resposta_rapida("erro E2")
+    assert resposta.startswith("⚠️ Erro E2")
+    assert resposta_rapida("erro e1 e erro e2") is None
+    monkeypatch.setattr(assistente, "FAST_PATH_ERROS", False)
+    assert resposta_rapida("erro E2") is None
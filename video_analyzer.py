@@ -4,13 +4,24 @@ Versao otimizada que usa Gemini 2.5 Flash para analisar videos diretamente
 """
 
 import os
+import hashlib
 import base64
 import json
 import tempfile
+import time
 from dotenv import load_dotenv
 
+from cache_videos import CACHE_ATIVO, hash_arquivo, obter_cache_videos, versao_base
+
 load_dotenv(override=True)
 
+# Limite do video enviado (o app usa o mesmo valor em MAX_CONTENT_LENGTH)
+MAX_VIDEO_BYTES = int(os.getenv("VIDEO_MAX_MB", "100")) * 1024 * 1024
+# Quanto esperar o Gemini terminar de processar o upload (a analise roda na fila, fora do request)
+MAX_PROCESSAMENTO_S = float(os.getenv("VIDEO_MAX_PROCESSAMENTO_S", "600"))
+
+MODELO_GEMINI = 'gemini-2.5-flash'
+
 # Base de conhecimento de erros visuais por modulo
 ERROS_VISUAIS = {
     "airplus": {
@@ -90,9 +101,14 @@ ERROS_VISUAIS = {
 }
 
 
-def analisar_com_gemini(video_bytes, modulo, descricao=""):
+# Chave do cache de analises: muda quando a base de erros ou o modelo mudam
+VERSAO_ANALISE = versao_base(ERROS_VISUAIS, MODELO_GEMINI)
+
+
+def analisar_com_gemini(video_path, modulo, descricao=""):
     """
     Analisa video diretamente com Google Gemini 2.5 Flash.
+    O arquivo e enviado a partir do proprio caminho, sem ser carregado em memoria.
     """
     try:
         import google.generativeai as genai
@@ -102,7 +118,7 @@ def analisar_com_gemini(video_bytes, modulo, descricao=""):
             return None, "GOOGLE_API_KEY nao configurada no arquivo .env"
         
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = genai.GenerativeModel(MODELO_GEMINI)
         
         erros_modulo = ERROS_VISUAIS.get(modulo.split('_')[0], {})
         erros_lista = "\n".join([f"- {k}: {v['nome']} (sinais: {', '.join(v['sinais'])})" 
@@ -131,16 +147,14 @@ Responda APENAS com JSON valido (sem markdown, sem ```):
 
         print("[INFO] Enviando video para Gemini...")
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
-            tmp_file.write(video_bytes)
-            temp_path = tmp_file.name
-        
+        video_file = genai.upload_file(video_path)
         try:
-            video_file = genai.upload_file(temp_path)
             print(f"[INFO] Video enviado. Aguardando processamento...")
             
-            import time
+            limite = time.monotonic() + MAX_PROCESSAMENTO_S
             while video_file.state.name == "PROCESSING":
+                if time.monotonic() > limite:
+                    return None, "Tempo esgotado no processamento do video pelo Gemini"
                 time.sleep(1)
                 video_file = genai.get_file(video_file.name)
             
@@ -154,13 +168,13 @@ Responda APENAS com JSON valido (sem markdown, sem ```):
             texto = texto.replace("```json", "").replace("```", "").strip()
             resultado = json.loads(texto)
             
-            genai.delete_file(video_file.name)
-            
             return resultado, None
             
         finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            try:
+                genai.delete_file(video_file.name)
+            except Exception:
+                pass
             
     except ImportError:
         return None, "google-generativeai nao instalado. Execute: pip install google-generativeai"
@@ -212,35 +226,96 @@ def formatar_resposta(resultado, modulo):
     return resposta
 
 
-def analisar_video_erro(video_bytes=None, video_path=None, modulo="airplus", descricao_cliente=""):
+def analisar_video_erro(video_bytes=None, video_path=None, modulo="airplus", descricao_cliente="", hash_video=None):
     """
     Funcao principal para analisar video de erro.
+    Use video_path: o video vai do disco para o Gemini sem passar pela memoria.
+    video_bytes ainda e aceito (gravado uma vez em arquivo temporario).
+    hash_video: SHA-256 ja calculado (no upload); sem ele, o arquivo e lido para o hash.
     """
     
-    if video_path:
+    if video_bytes and not video_path:
+        if len(video_bytes) > MAX_VIDEO_BYTES:
+            return _mensagem_video_grande()
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_file:
+            tmp_file.write(video_bytes)
+            temp_path = tmp_file.name
+        if CACHE_ATIVO and not hash_video:
+            hash_video = hashlib.sha256(video_bytes).hexdigest()
         try:
-            with open(video_path, 'rb') as f:
-                video_bytes = f.read()
-        except Exception as e:
-            return f"Erro ao ler video: {str(e)}"
+            return analisar_video_erro(video_path=temp_path, modulo=modulo, descricao_cliente=descricao_cliente,
+                                       hash_video=hash_video)
+        finally:
+            os.remove(temp_path)
+    
+    if not video_path:
+        return "Nenhum video fornecido."
+    
+    try:
+        tamanho = os.path.getsize(video_path)
+    except OSError as e:
+        return f"Erro ao ler video: {str(e)}"
     
-    if not video_bytes:
+    if not tamanho:
         return "Nenhum video fornecido."
     
-    max_size = 100 * 1024 * 1024
-    if len(video_bytes) > max_size:
-        return "Video muito grande (maximo 100MB).\n\nEnvie um video menor ou descreva o problema por texto."
+    if tamanho > MAX_VIDEO_BYTES:
+        return _mensagem_video_grande()
+    
+    print(f"[INFO] Video recebido: {tamanho/1024/1024:.2f}MB")
     
-    print(f"[INFO] Video recebido: {len(video_bytes)/1024/1024:.2f}MB")
+    if not CACHE_ATIVO:
+        hash_video = None
+    elif not hash_video:
+        hash_video = _hash_para_cache(video_path)
+    resultado = _resultado_em_cache(hash_video, modulo)
+    if resultado is not None:
+        return formatar_resposta(resultado, modulo)
     
-    resultado, erro = analisar_com_gemini(video_bytes, modulo, descricao_cliente)
+    resultado, erro = analisar_com_gemini(video_path, modulo, descricao_cliente)
     
     if erro:
         return f"{erro}\n\nDescreva o problema por texto ou ligue: (11) 5677-4699"
     
+    if hash_video:
+        try:
+            obter_cache_videos().salvar(hash_video, modulo, VERSAO_ANALISE, resultado)
+        except Exception as e:
+            print(f"[AVISO] Cache de videos: {e}")
+    
     return formatar_resposta(resultado, modulo)
 
 
+def _hash_para_cache(video_path):
+    """SHA-256 do video (None se o cache estiver desligado ou o arquivo nao puder ser lido)"""
+    if not CACHE_ATIVO:
+        return None
+    try:
+        return hash_arquivo(video_path)
+    except OSError as e:
+        print(f"[AVISO] Cache de videos: {e}")
+        return None
+
+
+def _resultado_em_cache(hash_video, modulo):
+    """Analise ja feita para o mesmo video e modulo, ou None"""
+    if not hash_video:
+        return None
+    try:
+        resultado = obter_cache_videos().obter(hash_video, modulo, VERSAO_ANALISE)
+    except Exception as e:
+        print(f"[AVISO] Cache de videos: {e}")
+        return None
+    if resultado is not None:
+        print(f"[OK] Analise do video {hash_video[:12]} vinda do cache")
+    return resultado
+
+
+def _mensagem_video_grande():
+    return (f"Video muito grande (maximo {MAX_VIDEO_BYTES // (1024 * 1024)}MB).\n\n"
+            "Envie um video menor ou descreva o problema por texto.")
+
+
 if __name__ == "__main__":
     print("Video Analyzer para Storopack (Google Gemini)")
     print("Modulos disponiveis:", list(ERROS_VISUAIS.keys()))